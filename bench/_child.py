@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import resource
+import sys
+
+import orjson
+
+
+def main() -> int:
+    # argv: <result-path> <runner args...>; records the runner's peak RSS on exit
+    out_path, argv = sys.argv[1], sys.argv[2:]
+    from src import runner
+
+    rc = runner.main(argv)
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    with open(out_path, 'wb') as f:
+        f.write(orjson.dumps({'rc': rc, 'peak_rss_bytes': max(self_rss, child_rss)}))
+    return rc
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
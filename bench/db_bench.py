@@ -0,0 +1,338 @@
+"""Micro-benchmark and scale test for src.core.db.
+
+    python -m bench.db_bench --sizes 1e6                 # quick baseline
+    python -m bench.db_bench --sizes 1e6,1e7,5e7 --writers 1,2,4,8 --workdir /data/bench --reuse
+    python -m bench.db_bench --sizes 1e6 --pragma mmap_size=268435456 --pragma cache_size=-262144
+    python -m bench.db_bench --sizes 1e7 --profiles default,fast,large --workdir /data/bench --reuse
+
+Databases are filled with a skewed (Zipf-like) host and source distribution,
+first_seen spread over a year and a few percent of conditional-GET resource rows.
+Reads, writes and exports are measured once per storage profile (src.core.db
+STORAGE_PROFILES), each after a warm-up pass so every profile starts from the same
+OS page cache. `connections` compares opening a connection per site (the runner's old
+pattern) with lending one from a ConnectionManager.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import orjson
+
+from bench.e2e import REPO_ROOT, _git_commit
+from src.core import db as dbm
+
+YEAR = 365 * 86400
+WORDS = ['news', 'world', 'tech', 'sport', 'politics', 'culture', 'science', 'opinion', 'business', 'local']
+
+
+class Population:
+    """Deterministic URL universe: url(i) is reproducible from (seed, i)."""
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed
+        self.n_hosts = max(10, size // 2000)
+        self.n_sources = max(5, size // 5000)
+        rng = random.Random(seed)
+        # Zipf-ish weights: a few hosts/sources own most URLs
+        self._host_cum = self._cum([1.0 / (k + 1) ** 1.1 for k in range(self.n_hosts)])
+        self._src_cum = self._cum([1.0 / (k + 1) ** 1.1 for k in range(self.n_sources)])
+        self._salt = rng.getrandbits(32)
+
+    @staticmethod
+    def _cum(weights: List[float]) -> List[float]:
+        total = sum(weights)
+        acc, out = 0.0, []
+        for w in weights:
+            acc += w / total
+            out.append(acc)
+        return out
+
+    @staticmethod
+    def _pick(cum: List[float], r: float) -> int:
+        lo, hi = 0, len(cum) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cum[mid] < r:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _unit(self, i: int, stream: int) -> float:
+        # Cheap deterministic hash of (seed, stream, i) -> [0, 1); a Random() per call is far slower
+        x = (i * 0x9E3779B97F4A7C15 + self._salt * (stream + 1)) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 31
+        x = (x * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 29
+        return (x >> 11) / float(1 << 53)
+
+    def url(self, i: int) -> str:
+        host = self._pick(self._host_cum, self._unit(i, 0))
+        section = WORDS[i % len(WORDS)]
+        slug = '-'.join(WORDS[(i >> s) % len(WORDS)] for s in range(0, 3 + (i % 5) * 2, 2))
+        return f"https://www.site{host}.example/{section}/{2020 + i % 5}/{slug}-{i}/"
+
+    def source(self, i: int) -> str:
+        return f"src{self._pick(self._src_cum, self._unit(i, 1))}"
+
+
+def _connect(path: str, pragmas: List[str], profile: str = 'default') -> sqlite3.Connection:
+    conn = dbm.ensure_db(path, dbm.storage_pragmas(profile))
+    for p in pragmas:
+        conn.execute(f"PRAGMA {p}")
+    return conn
+
+
+def fill(path: str, pop: Population, batch: int = 50000) -> float:
+    conn = dbm.ensure_db(path)
+    conn.execute('PRAGMA synchronous=OFF')
+    t0 = time.perf_counter()
+    now = int(time.time())
+    rng = random.Random(pop.seed)
+    for s in range(pop.n_sources):
+        dbm.upsert_source(conn, f"src{s}", 'sitemap', None, '{}')
+    run_id = dbm.start_run(conn, 'fill')
+    for start in range(0, pop.size, batch):
+        urls, ubs = [], []
+        for i in range(start, min(pop.size, start + batch)):
+            u = pop.url(i)
+            first = now - int(rng.random() * YEAR)
+            last = min(now, first + int(rng.random() * YEAR / 4))
+            resource = rng.random() < 0.03
+            urls.append((u, None, first, last, None if resource else 'sitemap', None,
+                         None if resource else f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}", '"e"' if resource else None))
+            if not resource:
+                ubs.append((pop.source(i), u, first, last, run_id))
+                if rng.random() < 0.2:
+                    ubs.append((pop.source(i + pop.size), u, first, last, run_id))
+        with dbm.transaction(conn):
+            conn.executemany("INSERT OR IGNORE INTO urls(url, canonical, first_seen, last_seen, discovered_via, http_status, lastmod, etag) VALUES(?,?,?,?,?,?,?,?)", urls)
+            conn.executemany("INSERT OR IGNORE INTO url_by_source(source_id, url, first_seen, last_seen, first_run) VALUES(?,?,?,?,?)", ubs)
+    # Bring maintained counters in line with the bulk-loaded rows
+    with dbm.transaction(conn):
+        conn.execute("DELETE FROM source_stats")
+        conn.execute("INSERT INTO source_stats(source_id, total_seen) SELECT source_id, COUNT(*) FROM url_by_source GROUP BY source_id")
+    dbm.finish_run(conn, run_id)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def _pct(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    n = len(samples)
+
+    def q(p: float) -> float:
+        return round(samples[min(n - 1, int(p * n))] * 1e6, 1)
+
+    return {'n': n, 'mean_us': round(statistics.fmean(samples) * 1e6, 1), 'p50_us': q(0.5), 'p95_us': q(0.95), 'p99_us': q(0.99), 'p999_us': q(0.999)}
+
+
+def bench_lookups(path: str, pop: Population, n: int, pragmas: List[str], profile: str = 'default') -> Dict[str, Any]:
+    conn = _connect(path, pragmas, profile)
+    rng = random.Random(pop.seed + 1)
+    hits, misses, etags = [], [], []
+    for _ in range(n):
+        u = pop.url(rng.randrange(pop.size))
+        t0 = time.perf_counter()
+        dbm.has_url(conn, u)
+        hits.append(time.perf_counter() - t0)
+        m = u.replace('https://', 'https://missing.')
+        t0 = time.perf_counter()
+        dbm.has_url(conn, m)
+        misses.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        dbm.get_resource_etag_lastmod(conn, u)
+        etags.append(time.perf_counter() - t0)
+    conn.close()
+    return {'has_url_hit': _pct(hits), 'has_url_miss': _pct(misses), 'get_resource_etag_lastmod': _pct(etags)}
+
+
+def bench_membership(path: str, pop: Population, batches: int, batch: int, profile: str = 'default') -> Dict[str, Any]:
+    # The runner's membership check: one known_urls() per discovered batch on a read-only
+    # connection, about a third of the URLs new
+    db = dbm.ConnectionManager(path, profile)
+    rng = random.Random(pop.seed + 2)
+    lat = []
+    with db.reader() as rconn:
+        for b in range(batches):
+            urls = [pop.url(rng.randrange(pop.size)) if rng.random() < 0.67 else f"https://new.example/{b}/{k}/" for k in range(batch)]
+            t0 = time.perf_counter()
+            dbm.known_urls(rconn, urls)
+            lat.append(time.perf_counter() - t0)
+    db.close()
+    return {'batch': batch, 'known_urls': _pct(lat), 'urls_per_second': round(batches * batch / sum(lat), 1)}
+
+
+def bench_connections(path: str, sites: int, profile: str = 'default') -> Dict[str, Any]:
+    # Per-site connection setup: ensure_db() for every site against a manager lending a
+    # writer and a reader from its pool
+    t0 = time.perf_counter()
+    for _ in range(sites):
+        dbm.ensure_db(path, dbm.storage_pragmas(profile)).close()
+    per_site = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    db = dbm.ConnectionManager(path, profile)
+    for _ in range(sites):
+        with db.writer(), db.reader():
+            pass
+    db.close()
+    managed = time.perf_counter() - t0
+    return {'sites': sites, 'ensure_db_per_site_us': round(per_site / sites * 1e6, 1), 'manager_per_site_us': round(managed / sites * 1e6, 1)}
+
+
+def _writer(args: Tuple[str, int, int, int, int, float, List[str], int, str]) -> Tuple[int, float, List[float]]:
+    path, size, seed, worker, ops, new_ratio, pragmas, run_id, profile = args
+    pop = Population(size, seed)
+    conn = _connect(path, pragmas, profile)
+    rng = random.Random(seed * 1000 + worker)
+    lat = []
+    t0 = time.perf_counter()
+    for k in range(ops):
+        if rng.random() < new_ratio:
+            url = f"https://new{worker}.example/bench/{run_id}/{k}/"
+        else:
+            url = pop.url(rng.randrange(size))
+        s = time.perf_counter()
+        # Same write path as the runner: one short transaction per discovered URL
+        with dbm.transaction(conn):
+            dbm.upsert_url(conn, url, canonical=None, discovered_via='sitemap', http_status=None, lastmod='2024-01-01', etag=None)
+            dbm.touch_url_by_source(conn, pop.source(k), url, run_id)
+        lat.append(time.perf_counter() - s)
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return ops, elapsed, lat
+
+
+def bench_writers(path: str, pop: Population, writers: List[int], ops: int, new_ratio: float, pragmas: List[str], profile: str = 'default') -> Dict[str, Any]:
+    out = {}
+    mp = multiprocessing.get_context('spawn')
+    for n in writers:
+        conn = dbm.ensure_db(path)
+        run_id = dbm.start_run(conn, f'bench-writers-{n}')
+        conn.close()
+        jobs = [(path, pop.size, pop.seed, w, ops, new_ratio, pragmas, run_id, profile) for w in range(n)]
+        t0 = time.perf_counter()
+        with mp.Pool(n) as pool:
+            results = pool.map(_writer, jobs)
+        wall = time.perf_counter() - t0
+        total_ops = sum(r[0] for r in results)
+        lat = [x for r in results for x in r[2]]
+        out[str(n)] = {'ops': total_ops, 'wall_seconds': round(wall, 3), 'ops_per_second': round(total_ops / wall, 1), 'latency': _pct(lat), 'run_id': run_id}
+    return out
+
+
+def bench_exports(path: str, pop: Population, run_id: int, pragmas: List[str], profile: str = 'default') -> Dict[str, Any]:
+    conn = _connect(path, pragmas, profile)
+    res = {}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        n = fn()
+        res[name] = {'seconds': round(time.perf_counter() - t0, 4), 'rows': n}
+
+    timed('query_new_urls_for_run', lambda: sum(1 for _ in dbm.query_new_urls_for_run(conn, run_id)))
+    now = int(time.time())
+    timed('query_new_urls_window_1d', lambda: sum(1 for _ in dbm.query_new_urls(conn, start_ts=now - 86400, end_ts=now)))
+    timed('query_latest_all_1d', lambda: sum(1 for _ in dbm.query_latest_all(conn, since_ts=now - 86400)))
+    timed('site_counts_for_run', lambda: sum(1 for _ in dbm.site_counts_for_run(conn, run_id)))
+    sample = [f"src{k}" for k in range(min(pop.n_sources, 50))]
+    timed('counts_for_site_x50', lambda: sum(1 for sid in sample if dbm.counts_for_site(conn, sid)))
+    conn.close()
+    return res
+
+
+def run_size(size: int, args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    pop = Population(size, args.seed)
+    path = os.path.join(workdir, f"fill-{size}-{args.seed}.db")
+    fill_seconds = None
+    if not (args.reuse and os.path.exists(path)):
+        for ext in ('', '-wal', '-shm'):
+            if os.path.exists(path + ext):
+                os.remove(path + ext)
+        fill_seconds = round(fill(path, pop), 2)
+    res: Dict[str, Any] = {'urls': size, 'sources': pop.n_sources, 'hosts': pop.n_hosts, 'fill_seconds': fill_seconds}
+    res['file_bytes_filled'] = os.path.getsize(path)
+    res['profiles'] = {}
+    for profile in args.profiles:
+        bench_lookups(path, pop, max(1, args.lookups // 10), args.pragma, profile)
+        r: Dict[str, Any] = {'pragmas': dbm.storage_pragmas(profile)}
+        r['lookups'] = bench_lookups(path, pop, args.lookups, args.pragma, profile)
+        r['membership'] = bench_membership(path, pop, args.membership_batches, 500, profile)
+        r['connections'] = bench_connections(path, 200, profile)
+        r['writers'] = bench_writers(path, pop, args.writers, args.ops, args.new_ratio, args.pragma, profile)
+        last_run = r['writers'][str(args.writers[-1])]['run_id']
+        r['exports'] = bench_exports(path, pop, last_run, args.pragma, profile)
+        res['profiles'][profile] = r
+    conn = dbm.ensure_db(path)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    res['file_bytes_after'] = os.path.getsize(path)
+    if not args.reuse and not args.workdir:
+        os.remove(path)
+    return res
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='Benchmark src.core.db at scale')
+    ap.add_argument('--sizes', default='1e6', help='Comma-separated URL counts, e.g. 1e6,1e7,5e7')
+    ap.add_argument('--writers', default='1,2,4', help='Comma-separated concurrent writer process counts')
+    ap.add_argument('--ops', type=int, default=5000, help='Write operations per writer')
+    ap.add_argument('--new-ratio', type=float, default=0.2, help='Share of writes that insert a new URL')
+    ap.add_argument('--lookups', type=int, default=20000, help='Lookup samples per kind')
+    ap.add_argument('--pragma', action='append', default=[], help='Extra PRAGMA applied to measurement connections (repeatable)')
+    ap.add_argument('--profiles', default='default,fast', help=f"Comma-separated storage profiles to measure ({', '.join(dbm.STORAGE_PROFILES)})")
+    ap.add_argument('--membership-batches', type=int, default=200, help='known_urls() batches of 500 URLs per profile')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--workdir', default=None, help='Keep filled databases here (default: temporary directory)')
+    ap.add_argument('--reuse', action='store_true', help='Reuse an existing filled database from --workdir')
+    ap.add_argument('--out', default=None, help='Result JSON path (default bench/results/db-<time>-<commit>.json)')
+    args = ap.parse_args(argv)
+    args.writers = [int(x) for x in args.writers.split(',') if x]
+    args.profiles = [x for x in args.profiles.split(',') if x]
+    for profile in args.profiles:
+        if profile not in dbm.STORAGE_PROFILES:
+            ap.error(f"unknown profile {profile!r}")
+
+    sizes = [int(float(x)) for x in args.sizes.split(',') if x]
+    result: Dict[str, Any] = {
+        'kind': 'db',
+        'commit': _git_commit(),
+        'timestamp': datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'sqlite': sqlite3.sqlite_version,
+        'config': {'writers': args.writers, 'ops': args.ops, 'new_ratio': args.new_ratio, 'lookups': args.lookups, 'pragmas': args.pragma, 'profiles': args.profiles, 'seed': args.seed},
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='lh-dbbench-') as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for size in sizes:
+            r = run_size(size, args, workdir)
+            result['sizes'][str(size)] = r
+            print(f"{size} urls: fill={r['fill_seconds']}s size={r['file_bytes_after'] // (1 << 20)}MiB")
+            for profile, p in r['profiles'].items():
+                lk = p['lookups']['has_url_hit']
+                wr = ", ".join(f"{n}w={v['ops_per_second']}/s" for n, v in p['writers'].items())
+                cn = p['connections']
+                print(f"  {profile}: has_url p50={lk['p50_us']}us p99={lk['p99_us']}us membership={p['membership']['urls_per_second']}/s "
+                      f"connect/site={cn['ensure_db_per_site_us']}us->{cn['manager_per_site_us']}us writes: {wr}")
+    out = args.out or os.path.join(REPO_ROOT, 'bench', 'results', f"db-{result['timestamp'].replace(':', '')}-{(result['commit'] or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    print(f"results: {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+"""End-to-end benchmark: run the real runner against a local synthetic site farm.
+
+    python -m bench.e2e --scenario small
+    python -m bench.e2e --scenario large --concurrency 8 --processes 4
+    python -m bench.e2e --compare bench/results/a.json bench/results/b.json
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import orjson
+import yaml
+
+from bench.farm import SiteFarm, SiteSpec
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS: Dict[str, List[Dict[str, Any]]] = {
+    'small': [
+        {'kind': 'wordpress', 'count': 2, 'items': 250},
+        {'kind': 'rss', 'count': 2, 'items': 100},
+        {'kind': 'atom', 'count': 1, 'items': 100},
+        {'kind': 'sitemap', 'count': 2, 'items': 1000, 'urls_per_sitemap': 400, 'gzip_sitemaps': True},
+        {'kind': 'crawl', 'count': 1, 'items': 200, 'sections': 5},
+    ],
+    'default': [
+        {'kind': 'wordpress', 'count': 5, 'items': 1000},
+        {'kind': 'rss', 'count': 5, 'items': 500},
+        {'kind': 'atom', 'count': 5, 'items': 500},
+        {'kind': 'sitemap', 'count': 3, 'items': 20000, 'urls_per_sitemap': 5000},
+        {'kind': 'sitemap', 'count': 2, 'items': 20000, 'urls_per_sitemap': 5000, 'gzip_sitemaps': True},
+        {'kind': 'crawl', 'count': 3, 'items': 1000, 'sections': 20},
+    ],
+    'large': [
+        {'kind': 'wordpress', 'count': 10, 'items': 5000},
+        {'kind': 'rss', 'count': 20, 'items': 2000},
+        {'kind': 'sitemap', 'count': 4, 'items': 100000, 'urls_per_sitemap': 50000, 'gzip_sitemaps': True},
+        {'kind': 'crawl', 'count': 5, 'items': 5000, 'sections': 50},
+    ],
+}
+
+
+def build_specs(scenario: str, *, latency_ms: float, etag: str, rate_429: float, scale: float) -> List[SiteSpec]:
+    specs = []
+    for group in SCENARIOS[scenario]:
+        g = dict(group)
+        kind, count = g.pop('kind'), g.pop('count')
+        g['items'] = max(1, int(g['items'] * scale))
+        for n in range(count):
+            specs.append(SiteSpec(
+                id=f"{kind}{n}", kind=kind, latency_ms=latency_ms, etag=etag, rate_429=rate_429, seed=n, **g,
+            ))
+    return specs
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _read_counts(run_dir: str) -> Dict[str, int]:
+    new = total = errors = 0
+    with open(os.path.join(run_dir, 'per_site_counts.csv')) as f:
+        for row in csv.DictReader(f):
+            new += int(row['new_count'])
+            total += int(row['total_seen'])
+            errors += int(row['errors'])
+    return {'new': new, 'total_seen': total, 'errors': errors}
+
+
+def _discovered(run_dir: str) -> int:
+    n = 0
+    with open(os.path.join(run_dir, 'run.log')) as f:
+        for line in f:
+            if '] metrics: ' in line:
+                n += orjson.loads(line.split('] metrics: ', 1)[1]).get('discovered', 0)
+    return n
+
+
+def run_phase(farm: SiteFarm, workdir: str, name: str, runner_args: List[str]) -> Dict[str, Any]:
+    farm.reset_stats()
+    out_dir = os.path.join(workdir, 'runs', name)
+    rss_path = os.path.join(workdir, f'{name}.rss.json')
+    cmd = [
+        sys.executable, '-m', 'bench._child', rss_path,
+        '--sites', os.path.join(workdir, 'sites.yaml'),
+        '--out', out_dir,
+        '--db', os.path.join(workdir, 'urls.db'),
+        '--retention', 'off',
+        *runner_args,
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"runner failed in phase {name} (rc={proc.returncode}): {proc.stdout}")
+    with open(rss_path, 'rb') as f:
+        child = orjson.loads(f.read())
+    run_dir = sorted(glob.glob(os.path.join(out_dir, '*')))[-1]
+    site_stats = farm.stats()
+    requests = sum(s['requests'] for s in site_stats.values())
+    status: Dict[str, int] = {}
+    for s in site_stats.values():
+        for k, v in s['status'].items():
+            status[k] = status.get(k, 0) + v
+    discovered = _discovered(run_dir)
+    res = {
+        'wall_seconds': round(wall, 3),
+        'peak_rss_bytes': child['peak_rss_bytes'],
+        'requests': requests,
+        'requests_by_status': status,
+        'bytes_served': sum(s['bytes'] for s in site_stats.values()),
+        'discovered': discovered,
+        'urls_per_second': round(discovered / wall, 1) if wall > 0 else None,
+        'sites': site_stats,
+        **_read_counts(run_dir),
+    }
+    metrics_path = os.path.join(run_dir, 'metrics.json')
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'rb') as f:
+            stages = orjson.loads(f.read()).get('stages', {})
+        res['stage_seconds'] = {k: v['total']['sum'] for k, v in stages.items()}
+    return res
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    specs = build_specs(args.scenario, latency_ms=args.latency_ms, etag=args.etag, rate_429=args.rate_429, scale=args.scale)
+    runner_args = ['--concurrency', str(args.concurrency), '--processes', str(args.processes)]
+    with tempfile.TemporaryDirectory(prefix='lh-bench-') as workdir, SiteFarm(specs) as farm:
+        with open(os.path.join(workdir, 'sites.yaml'), 'w') as f:
+            yaml.safe_dump(farm.sites_config(), f, sort_keys=False)
+        phases = {}
+        # cold: empty database, everything is new; warm: same content again (conditional GETs, no new URLs)
+        for name in ['cold'] + [f'warm{i}' if args.warm_runs > 1 else 'warm' for i in range(1, args.warm_runs + 1)]:
+            phases[name] = run_phase(farm, workdir, name, runner_args)
+            db_path = os.path.join(workdir, 'urls.db')
+            phases[name]['db_bytes'] = os.path.getsize(db_path) if os.path.exists(db_path) else 0
+    return {
+        'kind': 'e2e',
+        'commit': _git_commit(),
+        'timestamp': datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': sys.version.split()[0],
+        'config': {
+            'scenario': args.scenario, 'scale': args.scale, 'sites': len(specs),
+            'latency_ms': args.latency_ms, 'etag': args.etag, 'rate_429': args.rate_429,
+            'concurrency': args.concurrency, 'processes': args.processes,
+        },
+        'phases': phases,
+    }
+
+
+def compare(paths: List[str]) -> None:
+    docs = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            docs.append(orjson.loads(f.read()))
+    base = docs[0]
+    keys = ('wall_seconds', 'urls_per_second', 'peak_rss_bytes', 'requests', 'new')
+    for phase in base['phases']:
+        print(f"[{phase}]")
+        for k in keys:
+            vals = [d['phases'].get(phase, {}).get(k) for d in docs]
+            row = f"  {k:<16}" + "".join(f"{str(v):>16}" for v in vals)
+            if isinstance(vals[0], (int, float)) and vals[0] and isinstance(vals[-1], (int, float)):
+                row += f"   {100.0 * (vals[-1] - vals[0]) / vals[0]:+.1f}%"
+            print(row)
+    print("  commits: " + ", ".join(str((d.get('commit') or '?')[:10]) for d in docs))
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='LinkHarvest end-to-end benchmark against a local synthetic site farm')
+    ap.add_argument('--scenario', choices=sorted(SCENARIOS), default='small')
+    ap.add_argument('--scale', type=float, default=1.0, help='Multiply every site size by this factor')
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='Latency added to every farm response')
+    ap.add_argument('--etag', choices=['stable', 'none', 'rotating'], default='stable', help='Farm validator behaviour')
+    ap.add_argument('--rate-429', type=float, default=0.0, help='Probability of a 429 answer per request')
+    ap.add_argument('--concurrency', type=int, default=4)
+    ap.add_argument('--processes', type=int, default=1)
+    ap.add_argument('--warm-runs', type=int, default=1, help='Repeat runs after the cold run')
+    ap.add_argument('--out', default=None, help='Result JSON path (default bench/results/e2e-<scenario>-<time>-<commit>.json)')
+    ap.add_argument('--compare', nargs='+', metavar='RESULT', help='Print a comparison of result files instead of running')
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        compare(args.compare)
+        return 0
+    result = run_benchmark(args)
+    out = args.out or os.path.join(
+        REPO_ROOT, 'bench', 'results',
+        f"e2e-{args.scenario}-{result['timestamp'].replace(':', '')}-{(result['commit'] or 'nogit')[:10]}.json",
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    for name, ph in result['phases'].items():
+        print(f"{name}: {ph['wall_seconds']}s, {ph['urls_per_second']} urls/s, requests={ph['requests']}, new={ph['new']}, peak_rss={ph['peak_rss_bytes'] // (1 << 20)}MiB")
+    print(f"results: {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
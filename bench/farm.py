@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+BASE_TS = 1704067200  # 2024-01-01T00:00:00Z; item timestamps count back from here
+
+
+class SiteSpec(NamedTuple):
+    id: str
+    kind: str                  # wordpress | rss | atom | sitemap | crawl
+    items: int = 200           # posts / feed entries / sitemap URLs / crawl articles
+    latency_ms: float = 0.0    # added to every response
+    etag: str = 'stable'       # stable | none | rotating
+    rate_429: float = 0.0      # probability of answering 429 instead
+    urls_per_sitemap: int = 50000
+    gzip_sitemaps: bool = False
+    sections: int = 10         # crawl: number of listing pages
+    seed: int = 0
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.status: Dict[int, int] = {}
+        self.bytes = 0
+
+    def add(self, status: int, n: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.status[status] = self.status.get(status, 0) + 1
+            self.bytes += n
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'requests': self.requests, 'status': {str(k): v for k, v in sorted(self.status.items())}, 'bytes': self.bytes}
+
+
+def _iso(i: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(BASE_TS - i * 3600))
+
+
+def _rfc822(i: int) -> str:
+    return formatdate(BASE_TS - i * 3600, usegmt=True)
+
+
+class SyntheticSite:
+    """Generates one site's documents deterministically from its spec."""
+
+    def __init__(self, spec: SiteSpec):
+        self.spec = spec
+        self.stats = _Stats()
+        self._rng = random.Random(spec.seed)
+        self._rng_lock = threading.Lock()
+        self._etag_seq = 0
+        self.base = ''  # set once the server is bound
+
+    def article(self, i: int) -> str:
+        return f"{self.base}/posts/{i}/"
+
+    # --- documents -------------------------------------------------------------
+    def wordpress_page(self, page: int, per_page: int) -> Optional[bytes]:
+        start = (page - 1) * per_page
+        if page < 1 or start >= self.spec.items:
+            return None
+        end = min(self.spec.items, start + per_page)
+        return orjson.dumps([{'link': self.article(i), 'modified': _iso(i)} for i in range(start, end)])
+
+    def rss(self) -> bytes:
+        items = ''.join(
+            f"<item><title>Post {i}</title><link>{self.article(i)}</link><guid>{self.article(i)}</guid>"
+            f"<pubDate>{_rfc822(i)}</pubDate></item>"
+            for i in range(self.spec.items)
+        )
+        return f'<?xml version="1.0"?><rss version="2.0"><channel><title>{self.spec.id}</title><link>{self.base}/</link>{items}</channel></rss>'.encode()
+
+    def atom(self) -> bytes:
+        entries = ''.join(
+            f'<entry><title>Post {i}</title><link rel="alternate" href="{self.article(i)}"/><id>{self.article(i)}</id>'
+            f'<updated>{_iso(i)}Z</updated></entry>'
+            for i in range(self.spec.items)
+        )
+        return f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><title>{self.spec.id}</title><id>{self.base}/</id><updated>{_iso(0)}Z</updated>{entries}</feed>'.encode()
+
+    def _n_sitemaps(self) -> int:
+        return max(1, -(-self.spec.items // self.spec.urls_per_sitemap))
+
+    def sitemap_index(self) -> bytes:
+        ext = 'xml.gz' if self.spec.gzip_sitemaps else 'xml'
+        maps = ''.join(f"<sitemap><loc>{self.base}/sitemap-{n}.{ext}</loc></sitemap>" for n in range(self._n_sitemaps()))
+        return f'<?xml version="1.0"?><sitemapindex xmlns="{SITEMAP_NS}">{maps}</sitemapindex>'.encode()
+
+    def sitemap(self, n: int) -> Optional[bytes]:
+        if n < 0 or n >= self._n_sitemaps():
+            return None
+        start = n * self.spec.urls_per_sitemap
+        end = min(self.spec.items, start + self.spec.urls_per_sitemap)
+        urls = ''.join(f"<url><loc>{self.article(i)}</loc><lastmod>{_iso(i)}</lastmod></url>" for i in range(start, end))
+        return f'<?xml version="1.0"?><urlset xmlns="{SITEMAP_NS}">{urls}</urlset>'.encode()
+
+    def crawl_home(self) -> bytes:
+        links = ''.join(f'<a href="/section/{k}/">Section {k}</a>' for k in range(self.spec.sections))
+        return f"<html><body>{links}</body></html>".encode()
+
+    def crawl_section(self, k: int) -> Optional[bytes]:
+        if k < 0 or k >= self.spec.sections:
+            return None
+        ids = range(k, self.spec.items, self.spec.sections)
+        links = ''.join(f'<a href="/posts/{i}/">Post {i}</a>' for i in ids)
+        return f'<html><body><a href="/">Home</a>{links}</body></html>'.encode()
+
+    def article_page(self, i: int) -> Optional[bytes]:
+        if i < 0 or i >= self.spec.items:
+            return None
+        return (
+            f'<html><head><link rel="canonical" href="{self.article(i)}"></head>'
+            f'<body><a href="/">Home</a><p>Post {i}</p></body></html>'
+        ).encode()
+
+    # --- routing ---------------------------------------------------------------
+    def route(self, path: str, query: Dict[str, List[str]]):
+        """Returns (body, content_type, is_raw_gzip) or None for 404."""
+        kind = self.spec.kind
+        if path == '/robots.txt':
+            return b"User-agent: *\nAllow: /\n", 'text/plain', False
+        if path.startswith('/posts/'):
+            body = self.article_page(_int(path.split('/')[2]))
+            return (body, 'text/html; charset=utf-8', False) if body else None
+        if kind == 'wordpress' and path == '/wp-json/wp/v2/posts':
+            body = self.wordpress_page(_int(query.get('page', ['1'])[0]), _int(query.get('per_page', ['10'])[0]))
+            return (body, 'application/json', False) if body else ('__wp_end__', '', False)
+        if kind == 'rss' and path == '/feed/':
+            return self.rss(), 'application/rss+xml', False
+        if kind == 'atom' and path == '/atom.xml':
+            return self.atom(), 'application/atom+xml', False
+        if kind == 'sitemap':
+            if path == '/sitemap_index.xml':
+                return self.sitemap_index(), 'application/xml', False
+            if path.startswith('/sitemap-'):
+                name = path[len('/sitemap-'):]
+                raw_gz = name.endswith('.xml.gz')
+                body = self.sitemap(_int(name.split('.')[0]))
+                if body is None:
+                    return None
+                return (gzip.compress(body, 5), 'application/x-gzip', True) if raw_gz else (body, 'application/xml', False)
+        if kind == 'crawl':
+            if path == '/':
+                return self.crawl_home(), 'text/html; charset=utf-8', False
+            if path.startswith('/section/'):
+                body = self.crawl_section(_int(path.split('/')[2]))
+                return (body, 'text/html; charset=utf-8', False) if body else None
+        return None
+
+    def entry_config(self) -> Dict[str, Any]:
+        """Site entry for the runner's YAML."""
+        cfg: Dict[str, Any] = {'id': self.spec.id, 'rate_limit_rps': 1000.0}
+        kind = self.spec.kind
+        if kind == 'wordpress':
+            cfg.update(kind='wordpress', base=f"{self.base}/", max_pages=max(1, -(-self.spec.items // 100)) + 1)
+        elif kind == 'rss':
+            cfg.update(kind='rss', feed=f"{self.base}/feed/")
+        elif kind == 'atom':
+            cfg.update(kind='rss', feed=f"{self.base}/atom.xml")
+        elif kind == 'sitemap':
+            cfg.update(kind='sitemap', sitemap=f"{self.base}/sitemap_index.xml")
+        elif kind == 'crawl':
+            cfg.update(kind='crawl', base=f"{self.base}/", scope_host=urlsplit(self.base).netloc, max_depth=2)
+        return cfg
+
+    def _roll_429(self) -> bool:
+        if self.spec.rate_429 <= 0:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.spec.rate_429
+
+    def _etag_for(self, body: bytes) -> Optional[str]:
+        if self.spec.etag == 'none':
+            return None
+        if self.spec.etag == 'rotating':
+            with self._rng_lock:
+                self._etag_seq += 1
+                return f'"r{self._etag_seq}"'
+        return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this, Nagle plus
+            # delayed ACKs add ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes = b'', headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body and self.command != 'HEAD':
+                    self.wfile.write(body)
+                site.stats.add(status, len(body))
+
+            def do_GET(self):
+                if site.spec.latency_ms:
+                    time.sleep(site.spec.latency_ms / 1000.0)
+                if site._roll_429():
+                    self._send(429, b'', {'Retry-After': '1'})
+                    return
+                parts = urlsplit(self.path)
+                routed = site.route(parts.path, parse_qs(parts.query))
+                if routed is None:
+                    self._send(404, b'not found', {'Content-Type': 'text/plain'})
+                    return
+                body, ctype, _ = routed
+                if body == '__wp_end__':
+                    # WordPress answers 400 rest_post_invalid_page_number past the last page
+                    self._send(400, b'{"code":"rest_post_invalid_page_number"}', {'Content-Type': 'application/json'})
+                    return
+                headers = {'Content-Type': ctype}
+                etag = site._etag_for(body)
+                if etag:
+                    headers['ETag'] = etag
+                    if self.headers.get('If-None-Match') == etag:
+                        self._send(304, b'', {'ETag': etag})
+                        return
+                self._send(200, body, headers)
+
+            do_HEAD = do_GET
+
+        return Handler
+
+
+def _int(s: str) -> int:
+    try:
+        return int(s)
+    except (TypeError, ValueError):
+        return -1
+
+
+class SiteFarm:
+    """One local HTTP server (own port, hence own host for rate limiting) per synthetic site."""
+
+    def __init__(self, specs: List[SiteSpec], host: str = '127.0.0.1'):
+        self.sites = [SyntheticSite(s) for s in specs]
+        self._host = host
+        self._servers: List[ThreadingHTTPServer] = []
+        self._threads: List[threading.Thread] = []
+
+    def __enter__(self) -> 'SiteFarm':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        for site in self.sites:
+            srv = ThreadingHTTPServer((self._host, 0), site.handler())
+            srv.daemon_threads = True
+            site.base = f"http://{self._host}:{srv.server_address[1]}"
+            t = threading.Thread(target=srv.serve_forever, name=f"farm-{site.spec.id}", daemon=True)
+            t.start()
+            self._servers.append(srv)
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        for srv in self._servers:
+            srv.shutdown()
+            srv.server_close()
+        self._servers.clear()
+        self._threads.clear()
+
+    def sites_config(self) -> Dict[str, Any]:
+        return {'sites': [s.entry_config() for s in self.sites]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {s.spec.id: s.stats.to_dict() for s in self.sites}
+
+    def reset_stats(self) -> None:
+        for s in self.sites:
+            s.stats = _Stats()
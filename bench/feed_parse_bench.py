@@ -0,0 +1,129 @@
+"""Feed parsing benchmark: lxml fast path vs feedparser in RSSAdapter.
+
+    python -m bench.feed_parse_bench                       # rss/atom/rdf at 100, 1000, 10000 items
+    python -m bench.feed_parse_bench --items 50000 --formats rss --repeat 3
+
+Feeds are synthetic but shaped like real ones: HTML descriptions, content:encoded
+bodies, categories and authors, which feedparser sanitizes and the fast path skips.
+Both paths must return identical items; a mismatch fails the run.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import orjson
+
+from bench.e2e import REPO_ROOT, _git_commit
+from src.adapters.rss import RSSAdapter
+
+BODY = ('<p>Lorem ipsum <a href="/tag/x">dolor</a> sit amet, <b>consectetur</b> adipiscing elit. '
+        '<img src="/img/{i}.jpg" alt=""> Sed do eiusmod tempor &amp; incididunt ut labore.</p>') * 3
+
+
+def _date(i: int) -> str:
+    return datetime.fromtimestamp(1_700_000_000 + i * 3600, tz=timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+
+def make_rss(n: int) -> str:
+    items = ''.join(
+        f'<item><title>Post {i} &amp; more</title><link>https://news.example/{i // 100}/post-{i}?utm=rss&amp;x=1</link>'
+        f'<guid isPermaLink="false">post-{i}</guid><pubDate>{_date(i)}</pubDate><dc:creator>Author {i % 7}</dc:creator>'
+        f'<category>news</category><category>topic-{i % 13}</category>'
+        f'<description><![CDATA[{BODY.format(i=i)}]]></description>'
+        f'<content:encoded><![CDATA[{BODY.format(i=i) * 2}]]></content:encoded></item>'
+        for i in range(n)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+            'xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><title>Bench</title>'
+            f'<link>https://news.example/</link><description>d</description>{items}</channel></rss>')
+
+
+def make_atom(n: int) -> str:
+    entries = ''.join(
+        f'<entry><title type="html">Post {i} &amp;lt;b&amp;gt;</title><id>tag:news.example,2024:{i}</id>'
+        f'<link rel="alternate" type="text/html" href="https://news.example/{i // 100}/post-{i}"/>'
+        f'<link rel="replies" type="application/atom+xml" href="https://news.example/{i}/comments.atom"/>'
+        f'<updated>2024-01-01T00:00:{i % 60:02d}Z</updated><published>2023-12-31T00:00:00Z</published>'
+        f'<author><name>Author {i % 7}</name><uri>https://news.example/a/{i % 7}</uri></author>'
+        f'<category term="topic-{i % 13}"/><content type="html"><![CDATA[{BODY.format(i=i) * 2}]]></content></entry>'
+        for i in range(n)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom"><title>Bench</title><id>urn:bench</id>{entries}</feed>'
+
+
+def make_rdf(n: int) -> str:
+    items = ''.join(
+        f'<item rdf:about="https://news.example/post-{i}"><title>Post {i}</title><link>https://news.example/post-{i}</link>'
+        f'<dc:date>2024-01-01T00:00:00Z</dc:date><description>{BODY.format(i=i).replace("<", "&lt;")}</description></item>'
+        for i in range(n)
+    )
+    return ('<?xml version="1.0"?><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/" '
+            f'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel rdf:about="https://news.example/"><title>Bench</title></channel>{items}</rdf:RDF>')
+
+
+MAKERS: Dict[str, Callable[[int], str]] = {'rss': make_rss, 'atom': make_atom, 'rdf': make_rdf}
+
+
+def _best(fn: Callable[[str], List], text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_case(fmt: str, n: int, repeat: int) -> Dict[str, Any]:
+    text = MAKERS[fmt](n)
+    fast_items = RSSAdapter.parse_feed_lxml(text)
+    slow_items = RSSAdapter.parse_feed_feedparser(text)
+    if fast_items != slow_items:
+        raise SystemExit(f"{fmt}/{n}: fast path and feedparser disagree")
+    fast = _best(RSSAdapter.parse_feed_lxml, text, repeat)
+    slow = _best(RSSAdapter.parse_feed_feedparser, text, repeat)
+    return {
+        'bytes': len(text.encode('utf-8')),
+        'items': len(fast_items),
+        'lxml_seconds': round(fast, 6),
+        'feedparser_seconds': round(slow, 6),
+        'lxml_items_per_second': round(n / fast) if fast else None,
+        'feedparser_items_per_second': round(n / slow) if slow else None,
+        'speedup': round(slow / fast, 1) if fast else None,
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='Compare RSSAdapter feed parsing paths')
+    ap.add_argument('--items', default='100,1000,10000', help='Comma-separated item counts per feed')
+    ap.add_argument('--formats', default='rss,atom,rdf', help='Comma-separated subset of rss,atom,rdf')
+    ap.add_argument('--repeat', type=int, default=3, help='Timed repetitions per case (best is kept)')
+    ap.add_argument('--out', default=None, help='Result JSON path (default bench/results/feed-<time>-<commit>.json)')
+    args = ap.parse_args(argv)
+
+    result: Dict[str, Any] = {
+        'kind': 'feed_parse',
+        'commit': _git_commit(),
+        'timestamp': datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'config': {'repeat': args.repeat},
+        'cases': {},
+    }
+    for fmt in [x for x in args.formats.split(',') if x]:
+        for n in [int(float(x)) for x in args.items.split(',') if x]:
+            r = run_case(fmt, n, args.repeat)
+            result['cases'][f"{fmt}-{n}"] = r
+            print(f"{fmt:5} {n:>7} items {r['bytes'] // 1024:>7}KiB: lxml={r['lxml_seconds'] * 1000:.1f}ms "
+                  f"feedparser={r['feedparser_seconds'] * 1000:.1f}ms speedup={r['speedup']}x")
+    out = args.out or os.path.join(REPO_ROOT, 'bench', 'results', f"feed-{result['timestamp'].replace(':', '')}-{(result['commit'] or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    print(f"results: {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""Crawl frontier benchmark: new articles found per fixed page budget, BFS vs. priority.
+
+    python -m bench.frontier_bench                        # 5 days, 25 pages a day
+    python -m bench.frontier_bench --days 10 --max-pages 40 --new-per-day 60
+
+A synthetic news site is served in-process (httpx.MockTransport). The home page
+links to topic pages first, then to the sections and the latest articles. Topic
+pages list a fixed set of older articles and never change. Section fronts list their
+latest articles, followed by archive pages of older ones, and every article links
+back to its section and to a few older articles. Day 0 is crawled without a page limit,
+which fills the database and the page history. On each following day `--new-per-day`
+articles are published, and each mode crawls with `--max-pages`. A mode's score is
+how many of the day's new articles it found.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import httpx
+import orjson
+
+from bench.e2e import REPO_ROOT, _git_commit
+from src import runner
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.models import SiteConfig
+from src.core.robots import RobotsCache
+
+HOST = 'news.bench'
+
+
+class NewsSite:
+    def __init__(self, sections: int, topics: int, per_front: int, archive_pages: int, related: int, seed: int):
+        self.sections = [f"s{i}" for i in range(sections)]
+        self.topics = topics
+        self.topic_pages: Dict[int, List[int]] = {}
+        self.per_front = per_front
+        self.archive_pages = archive_pages
+        self.related = related
+        self.rng = random.Random(seed)
+        self.articles: List[tuple] = []  # (id, section, related ids)
+        self.by_section: Dict[str, List[int]] = {s: [] for s in self.sections}
+
+    def publish(self, n: int) -> List[str]:
+        urls = []
+        for _ in range(n):
+            aid = len(self.articles)
+            section = self.rng.choice(self.sections)
+            older = self.rng.sample(range(aid), min(self.related, aid)) if aid else []
+            self.articles.append((aid, section, older))
+            self.by_section[section].append(aid)
+            urls.append(self.url(aid))
+        return urls
+
+    @staticmethod
+    def url(aid: int) -> str:
+        return f"https://{HOST}/a/{aid}"
+
+    def _page(self, links: List[str]) -> httpx.Response:
+        body = '<html><body>' + ''.join(f'<a href="{u}">x</a>' for u in links) + '</body></html>'
+        return httpx.Response(200, text=body)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        parts = request.url.path.strip('/').split('/')
+        if parts == ['']:
+            latest = [self.url(a[0]) for a in self.articles[-10:]]
+            return self._page([f"https://{HOST}/topic/{t}" for t in range(self.topics)]
+                              + [f"https://{HOST}/section/{s}" for s in self.sections] + latest)
+        if parts[0] == 'topic' and len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < self.topics:
+            t = int(parts[1])
+            if t not in self.topic_pages:
+                self.topic_pages[t] = self.rng.sample(range(len(self.articles)), min(20, len(self.articles)))
+            return self._page([self.url(a) for a in self.topic_pages[t]])
+        if parts[0] == 'section' and len(parts) >= 2 and parts[1] in self.by_section:
+            page = int(parts[3]) if len(parts) == 4 else 1
+            ids = self.by_section[parts[1]][::-1][(page - 1) * self.per_front:page * self.per_front]
+            links = [self.url(a) for a in ids]
+            if page < self.archive_pages:
+                links.append(f"https://{HOST}/section/{parts[1]}/page/{page + 1}")
+            return self._page(links)
+        if parts[0] == 'a' and len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < len(self.articles):
+            _, section, older = self.articles[int(parts[1])]
+            return self._page([f"https://{HOST}/section/{section}"] + [self.url(o) for o in older])
+        return httpx.Response(404)
+
+
+def crawl(site: NewsSite, db_path: str, frontier: str, max_pages: int, max_depth: int) -> Dict[str, Any]:
+    env = runner._make_env(db_path, 1, progress=False)
+    env['http'].client.close()
+    env['http'] = HttpClient(transport=httpx.MockTransport(site.handle))
+    env['robots'] = RobotsCache(env['http'].client)
+    cfg = {'kind': 'crawl', 'base': f"https://{HOST}/", 'scope_host': HOST, 'max_depth': max_depth,
+           'max_pages': max_pages, 'frontier': frontier, 'rate_limit_rps': 1e6}
+    t0 = time.perf_counter()
+    _, counters = runner._process_site(SiteConfig(id='news', kind='crawl', cfg=cfg), 0, env)
+    env['http'].client.close()
+    return {'seconds': round(time.perf_counter() - t0, 3), 'fetched': counters['fetched'], 'inserted': counters['inserted'],
+            'top_pages': counters.get('top_pages', [])[:3]}
+
+
+def found(db_path: str, urls: List[str]) -> int:
+    conn = dbm.ensure_db(db_path)
+    try:
+        return len(dbm.known_urls(conn, urls))
+    finally:
+        conn.close()
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='Benchmark the crawl frontier on a synthetic news site')
+    ap.add_argument('--days', type=int, default=5)
+    ap.add_argument('--max-pages', type=int, default=25, help='Pages each mode may fetch per day')
+    ap.add_argument('--max-depth', type=int, default=3)
+    ap.add_argument('--sections', type=int, default=12)
+    ap.add_argument('--topics', type=int, default=30, help='Unchanging topic pages linked ahead of the sections')
+    ap.add_argument('--initial', type=int, default=600, help='Articles published before day 0')
+    ap.add_argument('--new-per-day', type=int, default=40)
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--out', default=None, help='Result JSON path (default bench/results/frontier-<time>-<commit>.json)')
+    args = ap.parse_args(argv)
+
+    modes = ('bfs', 'priority')
+    days: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as d:
+        sites = {m: NewsSite(args.sections, args.topics, 20, 10, 6, args.seed) for m in modes}
+        dbs = {m: os.path.join(d, f"{m}.db") for m in modes}
+        for m in modes:
+            sites[m].publish(args.initial)
+            crawl(sites[m], dbs[m], m, 0, args.max_depth)
+        for day in range(1, args.days + 1):
+            row: Dict[str, Any] = {'day': day}
+            for m in modes:
+                fresh = sites[m].publish(args.new_per_day)
+                rep = crawl(sites[m], dbs[m], m, args.max_pages, args.max_depth)
+                rep['new_found'] = found(dbs[m], fresh)
+                row[m] = rep
+            days.append(row)
+            print(f"day {day}: " + ', '.join(f"{m} found {row[m]['new_found']}/{args.new_per_day} in {row[m]['fetched']} pages" for m in modes))
+    totals = {m: sum(r[m]['new_found'] for r in days) for m in modes}
+    print('total: ' + ', '.join(f"{m}={totals[m]}/{args.days * args.new_per_day}" for m in modes))
+
+    result = {
+        'timestamp': datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'commit': _git_commit(),
+        'params': vars(args),
+        'days': days,
+        'totals': totals,
+    }
+    out = args.out or os.path.join(REPO_ROOT, 'bench', 'results', f"frontier-{result['timestamp'].replace(':', '')}-{(result['commit'] or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    print(f"results: {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+"""Import-time / CLI startup benchmark.
+
+    python -m bench.import_bench                  # src.runner, adapters, `runner --help`
+    python -m bench.import_bench --repeat 20 --top 15
+
+Each target is imported in a fresh interpreter (`python -X importtime`), so the numbers
+are cold-module costs as a cron run or the test suite sees them. The interpreter's own
+startup (`-c pass`) is measured separately and subtracted.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import orjson
+
+from bench.e2e import REPO_ROOT, _git_commit
+
+TARGETS = {
+    'runner': 'import src.runner',
+    'adapters.registry': 'import src.adapters',
+    'adapters.rss': 'import src.adapters.rss',
+    'adapters.sitemap': 'import src.adapters.sitemap',
+    'adapters.wordpress': 'import src.adapters.wordpress',
+    'adapters.crawl': 'import src.adapters.crawl',
+    'adapters.jscrawl': 'import src.adapters.jscrawl',
+    'runner --help': 'import sys; sys.argv = ["runner", "--help"]\nimport src.runner\ntry:\n    src.runner.main()\nexcept SystemExit:\n    pass',
+}
+# Heavy third-party modules worth flagging when they show up in a cold import
+WATCH = ('playwright', 'feedparser', 'yaml', 'lxml', 'tqdm', 'multiprocessing', 'httpx')
+
+
+def _run(code: str) -> Tuple[float, List[Tuple[str, int]]]:
+    """Wall seconds of a fresh interpreter running `code`, and (module, cumulative us) from -X importtime."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+    mods = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cum_us, name = line.split(':', 1)[1].split('|', 2)
+        # Nesting is shown by indentation after the single separator space
+        mods.append((name[1:], int(cum_us)))
+    if proc.returncode != 0:
+        raise SystemExit(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    return wall, mods
+
+
+def measure(code: str, repeat: int, top: int, startup: set) -> Dict[str, Any]:
+    walls = []
+    last: List[Tuple[str, int]] = []
+    for _ in range(repeat):
+        wall, last = _run(code)
+        walls.append(wall)
+    # Top-level entries (no leading spaces) are what the target pulled in directly; modules
+    # the bare interpreter already imports at startup (site, encodings, ...) are not its cost
+    top_level = sorted(((n, us) for n, us in last if not n.startswith(' ') and n not in startup), key=lambda x: -x[1])
+    loaded = {n.strip() for n, _ in last}
+    return {
+        'wall_ms_median': round(statistics.median(walls) * 1000, 1),
+        'wall_ms_min': round(min(walls) * 1000, 1),
+        'import_ms': round(sum(us for _, us in top_level) / 1000, 1),
+        'top_imports_ms': [[n, round(us / 1000, 1)] for n, us in top_level[:top]],
+        'heavy_loaded': sorted(w for w in WATCH if w in loaded),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='Measure cold import time of the runner and adapters')
+    ap.add_argument('--repeat', type=int, default=10, help='Fresh interpreters per target (median is reported)')
+    ap.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list per target')
+    ap.add_argument('--targets', default=','.join(TARGETS), help='Comma-separated subset of: ' + ', '.join(TARGETS))
+    ap.add_argument('--out', default=None, help='Result JSON path (default bench/results/import-<time>-<commit>.json)')
+    args = ap.parse_args(argv)
+
+    base_runs = [_run('pass') for _ in range(args.repeat)]
+    baseline_ms = round(statistics.median(w for w, _ in base_runs) * 1000, 1)
+    startup = {n for n, _ in base_runs[-1][1]}
+    result: Dict[str, Any] = {
+        'kind': 'import',
+        'commit': _git_commit(),
+        'timestamp': datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': sys.version.split()[0],
+        'config': {'repeat': args.repeat},
+        'interpreter_ms': baseline_ms,
+        'targets': {},
+    }
+    print(f"interpreter startup: {baseline_ms}ms")
+    for name in [t for t in args.targets.split(',') if t]:
+        r = measure(TARGETS[name], args.repeat, args.top, startup)
+        r['over_interpreter_ms'] = round(r['wall_ms_median'] - baseline_ms, 1)
+        result['targets'][name] = r
+        heavy = ','.join(r['heavy_loaded']) or '-'
+        print(f"{name:20} wall={r['wall_ms_median']:7.1f}ms (+{r['over_interpreter_ms']}ms) imports={r['import_ms']:7.1f}ms heavy={heavy}")
+    out = args.out or os.path.join(REPO_ROOT, 'bench', 'results', f"import-{result['timestamp'].replace(':', '')}-{(result['commit'] or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    print(f"results: {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1 +1,80 @@
-__all__ = []
+"""Adapter registry.
+
+Adapters are looked up by site `kind` and imported on first use, so a run only pays for
+the adapters (and their dependencies, e.g. Playwright for jscrawl) its sites need.
+Third-party adapters register through the `linkharvest.adapters` entry point group:
+
+    [project.entry-points."linkharvest.adapters"]
+    mastodon = "lh_mastodon.adapter:MastodonAdapter"
+
+Built-in kinds take precedence over entry points with the same name.
+"""
+from __future__ import annotations
+
+import importlib
+import threading
+from typing import Dict, List, Type
+
+ENTRY_POINT_GROUP = 'linkharvest.adapters'
+
+# kind -> "module:Class"
+_BUILTIN: Dict[str, str] = {
+    'wordpress': 'src.adapters.wordpress:WordPressAdapter',
+    'rss': 'src.adapters.rss:RSSAdapter',
+    'sitemap': 'src.adapters.sitemap:SitemapAdapter',
+    'crawl': 'src.adapters.crawl:CrawlerAdapter',
+    'jscrawl': 'src.adapters.jscrawl:JsCrawlAdapter',
+}
+
+_registered: Dict[str, str] = {}
+_loaded: Dict[str, type] = {}
+_entry_points: Dict[str, object] | None = None
+_lock = threading.Lock()
+
+
+def register_adapter(kind: str, target: str) -> None:
+    """Register (or override) the adapter for `kind`; `target` is "module:Class"."""
+    with _lock:
+        _registered[kind] = target
+        _loaded.pop(kind, None)
+
+
+def _discover_entry_points() -> Dict[str, object]:
+    global _entry_points
+    if _entry_points is None:
+        from importlib.metadata import entry_points
+        _entry_points = {ep.name: ep for ep in entry_points(group=ENTRY_POINT_GROUP)}
+    return _entry_points
+
+
+def available_kinds() -> List[str]:
+    with _lock:
+        return sorted(set(_BUILTIN) | set(_registered) | set(_discover_entry_points()))
+
+
+def adapter_kind(kind: str, cfg: Dict) -> str:
+    """Registry key for a site: `crawl` sites with `js_render: true` use the jscrawl adapter."""
+    if kind == 'crawl' and cfg.get('js_render'):
+        return 'jscrawl'
+    return kind
+
+
+def get_adapter_class(kind: str) -> Type:
+    with _lock:
+        cls = _loaded.get(kind)
+        if cls is not None:
+            return cls
+        target = _registered.get(kind) or _BUILTIN.get(kind)
+        if target is not None:
+            module, _, name = target.partition(':')
+            cls = getattr(importlib.import_module(module), name)
+        else:
+            ep = _discover_entry_points().get(kind)
+            if ep is None:
+                raise ValueError(f"Unknown site kind: {kind}")
+            cls = ep.load()
+        _loaded[kind] = cls
+        return cls
+
+
+__all__ = ['ENTRY_POINT_GROUP', 'adapter_kind', 'available_kinds', 'get_adapter_class', 'register_adapter']
@@ -1,16 +1,97 @@
 from __future__ import annotations
 
-from typing import Iterable, Dict
+import time
+from typing import Iterable, Dict, Optional, Tuple
 
-from src.core.models import Discovered
+from src.core import db as dbm
+from src.core.contenthash import content_hash, url_key
+from src.core.metrics import NULL_METRICS, Metrics
+from src.core.models import Discovered, DiscoveredBatch
 
 
 class Adapter:
+    # Upper bound on items per DiscoveredBatch (per-site override: `batch_size`)
+    batch_size = 500
+    # Entries are handed on again after this long even if their lastmod did not move, so
+    # last_seen (and with it retention and --since) keeps up (per-site: `watermark_refresh_days`)
+    watermark_refresh_days = 7
+
     def __init__(self, site_id: str, cfg: Dict, ctx: Dict):
         self.site_id = site_id
         self.cfg = cfg
         self.ctx = ctx  # contains http client, robots, scheduler, db, counters
 
+    @property
+    def metrics(self) -> Metrics:
+        return self.ctx.get('metrics') or NULL_METRICS
+
+    def validators(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """(ETag, Last-Modified) to send with a GET of `url`.
+
+        None on a retry pass: the resources in front of a deferred one did not change since
+        the failure, and a 304 on them would stop the adapter before it reaches it again.
+        """
+        if self.ctx.get('retry_pass'):
+            return None, None
+        return dbm.get_resource_etag_lastmod(self.ctx['db'], url)
+
+    def changed_body(self, url: str, body: bytes) -> Optional[str]:
+        """Content hash of `body` if it differs from the last processed body of `url`, else None.
+
+        For servers without (stable) validators: an unchanged body is handled like a 304.
+        Store the returned hash with `dbm.set_resource_hash` only after everything parsed
+        from the body has been yielded, so an interrupted run re-parses it next time.
+        """
+        h = content_hash(body)
+        if not self.ctx.get('retry_pass') and dbm.get_resource_hash(self.ctx['db'], url) == h:
+            self.ctx['counters']['skipped_unchanged'] = self.ctx['counters'].get('skipped_unchanged', 0) + 1
+            return None
+        return h
+
     def discover(self) -> Iterable[Discovered]:
         raise NotImplementedError
 
+    def discover_batches(self) -> Iterable[DiscoveredBatch]:
+        """Optional bulk interface: the runner checks, resolves and writes each batch as a unit.
+
+        Adapters that get many URLs per response (sitemaps, APIs) override this. The default
+        wraps `discover()` one item per batch, so an adapter's generator still resumes only
+        after its previous item has been written.
+        """
+        for d in self.discover():
+            yield DiscoveredBatch.of(d)
+
+    def watermark_filter(self, batch: DiscoveredBatch) -> DiscoveredBatch:
+        """Entries of `batch` that are new to this source or whose lastmod moved.
+
+        Checked against the per-source (URL key -> lastmod) index in `source_watermarks`.
+        The kept entries carry their keys, and the runner stores them in the transaction
+        that writes the entries, so a watermark never gets ahead of what was committed.
+        Per-site `watermark: false` turns the filter off.
+        """
+        if not self.cfg.get('watermark', True) or not len(batch):
+            return batch
+        keys = [url_key(u) for u in batch.urls]
+        stored = dbm.get_watermarks(self.ctx['db'], self.site_id, keys)
+        stale = int(time.time()) - int(float(self.cfg.get('watermark_refresh_days', self.watermark_refresh_days)) * 86400)
+        keep = []
+        for i, key in enumerate(keys):
+            w = stored.get(key)
+            lastmod = batch.lastmods[i]
+            if w is None or (lastmod is not None and lastmod != w[0]) or w[1] < stale:
+                keep.append(i)
+        batch.keys = keys
+        skipped = len(keys) - len(keep)
+        if skipped:
+            counters = self.ctx['counters']
+            counters['skipped_watermark'] = counters.get('skipped_watermark', 0) + skipped
+        return batch if not skipped else batch.select(keep)
+
+    def _chunked(self, batch: DiscoveredBatch) -> Iterable[DiscoveredBatch]:
+        counters = self.ctx['counters']
+        if not len(batch):
+            return
+        for chunk in batch.chunks(int(self.cfg.get('batch_size', self.batch_size))):
+            counters['discovered'] += len(chunk)
+            yield chunk
+
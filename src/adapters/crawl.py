@@ -2,15 +2,17 @@ from __future__ import annotations
 
 import re
 import time
-from collections import deque
-from typing import Iterable, Set
+from typing import Iterable
 from urllib.parse import urljoin, urlsplit
 
 from lxml import html
 
 from src.adapters.base import Adapter
 from src.core import db as dbm
+from src.core.frontier import Frontier, PageYield
+from src.core.metrics import host_of
 from src.core.models import Discovered
+from src.core.seenset import SeenSet
 
 
 class CrawlerAdapter(Adapter):
@@ -52,49 +54,70 @@ class CrawlerAdapter(Adapter):
         max_depth = int(self.cfg.get('max_depth', 2))
         recrawl_ttl = int(self.cfg.get('recrawl_ttl_seconds', 0))  # optional, 0 disables
 
-        visited: Set[str] = set()
+        # Deduplicated when enqueued, so each URL is in the queue at most once
+        seen = SeenSet(max_bytes=int(float(self.cfg.get('seen_memory_mb', 64)) * (1 << 20)))
+        seen.add(base)
         ua = self.cfg.get('user_agent')
         base_headers = dict(self.cfg.get('headers') or {})
         if ua:
             base_headers['User-Agent'] = ua
-        q = deque([(base, 0)])
+        # `frontier: bfs` is the plain breadth-first crawl: always explore, oldest first
+        explore = 1.0 if self.cfg.get('frontier', 'priority') == 'bfs' else float(self.cfg.get('explore', 0.1))
+        frontier = Frontier(explore=explore, prior=float(self.cfg.get('prior_yield', 1.0)))
+        yields = PageYield(conn, self.site_id, counters)
+        frontier.push(base, 0, yields.history([base]).get(base))
+        max_pages = int(self.cfg.get('max_pages', 0))  # 0: no limit besides the site budget
+        pages = 0
 
-        while q:
-            url, depth = q.popleft()
-            if url in visited:
-                continue
-            visited.add(url)
-            if not robots.allowed(url, user_agent=ua):
-                counters['skipped_robots'] += 1
-                continue
-            if not self._in_scope(url):
-                continue
-            # Optional TTL-based skip
-            if recrawl_ttl > 0:
-                last_seen = dbm.get_last_seen(conn, url)
-                if last_seen is not None and (time.time() - last_seen) < recrawl_ttl:
+        try:
+            while frontier:
+                if max_pages and pages >= max_pages:
+                    break
+                url, depth = frontier.pop()
+                if not robots.allowed(url, user_agent=ua):
+                    counters['skipped_robots'] += 1
                     continue
-            rl.await_slot(url, rps)
-            etag, lastmod = dbm.get_resource_etag_lastmod(conn, url)
-            try:
-                resp = http.get(url, etag=etag, last_modified=lastmod, extra_headers=base_headers)
-            except Exception:
-                counters['errors'] += 1
-                continue
-            counters['fetched'] += 1
-            counters['status'][resp.status_code] = counters['status'].get(resp.status_code, 0) + 1
-            if resp.status_code == 304:
-                # Unchanged; skip parsing and do not enqueue children
-                continue
-            if resp.status_code != 200:
-                counters['errors'] += 1
-                continue
-            dbm.set_resource_etag_lastmod(conn, url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
-            counters['parsed'] += 1
-            for link in self.extract_links(url, resp.text):
-                if not self._in_scope(link):
+                if not self._in_scope(url):
+                    continue
+                # Optional TTL-based skip
+                if recrawl_ttl > 0:
+                    last_seen = dbm.get_last_seen(conn, url)
+                    if last_seen is not None and (time.time() - last_seen) < recrawl_ttl:
+                        continue
+                rl.await_slot(url, rps)
+                etag, lastmod = self.validators(url)
+                pages += 1
+                try:
+                    resp = http.get(url, etag=etag, last_modified=lastmod, extra_headers=base_headers)
+                except Exception:
+                    counters['errors'] += 1
+                    continue
+                counters['fetched'] += 1
+                counters['status'][resp.status_code] = counters['status'].get(resp.status_code, 0) + 1
+                if resp.status_code == 304:
+                    # Unchanged; skip parsing and do not enqueue children
+                    yields.record(url)
+                    continue
+                if resp.status_code != 200:
+                    counters['errors'] += 1
+                    continue
+                dbm.set_resource_etag_lastmod(conn, url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+                body_hash = self.changed_body(url, resp.content)
+                if body_hash is None:
+                    # Identical body; prune like a 304
+                    yields.record(url)
                     continue
-                yield Discovered(url=link, canonical=None, lastmod=None, source='crawl', meta={})
-                counters['discovered'] += 1
-                if depth + 1 <= max_depth:
-                    q.append((link, depth + 1))
+                counters['parsed'] += 1
+                with self.metrics.time('parse', host_of(url)):
+                    links = [link for link in self.extract_links(url, resp.text) if self._in_scope(link)]
+                yields.record(url, links)
+                fresh = [link for link in links if depth + 1 <= max_depth and seen.add(link)]
+                history = yields.history(fresh)
+                for link in fresh:
+                    frontier.push(link, depth + 1, history.get(link))
+                for link in links:
+                    yield Discovered(url=link, canonical=None, lastmod=None, source='crawl', meta={})
+                    counters['discovered'] += 1
+                dbm.set_resource_hash(conn, url, body_hash)
+        finally:
+            seen.close()
@@ -2,16 +2,23 @@ from __future__ import annotations
 
 import re
 import time
-from collections import deque
-from typing import Iterable, Set
+from typing import Iterable
 from urllib.parse import urljoin, urlsplit
 
 from lxml import html
-from playwright.sync_api import sync_playwright
 
 from src.adapters.base import Adapter
 from src.core import db as dbm
+from src.core.contenthash import content_hash
+from src.core.frontier import Frontier, PageYield
+from src.core.metrics import host_of
 from src.core.models import Discovered
+from src.core.seenset import SeenSet
+
+# Stored in place of a page's content hash when its rendered DOM had links that its server
+# HTML lacked (an SPA shell): the server HTML then says nothing about what a render finds,
+# so neither a 304 nor an unchanged body skips the render
+CLIENT_RENDERED = 'client-rendered'
 
 
 class JsCrawlAdapter(Adapter):
@@ -61,9 +68,18 @@ class JsCrawlAdapter(Adapter):
         max_rendered = int(self.cfg.get('max_rendered_pages', 20))
         recrawl_ttl = int(self.cfg.get('recrawl_ttl_seconds', 0))  # optional, 0 disables
 
-        visited: Set[str] = set()
+        # Deduplicated when enqueued, so each URL is in the queue at most once
+        seen = SeenSet(max_bytes=int(float(self.cfg.get('seen_memory_mb', 64)) * (1 << 20)))
+        seen.add(base)
         rendered = 0
-        q = deque([(base, 0)])
+        # Rendering is the scarce budget here, so the best hubs go first (see CrawlerAdapter)
+        explore = 1.0 if self.cfg.get('frontier', 'priority') == 'bfs' else float(self.cfg.get('explore', 0.1))
+        frontier = Frontier(explore=explore, prior=float(self.cfg.get('prior_yield', 1.0)))
+        yields = PageYield(conn, self.site_id, counters)
+        frontier.push(base, 0, yields.history([base]).get(base))
+
+        # Imported here so runs without JS sites never load (or need) Playwright
+        from playwright.sync_api import sync_playwright
 
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=True)
@@ -72,11 +88,8 @@ class JsCrawlAdapter(Adapter):
             context = browser.new_context(user_agent=ua) if ua else browser.new_context()
             page = context.new_page()
             try:
-                while q and rendered < max_rendered:
-                    url, depth = q.popleft()
-                    if url in visited:
-                        continue
-                    visited.add(url)
+                while frontier and rendered < max_rendered:
+                    url, depth = frontier.pop()
 
                     if not self._in_scope(url):
                         continue
@@ -91,7 +104,8 @@ class JsCrawlAdapter(Adapter):
                             continue
                     # Preflight conditional GET to avoid rendering unchanged pages
                     rl.await_slot(url, rps)
-                    etag, lastmod = dbm.get_resource_etag_lastmod(conn, url)
+                    client_rendered = dbm.get_resource_hash(conn, url) == CLIENT_RENDERED
+                    etag, lastmod = (None, None) if client_rendered else self.validators(url)
                     extra_headers = dict(self.cfg.get('headers') or {})
                     if ua:
                         extra_headers['User-Agent'] = ua
@@ -110,13 +124,21 @@ class JsCrawlAdapter(Adapter):
                     counters['status'][resp0.status_code] = counters['status'].get(resp0.status_code, 0) + 1
                     if resp0.status_code == 304:
                         # unchanged; skip expensive render
+                        yields.record(url)
                         continue
                     if resp0.status_code != 200:
                         counters['errors'] += 1
                         continue
                     dbm.set_resource_etag_lastmod(conn, url, resp0.headers.get('ETag'), resp0.headers.get('Last-Modified'))
+                    # Unchanged server HTML of a page whose links are all in it: the rendered
+                    # page is unchanged too, skip Playwright
+                    body_hash = None if client_rendered else self.changed_body(url, resp0.content)
+                    if body_hash is None and not client_rendered:
+                        yields.record(url)
+                        continue
 
                     try:
+                        render_t0 = time.perf_counter()
                         page.set_default_navigation_timeout(30000)
                         page.set_default_timeout(30000)
                         page.goto(url, wait_until='domcontentloaded')
@@ -127,6 +149,7 @@ class JsCrawlAdapter(Adapter):
                                 # Continue even if selector didn't appear within timeout
                                 pass
                         content = page.content()
+                        self.metrics.observe('render', host_of(url), time.perf_counter() - render_t0)
                         counters['fetched'] += 1
                         counters['parsed'] += 1
                         rendered += 1
@@ -134,14 +157,23 @@ class JsCrawlAdapter(Adapter):
                         counters['errors'] += 1
                         continue
 
-                    for link in self._extract_links(url, content):
-                        if not self._in_scope(link):
-                            continue
+                    with self.metrics.time('parse', host_of(url)):
+                        links = [link for link in self._extract_links(url, content) if self._in_scope(link)]
+                        server_links = set(self._extract_links(url, resp0.text))
+                    yields.record(url, links)
+                    fresh = [link for link in links if depth + 1 <= max_depth and seen.add(link)]
+                    history = yields.history(fresh)
+                    for link in fresh:
+                        frontier.push(link, depth + 1, history.get(link))
+                    for link in links:
                         yield Discovered(url=link, canonical=None, lastmod=None, source='crawl', meta={})
                         counters['discovered'] += 1
-                        if depth + 1 <= max_depth:
-                            q.append((link, depth + 1))
+                    if server_links.issuperset(links):
+                        dbm.set_resource_hash(conn, url, body_hash or content_hash(resp0.content))
+                    else:
+                        dbm.set_resource_hash(conn, url, CLIENT_RENDERED)
             finally:
                 page.close()
                 context.close()
                 browser.close()
+                seen.close()
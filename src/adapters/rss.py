@@ -1,25 +1,197 @@
 from __future__ import annotations
 
-from typing import Iterable
+import re
+from io import BytesIO
+from typing import Iterable, List, Optional, Tuple
 
-import feedparser
+from lxml import etree
 
 from src.adapters.base import Adapter
 from src.core import db as dbm
-from src.core.models import Discovered
+from src.core.metrics import host_of
+from src.core.models import Discovered, DiscoveredBatch
+from src.core.websub import hub_links
+
+# Namespaces feedparser treats as the core feed vocabulary (matched lowercased)
+_CORE_NS = {
+    '', 'http://backend.userland.com/rss', 'http://blogs.law.harvard.edu/tech/rss',
+    'http://purl.org/rss/1.0/', 'http://my.netscape.com/rdf/simple/0.9/',
+    'http://purl.org/atom/ns#', 'http://www.w3.org/2005/atom',
+    'http://purl.org/rss/1.0/modules/rss091#',
+}
+_NS_PREFIX = {'http://purl.org/dc/elements/1.1/': 'dc', 'http://purl.org/dc/terms/': 'dcterms'}
+_RDF_ABOUT = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about'
+# Element names (as feedparser dispatches them) that feed entry.updated / entry.published
+_UPDATED = {'updated', 'modified', 'lastbuilddate', 'dc:date', 'dcterms:modified'}
+_PUBLISHED = {'published', 'issued', 'pubdate', 'dcterms:issued'}
+_FIELDS = _UPDATED | _PUBLISHED | {'link', 'guid', 'id', 'item', 'entry', 'source'}
+_HTML_TYPES = {'text/html', 'application/xhtml+xml', 'html', 'xhtml'}
+_URIFIXER = re.compile('^([A-Za-z][A-Za-z0-9+-.]*://)(/*)(.*?)')
+_ENTITY_LIKE = re.compile('&([A-Za-z0-9_]+);')
+
+
+class _Unsupported(Exception):
+    """Input the fast path does not reproduce exactly; parse it with feedparser instead."""
+
+
+def _name(el) -> str:
+    # Mirror feedparser's element naming: known namespaces map to fixed prefixes,
+    # anything else keeps the document's own prefix
+    tag = el.tag
+    if tag[0] == '{':
+        ns, local = tag[1:].split('}', 1)
+        ns = ns.lower()
+        if 'backend.userland.com/rss' in ns:
+            ns = 'http://backend.userland.com/rss'
+    else:
+        ns, local = '', tag
+    prefix = '' if ns in _CORE_NS else _NS_PREFIX.get(ns, el.prefix)
+    local = local.lower()
+    return f"{prefix.lower()}:{local}" if prefix else local
+
+
+def _text(el) -> str:
+    if len(el):
+        raise _Unsupported('markup inside a link/id/date element')
+    value = (el.text or '').strip()
+    if not value.isascii():
+        # feedparser re-decodes and remaps non-ASCII text (latin-1/cp1252 heuristics)
+        raise _Unsupported('non-ASCII value')
+    return value
+
+
+def _resolve(uri: str) -> str:
+    # feedparser joins against an empty base, which only collapses extra slashes after the scheme
+    return _URIFIXER.sub(r'\1\3', uri)
 
 
 class RSSAdapter(Adapter):
+    # While a WebSub subscription delivers a feed's updates, the feed itself is only fetched
+    # this often, as a safety net (per-site: `push_poll_seconds`; `websub: false` opts out)
+    push_poll_seconds = 6 * 3600
+
     @staticmethod
-    def parse_feed(content: str) -> Iterable[Discovered]:
+    def parse_feed(content: str | bytes) -> Iterable[Discovered]:
+        """Entries of an RSS 2.0, Atom or RDF feed as Discovered items.
+
+        Well-formed feeds go through a streaming lxml extractor that only looks at links, ids
+        and dates; malformed or unusual input falls back to feedparser. Both give the same output.
+        """
+        try:
+            return RSSAdapter.parse_feed_lxml(content)
+        except (etree.LxmlError, _Unsupported):
+            return RSSAdapter.parse_feed_feedparser(content)
+
+    @staticmethod
+    def parse_feed_feedparser(content: str | bytes) -> List[Discovered]:
+        import feedparser  # only needed for input the lxml path declines
         fp = feedparser.parse(content)
+        out = []
         for e in fp.entries:
             link = getattr(e, 'link', None) or getattr(e, 'id', None)
             lastmod = getattr(e, 'updated', None) or getattr(e, 'published', None)
             if link:
-                yield Discovered(url=link, canonical=None, lastmod=lastmod, source='rss', meta={})
+                out.append(Discovered(url=link, canonical=None, lastmod=lastmod, source='rss', meta={}))
+        return out
 
-    def discover(self) -> Iterable[Discovered]:
+    @staticmethod
+    def parse_feed_lxml(content: str | bytes) -> List[Discovered]:
+        """Fast path of parse_feed. Raises etree.LxmlError or _Unsupported where feedparser is needed."""
+        if isinstance(content, str):
+            data, encoding = content.encode('utf-8'), 'utf-8'
+        else:
+            data, encoding = content, None
+        events = etree.iterparse(BytesIO(data), events=('start', 'end'), encoding=encoding,
+                                 resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True)
+        out: List[Discovered] = []
+        depth = 0
+        entry_depth = 0  # depth of the open item/entry element, 0 outside entries
+        skip_depth = 0  # depth of an Atom <source> inside an entry, whose fields feedparser keeps apart
+        link: Optional[str] = None
+        ident: Optional[str] = None
+        updated: Optional[str] = None
+        published: Optional[str] = None
+        for event, el in events:
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    if el.getroottree().docinfo.doctype:
+                        raise _Unsupported('DOCTYPE')
+                    if _name(el) not in ('rss', 'feed', 'rdf:rdf'):
+                        raise _Unsupported('not an RSS/Atom/RDF document')
+                if 'base' in el.attrib or '{http://www.w3.org/XML/1998/namespace}base' in el.attrib:
+                    raise _Unsupported('xml:base')
+                if skip_depth:
+                    continue
+                name = _name(el)
+                if name not in _FIELDS:
+                    continue
+                if name in ('item', 'entry'):
+                    if entry_depth:
+                        raise _Unsupported('nested entry')
+                    if any(k.lower() in ('href', 'lastmod') for k in el.attrib):
+                        raise _Unsupported('CDF attributes on an entry')
+                    entry_depth = depth
+                    link = ident = updated = published = None
+                    about = el.get(_RDF_ABOUT)
+                    if about:
+                        ident = about
+                elif entry_depth:
+                    if name == 'source':
+                        skip_depth = depth
+                    elif depth != entry_depth + 1:
+                        raise _Unsupported(f'nested <{name}> inside an entry')
+                continue
+
+            if skip_depth:
+                if depth == skip_depth:
+                    skip_depth = 0
+                depth -= 1
+                continue
+            if entry_depth and depth == entry_depth + 1:
+                name = _name(el)
+                if name == 'link':
+                    attrs = {k.lower(): v for k, v in el.attrib.items() if k[0] != '{'}
+                    if 'url' in attrs or 'uri' in attrs:
+                        raise _Unsupported('link url/uri attribute')
+                    if 'href' in attrs:
+                        rel = attrs.get('rel', 'alternate').lower()
+                        ctype = attrs.get('type', 'application/atom+xml' if rel == 'self' else 'text/html').lower()
+                        if rel == 'alternate' and ctype in _HTML_TYPES:
+                            if not attrs['href'].isascii():
+                                raise _Unsupported('non-ASCII href')
+                            link = _resolve(attrs['href'])
+                    else:
+                        value = _resolve(_text(el))
+                        link = _ENTITY_LIKE.sub(r'&\1', value.replace('&amp;', '&'))
+                elif name in ('guid', 'id'):
+                    attrs = {k.lower(): v for k, v in el.attrib.items() if k[0] != '{'}
+                    permalink = attrs.get('ispermalink', 'true') == 'true'
+                    value = _text(el)
+                    if permalink and value:
+                        value = _resolve(value)
+                    ident = value
+                    if permalink and link is None:
+                        link = value
+                elif name in _UPDATED:
+                    updated = _text(el)
+                elif name in _PUBLISHED:
+                    published = _text(el)
+            elif entry_depth and depth == entry_depth:
+                entry_depth = 0
+                url = link or ident
+                if url:
+                    out.append(Discovered(url=url, canonical=None, lastmod=updated or published, source='rss', meta={}))
+                el.clear()
+                parent = el.getparent()
+                if parent is not None:
+                    while el.getprevious() is not None:
+                        del parent[0]
+            depth -= 1
+        return out
+
+    def _fetch_entries(self) -> Optional[Tuple[List[Discovered], str]]:
+        """(entries, body hash) of a changed feed, or None if there is nothing to parse."""
         http = self.ctx['http']
         robots = self.ctx['robots']
         rl = self.ctx['ratelimiter']
@@ -33,24 +205,65 @@ class RSSAdapter(Adapter):
         if ua:
             extra_headers['User-Agent'] = ua
 
+        websub = self.cfg.get('websub', True)
+        if websub and dbm.websub_covered(conn, feed_url, float(self.cfg.get('push_poll_seconds', self.push_poll_seconds))):
+            counters['skipped_push'] += 1
+            return None
         if not robots.allowed(feed_url, user_agent=ua):
             counters['skipped_robots'] += 1
-            return
+            return None
         rl.await_slot(feed_url, rps)
-        etag, lastmod = dbm.get_resource_etag_lastmod(conn, feed_url)
+        etag, lastmod = self.validators(feed_url)
         try:
             resp = http.get(feed_url, etag=etag, last_modified=lastmod, extra_headers=extra_headers)
         except Exception:
             counters['errors'] += 1
-            return
+            return None
         counters['fetched'] += 1
         counters['status'][resp.status_code] = counters['status'].get(resp.status_code, 0) + 1
         if resp.status_code == 304:
-            return
+            dbm.mark_websub_polled(conn, feed_url)
+            return None
         if resp.status_code != 200:
             counters['errors'] += 1
-            return
+            return None
         dbm.set_resource_etag_lastmod(conn, feed_url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
-        for d in self.parse_feed(resp.text):
-            counters['discovered'] += 1
+        if websub:
+            hub, topic = hub_links(resp.content, resp.links)
+            if hub:
+                dbm.note_websub_hub(conn, self.site_id, feed_url, topic or feed_url, hub)
+            dbm.mark_websub_polled(conn, feed_url)
+        body_hash = self.changed_body(feed_url, resp.content)
+        if body_hash is None:
+            return None
+        with self.metrics.time('parse', host_of(feed_url)):
+            items = list(self.parse_feed(resp.text))
+        return items, body_hash
+
+    def discover(self) -> Iterable[Discovered]:
+        fetched = self._fetch_entries()
+        if fetched is None:
+            return
+        items, body_hash = fetched
+        for d in items:
+            self.ctx['counters']['discovered'] += 1
             yield d
+        dbm.set_resource_hash(self.ctx['db'], self.cfg['feed'], body_hash)
+
+    def entry_batches(self, items: List[Discovered]) -> Iterable[DiscoveredBatch]:
+        """Feed entries as batches, minus entries whose `updated`/`published` has not moved.
+
+        Also used for content pushed by a WebSub hub (src/websub.py).
+        """
+        canonicals = [d.canonical for d in items]
+        batch = DiscoveredBatch('rss', [d.url for d in items], [d.lastmod for d in items],
+                                canonicals if any(canonicals) else None)
+        yield from self._chunked(self.watermark_filter(batch))
+
+    def discover_batches(self) -> Iterable[DiscoveredBatch]:
+        fetched = self._fetch_entries()
+        if fetched is None:
+            return
+        items, body_hash = fetched
+        yield from self.entry_batches(items)
+        dbm.set_resource_hash(self.ctx['db'], self.cfg['feed'], body_hash)
@@ -1,35 +1,52 @@
 from __future__ import annotations
 
-from typing import Iterable
+import gzip
+from typing import Iterable, List, Tuple
 
 from lxml import etree
 
 from src.adapters.base import Adapter
 from src.core import db as dbm
-from src.core.models import Discovered
+from src.core.metrics import host_of
+from src.core.models import Discovered, DiscoveredBatch
 
 
 class SitemapAdapter(Adapter):
     @staticmethod
-    def _iter_sitemap_xml(content: str) -> Iterable[Discovered]:
+    def _parse_sitemap(content: str) -> Tuple[List[str], DiscoveredBatch]:
+        """(child sitemap locations, urlset entries) of a sitemap or sitemap index."""
         ns = {
             'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'
         }
         root = etree.fromstring(content.encode('utf-8'))
         # index sitemap
+        index = []
         for smi in root.findall('.//sm:sitemap', namespaces=ns):
             loc_el = smi.find('sm:loc', namespaces=ns)
             if loc_el is not None and loc_el.text:
-                yield Discovered(url=loc_el.text.strip(), canonical=None, lastmod=None, source='sitemap', meta={'_type': 'index'})
+                index.append(loc_el.text.strip())
         # urlset sitemap
+        batch = DiscoveredBatch('sitemap')
         for url_el in root.findall('.//sm:url', namespaces=ns):
             loc_el = url_el.find('sm:loc', namespaces=ns)
             lastmod_el = url_el.find('sm:lastmod', namespaces=ns)
             if loc_el is not None and loc_el.text:
                 lastmod = lastmod_el.text.strip() if lastmod_el is not None and lastmod_el.text else None
-                yield Discovered(url=loc_el.text.strip(), canonical=None, lastmod=lastmod, source='sitemap', meta={})
+                batch.append(loc_el.text.strip(), lastmod)
+        return index, batch
+
+    @staticmethod
+    def _iter_sitemap_xml(content: str) -> Iterable[Discovered]:
+        index, batch = SitemapAdapter._parse_sitemap(content)
+        for loc in index:
+            yield Discovered(url=loc, canonical=None, lastmod=None, source='sitemap', meta={'_type': 'index'})
+        yield from batch
 
     def discover(self) -> Iterable[Discovered]:
+        for batch in self.discover_batches():
+            yield from batch
+
+    def discover_batches(self) -> Iterable[DiscoveredBatch]:
         http = self.ctx['http']
         robots = self.ctx['robots']
         rl = self.ctx['ratelimiter']
@@ -43,12 +60,13 @@ class SitemapAdapter(Adapter):
         if ua:
             base_headers['User-Agent'] = ua
 
-        def fetch(url: str) -> str | None:
+        def fetch(url: str) -> tuple[str, str] | None:
+            """(text, content hash) of a changed sitemap body, or None if there is nothing to parse."""
             if not robots.allowed(url, user_agent=ua):
                 counters['skipped_robots'] += 1
                 return None
             rl.await_slot(url, rps)
-            etag, lastmod = dbm.get_resource_etag_lastmod(conn, url)
+            etag, lastmod = self.validators(url)
             try:
                 resp = http.get(url, etag=etag, last_modified=lastmod, extra_headers=base_headers)
             except Exception:
@@ -62,24 +80,32 @@ class SitemapAdapter(Adapter):
                 counters['errors'] += 1
                 return None
             dbm.set_resource_etag_lastmod(conn, url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
-            return resp.text
+            body = resp.content
+            body_hash = self.changed_body(url, body)
+            if body_hash is None:
+                # Unchanged index: its children are not refetched, same as a 304
+                return None
+            if body[:2] == b'\x1f\x8b':
+                # sitemap.xml.gz served as a file (no Content-Encoding), so httpx did not inflate it
+                return gzip.decompress(body).decode('utf-8', errors='replace'), body_hash
+            return resp.text, body_hash
 
-        text = fetch(sitemap_url)
-        if not text:
+        fetched = fetch(sitemap_url)
+        if not fetched or not fetched[0]:
             return
-        items = list(self._iter_sitemap_xml(text))
+        text, root_hash = fetched
+        with self.metrics.time('parse', host_of(sitemap_url)):
+            index, batch = self._parse_sitemap(text)
         counters['parsed'] += 1
-        for it in items:
-            # If index, recursively fetch children
-            if it.meta.get('_type') == 'index':
-                child_text = fetch(it.url)
-                if not child_text:
-                    continue
-                for sub in self._iter_sitemap_xml(child_text):
-                    if sub.meta.get('_type') == 'index':
-                        continue
-                    counters['discovered'] += 1
-                    yield sub
-            else:
-                counters['discovered'] += 1
-                yield it
+        # If index, fetch children (one level; nested indexes are ignored)
+        for loc in index:
+            child = fetch(loc)
+            if not child or not child[0]:
+                continue
+            child_text, child_hash = child
+            with self.metrics.time('parse', host_of(loc)):
+                _, sub = self._parse_sitemap(child_text)
+            yield from self._chunked(self.watermark_filter(sub))
+            dbm.set_resource_hash(conn, loc, child_hash)
+        yield from self._chunked(self.watermark_filter(batch))
+        dbm.set_resource_hash(conn, sitemap_url, root_hash)
@@ -4,7 +4,8 @@ from typing import Dict, Iterable, List
 
 from src.adapters.base import Adapter
 from src.core import db as dbm
-from src.core.models import Discovered
+from src.core.metrics import host_of
+from src.core.models import Discovered, DiscoveredBatch
 
 
 class WordPressAdapter(Adapter):
@@ -16,13 +17,22 @@ class WordPressAdapter(Adapter):
 
     @staticmethod
     def parse_posts(json_list: List[Dict]) -> Iterable[Discovered]:
+        return iter(WordPressAdapter.posts_batch(json_list))
+
+    @staticmethod
+    def posts_batch(json_list: List[Dict]) -> DiscoveredBatch:
+        batch = DiscoveredBatch('api')
         for item in json_list:
             link = item.get('link')
-            modified = item.get('modified')
             if link:
-                yield Discovered(url=link, canonical=None, lastmod=modified, source='api', meta={})
+                batch.append(link, item.get('modified'))
+        return batch
 
     def discover(self) -> Iterable[Discovered]:
+        for batch in self.discover_batches():
+            yield from batch
+
+    def discover_batches(self) -> Iterable[DiscoveredBatch]:
         http = self.ctx['http']
         robots = self.ctx['robots']
         rl = self.ctx['ratelimiter']
@@ -43,7 +53,7 @@ class WordPressAdapter(Adapter):
                 counters['skipped_robots'] += 1
                 break
             rl.await_slot(url, rps)
-            etag, lastmod = dbm.get_resource_etag_lastmod(conn, url)
+            etag, lastmod = self.validators(url)
             try:
                 resp = http.get(url, etag=etag, last_modified=lastmod, extra_headers=extra_headers)
             except Exception:
@@ -62,16 +72,19 @@ class WordPressAdapter(Adapter):
                 break
 
             dbm.set_resource_etag_lastmod(conn, url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+            body_hash = self.changed_body(url, resp.content)
+            if body_hash is None:
+                # Same body as last time; like a 304, later pages are not refetched
+                break
             try:
-                data = resp.json()
+                with self.metrics.time('parse', host_of(url)):
+                    data = resp.json()
+                    batch = self.posts_batch(data if isinstance(data, list) else [])
             except Exception:
                 counters['errors'] += 1
                 break
-
-            items = list(self.parse_posts(data if isinstance(data, list) else []))
             counters['parsed'] += 1
-            if not items:
+            if not batch:
                 break
-            for d in items:
-                counters['discovered'] += 1
-                yield d
+            yield from self._chunked(batch)
+            dbm.set_resource_hash(conn, url, body_hash)
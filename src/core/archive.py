@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover
+    zstandard = None
+
+# Frame: MAGIC | meta_len:u32 | body_len:u32 | meta (JSON) | body (compressed)
+MAGIC = b'LHR1'
+_HEAD = struct.Struct('>4sII')
+# Request headers kept in the archive; they decide which recorded answer a replayed request gets
+_KEY_HEADERS = ('if-none-match', 'if-modified-since')
+
+
+def _compress(raw: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(raw)
+    return 'zlib', zlib.compress(raw, 6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('archive was written with zstd; install zstandard to replay it')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    return data
+
+
+class ArchiveWriter:
+    """Append-only response pack. Each record is written with a single O_APPEND write,
+    so threads and worker processes can share one file."""
+
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def append(self, meta: Dict[str, Any], raw_body: bytes) -> None:
+        codec, body = _compress(raw_body) if raw_body else ('none', b'')
+        meta = {**meta, 'codec': codec, 'size': len(raw_body)}
+        mb = orjson.dumps(meta)
+        os.write(self._fd, _HEAD.pack(MAGIC, len(mb), len(body)) + mb + body)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class ArchiveReader:
+    """Indexes a pack by scanning frame headers; bodies are read lazily on replay."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, 'rb')
+        self._lock = threading.Lock()
+        self.records: List[Tuple[Dict[str, Any], int, int]] = []  # (meta, body_offset, body_len)
+        self._exact: Dict[Tuple, List[int]] = {}
+        self._loose: Dict[Tuple[str, str], List[int]] = {}
+        self._cursor: Dict[Tuple, int] = {}
+        self._scan()
+
+    def _scan(self) -> None:
+        f = self._f
+        while True:
+            head = f.read(_HEAD.size)
+            if len(head) < _HEAD.size:
+                break  # EOF or a torn final record from an interrupted recording
+            magic, mlen, blen = _HEAD.unpack(head)
+            if magic != MAGIC:
+                raise ValueError(f"corrupt archive frame at offset {f.tell() - _HEAD.size} in {self.path}")
+            mb = f.read(mlen)
+            if len(mb) < mlen:
+                break
+            meta = orjson.loads(mb)
+            off = f.tell()
+            f.seek(blen, os.SEEK_CUR)
+            if f.tell() - off < blen:
+                break
+            idx = len(self.records)
+            self.records.append((meta, off, blen))
+            self._exact.setdefault(self._key(meta['method'], meta['url'], meta.get('request_headers') or {}), []).append(idx)
+            self._loose.setdefault((meta['method'], meta['url']), []).append(idx)
+
+    @staticmethod
+    def _key(method: str, url: str, headers: Dict[str, str]) -> Tuple:
+        return (method, url) + tuple(headers.get(h) for h in _KEY_HEADERS)
+
+    def body(self, idx: int) -> bytes:
+        meta, off, blen = self.records[idx]
+        with self._lock:
+            self._f.seek(off)
+            data = self._f.read(blen)
+        return _decompress(meta['codec'], data)
+
+    def lookup(self, method: str, url: str, headers: Dict[str, str]) -> Optional[int]:
+        """Next recorded answer for this request: exact match on conditional headers first,
+        then any answer for the URL that is not a 304 (the replaying DB may hold other validators)."""
+        key = self._key(method, url, headers)
+        cands = self._exact.get(key)
+        if not cands:
+            loose = [i for i in self._loose.get((method, url), []) if self.records[i][0]['status'] != 304]
+            if not loose:
+                return None
+            key, cands = ('loose', method, url), loose
+        with self._lock:
+            n = self._cursor.get(key, 0)
+            self._cursor[key] = n + 1
+        # Serve in recorded order, repeating the last answer once exhausted
+        return cands[min(n, len(cands) - 1)]
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _request_headers(request: httpx.Request) -> Dict[str, str]:
+    return {h: request.headers[h] for h in _KEY_HEADERS if h in request.headers}
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, writer: ArchiveWriter, inner: Optional[httpx.BaseTransport] = None):
+        self._writer = writer
+        self._inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        t0 = time.perf_counter()
+        resp = self._inner.handle_request(request)
+        try:
+            # Raw (still content-encoded) bytes; the client decodes them on both paths
+            raw = b''.join(resp.stream)
+        finally:
+            resp.close()
+        elapsed = time.perf_counter() - t0
+        self._writer.append({
+            'ts': time.time(),
+            'method': request.method,
+            'url': str(request.url),
+            'request_headers': _request_headers(request),
+            'status': resp.status_code,
+            'headers': [[k.decode('latin-1'), v.decode('latin-1')] for k, v in resp.headers.raw],
+            'elapsed': round(elapsed, 6),
+        }, raw)
+        return httpx.Response(resp.status_code, headers=resp.headers.raw, stream=httpx.ByteStream(raw), extensions=resp.extensions)
+
+    def close(self) -> None:
+        self._inner.close()
+        self._writer.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Serves archived responses; unknown requests fail like an unreachable network."""
+
+    def __init__(self, reader: ArchiveReader, speed: str = 'fast'):
+        if speed not in ('fast', 'original'):
+            raise ValueError(f"Unknown replay speed: {speed}")
+        self._reader = reader
+        self._speed = speed
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        idx = self._reader.lookup(request.method, str(request.url), _request_headers(request))
+        if idx is None:
+            raise httpx.ConnectError(f"not in archive: {request.method} {request.url}", request=request)
+        meta = self._reader.records[idx][0]
+        body = self._reader.body(idx)
+        if self._speed == 'original' and meta.get('elapsed'):
+            time.sleep(meta['elapsed'])
+        headers = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in meta['headers']]
+        return httpx.Response(meta['status'], headers=headers, stream=httpx.ByteStream(body))
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+def make_transport(record: Optional[str] = None, replay: Optional[str] = None, speed: str = 'fast') -> Optional[httpx.BaseTransport]:
+    if record and replay:
+        raise ValueError('record and replay are mutually exclusive')
+    if record:
+        return RecordingTransport(ArchiveWriter(record))
+    if replay:
+        return ReplayTransport(ArchiveReader(replay), speed=speed)
+    return None
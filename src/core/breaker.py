@@ -0,0 +1,185 @@
+"""Per-host circuit breakers and deferred retries.
+
+`HostBreakers` is shared by every site of a process and by `RobotsCache`. A host whose
+requests fail `failure_threshold` times in a row opens its breaker. Requests to it then
+fail fast with `CircuitOpen` instead of waiting out connect timeouts. After `cooldown`
+seconds one probe request goes through (half-open). If the probe succeeds the breaker
+closes; if it fails the breaker reopens with twice the cooldown, up to `max_cooldown`.
+
+With deferred retries the HttpClient does not sleep between attempts. It raises
+`RetryDeferred` instead, the adapter counts the failure and moves on, and the runner
+runs the site again in a retry pass (see `RetryQueue` in src.core.scheduler).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.core.metrics import NULL_METRICS, Metrics
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+_SEVERITY = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class RetryDeferred(Exception):
+    """A retryable failure left for a later pass instead of retried in place."""
+
+    def __init__(self, url: str, retry_at: float, reason: str):
+        super().__init__(f"{reason}; retry deferred: {url}")
+        self.url = url
+        self.retry_at = retry_at
+
+
+class CircuitOpen(RetryDeferred):
+    """The host's breaker is open; the request was not sent."""
+
+
+class _HostState:
+    __slots__ = ('state', 'failures', 'opened_at', 'cooldown', 'probing', 'opens', 'rejected', 'avoided', 'fail_seconds')
+
+    def __init__(self, cooldown: float):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.probing = False
+        self.opens = 0
+        self.rejected = 0
+        self.avoided = 0.0
+        # Smoothed duration of this host's failing requests: what each rejection saves
+        self.fail_seconds = 0.0
+
+
+class HostBreakers:
+    def __init__(self, *, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0,
+                 metrics: Optional[Metrics] = None):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.metrics = metrics or NULL_METRICS
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict], metrics: Optional[Metrics] = None) -> Optional['HostBreakers']:
+        if not settings or int(settings.get('failures', 5)) <= 0:
+            return None
+        return cls(
+            failure_threshold=int(settings.get('failures', 5)),
+            cooldown=float(settings.get('cooldown', 30.0)),
+            max_cooldown=float(settings.get('max_cooldown', 300.0)),
+            metrics=metrics,
+        )
+
+    def _get(self, host: str) -> _HostState:
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = _HostState(self.cooldown)
+        return st
+
+    def before(self, host: str, url: str) -> None:
+        """Raise CircuitOpen unless a request to `host` may go out now."""
+        now = time.monotonic()
+        with self._lock:
+            st = self._hosts.get(host)
+            if st is None or st.state == CLOSED:
+                return
+            reopen_at = st.opened_at + st.cooldown
+            if st.state == OPEN and now >= reopen_at:
+                st.state = HALF_OPEN
+            if st.state == HALF_OPEN and not st.probing:
+                st.probing = True
+                return
+            st.rejected += 1
+            st.avoided += st.fail_seconds
+            avoided = st.fail_seconds
+        self.metrics.observe('breaker.rejected', host, avoided)
+        raise CircuitOpen(url, time.time() + max(0.0, reopen_at - now), f"circuit open for {host}")
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            st = self._hosts.get(host)
+            if st is None:
+                return
+            st.failures = 0
+            st.probing = False
+            if st.state != CLOSED:
+                st.state = CLOSED
+                st.cooldown = self.cooldown
+
+    def failure(self, host: str, seconds: float = 0.0) -> None:
+        with self._lock:
+            st = self._get(host)
+            st.failures += 1
+            st.fail_seconds = seconds if not st.fail_seconds else 0.7 * st.fail_seconds + 0.3 * seconds
+            if st.state == HALF_OPEN:
+                # The probe failed: back off harder before the next one
+                st.cooldown = min(st.cooldown * 2, self.max_cooldown)
+            elif st.state == OPEN or st.failures < self.failure_threshold:
+                return
+            st.state = OPEN
+            st.probing = False
+            st.opened_at = time.monotonic()
+            st.opens += 1
+        self.metrics.observe('breaker.open', host, 0.0)
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            st = self._hosts.get(host)
+            return st.state if st is not None else CLOSED
+
+    def report(self) -> Dict[str, Dict]:
+        """Hosts whose breaker opened at least once, for run.log and the summary."""
+        with self._lock:
+            return {
+                host: {'state': st.state, 'opens': st.opens, 'rejected': st.rejected, 'avoided_seconds': round(st.avoided, 3)}
+                for host, st in self._hosts.items() if st.opens
+            }
+
+
+def merge_reports(total: Dict[str, Dict], rep: Optional[Dict[str, Dict]]) -> None:
+    """Add one process's breaker report into `total`; the worst state wins."""
+    for host, r in (rep or {}).items():
+        acc = total.get(host)
+        if acc is None:
+            total[host] = dict(r)
+            continue
+        if _SEVERITY[r['state']] > _SEVERITY[acc['state']]:
+            acc['state'] = r['state']
+        for k in ('opens', 'rejected', 'avoided_seconds'):
+            acc[k] = round(acc[k] + r[k], 3)
+
+
+def summarize(report: Dict[str, Dict]) -> List[str]:
+    """Hosts sorted by time avoided, as `host state opens/rejected/avoided` strings."""
+    rows = sorted(report.items(), key=lambda kv: -kv[1]['avoided_seconds'])
+    return [f"{h} {r['state']} opens={r['opens']} rejected={r['rejected']} avoided={r['avoided_seconds']:.1f}s" for h, r in rows]
+
+
+class DeferredTracker:
+    """A site's client that notes deferred requests in the site's counters, so the
+    runner knows which sites need a retry pass and when it is due.
+
+    On the last pass (`in_place`) there is no later pass to defer to, so requests
+    are retried in place instead.
+    """
+
+    def __init__(self, http, counters: Dict, in_place: bool = False):
+        self._http = http
+        self._counters = counters
+        self._in_place = in_place
+
+    def get(self, url: str, **kwargs):
+        if self._in_place:
+            kwargs.setdefault('defer_retries', False)
+        try:
+            return self._http.get(url, **kwargs)
+        except RetryDeferred as e:
+            c = self._counters
+            c['deferred'] = c.get('deferred', 0) + 1
+            c['retry_at'] = max(c.get('retry_at', 0.0), e.retry_at)
+            raise
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
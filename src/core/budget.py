@@ -0,0 +1,67 @@
+"""Per-site wall-clock and request budgets.
+
+A site's adapter and canonical resolution get a `BudgetedHttp` in place of the shared
+client. Before each request it checks the site's budget and raises `BudgetExceeded`
+once it is spent; the runner commits what the site found so far and moves on.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional
+
+
+class BudgetExceeded(BaseException):
+    """Raised when a site's budget is spent.
+
+    A BaseException on purpose: adapters catch Exception around requests and parsing
+    to skip one bad page, and must not swallow the stop.
+    """
+
+    def __init__(self, kind: str, detail: str):
+        super().__init__(detail)
+        self.kind = kind
+
+
+class SiteBudget:
+    def __init__(self, seconds: Optional[float] = None, requests: Optional[int] = None):
+        self.seconds = float(seconds) if seconds else None
+        self.requests = int(requests) if requests else None
+        self.started = time.monotonic()
+        self.used = 0
+
+    @classmethod
+    def for_site(cls, cfg: Dict, defaults: Optional[Dict]) -> 'SiteBudget':
+        """Site config keys `time_budget_seconds` / `request_budget` override the run defaults."""
+        defaults = defaults or {}
+        return cls(
+            cfg.get('time_budget_seconds', defaults.get('seconds')),
+            cfg.get('request_budget', defaults.get('requests')),
+        )
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def check(self) -> None:
+        if self.seconds is not None and self.elapsed() >= self.seconds:
+            raise BudgetExceeded('time', f"time budget of {self.seconds:g}s spent")
+        if self.requests is not None and self.used >= self.requests:
+            raise BudgetExceeded('requests', f"request budget of {self.requests} spent")
+
+    def spend(self) -> None:
+        self.check()
+        self.used += 1
+
+
+class BudgetedHttp:
+    """HttpClient wrapper that charges each `get` to a site's budget."""
+
+    def __init__(self, http, budget: SiteBudget):
+        self._http = http
+        self.budget = budget
+
+    def get(self, url: str, **kwargs):
+        self.budget.spend()
+        return self._http.get(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
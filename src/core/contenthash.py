@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import hashlib
+
+try:
+    import xxhash  # type: ignore
+except Exception:  # pragma: no cover
+    xxhash = None
+
+
+def url_key(url: str) -> int:
+    """Signed 64-bit key for a URL, compact enough to index millions per source."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def content_hash(body: bytes) -> str:
+    """Fast fingerprint of a response body. The algorithm prefix makes a stored hash
+    from another algorithm compare unequal (one extra parse) instead of colliding."""
+    if xxhash is not None:
+        return 'xxh3:' + xxhash.xxh3_128_hexdigest(body)
+    return 'b2:' + hashlib.blake2b(body, digest_size=16).hexdigest()
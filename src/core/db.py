@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import os
 import sqlite3
+import threading
 import time
-from typing import Dict, Iterable, Optional, Tuple
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 SCHEMA = r"""
 CREATE TABLE IF NOT EXISTS sources (
@@ -21,7 +24,8 @@ CREATE TABLE IF NOT EXISTS urls (
   discovered_via TEXT,
   http_status INTEGER,
   lastmod TEXT,
-  etag TEXT
+  etag TEXT,
+  content_hash TEXT
 );
 
 CREATE TABLE IF NOT EXISTS url_by_source (
@@ -29,27 +33,347 @@ CREATE TABLE IF NOT EXISTS url_by_source (
   url TEXT NOT NULL,
   first_seen INTEGER NOT NULL,
   last_seen INTEGER NOT NULL,
+  first_run INTEGER,
+  seq INTEGER,
   PRIMARY KEY (source_id, url)
 );
 
+-- Monotonic counters; url_by_source.seq comes from here so a value is never reused,
+-- even when retention deletes the newest rows or VACUUM renumbers rowids
+CREATE TABLE IF NOT EXISTS sequences (
+  name TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+
+-- Per-source (URL key -> lastmod) index; adapters skip entries whose lastmod has not moved.
+-- seen_at is when the entry was last handed to the runner (see Adapter.watermark_filter).
+CREATE TABLE IF NOT EXISTS source_watermarks (
+  source_id TEXT NOT NULL,
+  url_key INTEGER NOT NULL,
+  lastmod TEXT,
+  seen_at INTEGER NOT NULL,
+  PRIMARY KEY (source_id, url_key)
+) WITHOUT ROWID;
+
+-- Discoveries whose canonical lookup did not fit their site's budget. Written under the
+-- naive URL they would count as known and never be canonicalized, so they wait here and
+-- the site's next run resolves and writes them before anything else.
+CREATE TABLE IF NOT EXISTS pending_canonical (
+  source_id TEXT NOT NULL,
+  url TEXT NOT NULL,
+  canonical TEXT,
+  discovered_via TEXT,
+  lastmod TEXT,
+  queued_at INTEGER NOT NULL,
+  PRIMARY KEY (source_id, url)
+) WITHOUT ROWID;
+
+-- How often crawling a page turned up links not seen before (see src/core/frontier.py).
+-- fetches and new_links decay on every update, so the score follows the site's layout.
+CREATE TABLE IF NOT EXISTS page_yield (
+  source_id TEXT NOT NULL,
+  url_key INTEGER NOT NULL,
+  url TEXT NOT NULL,
+  fetches REAL NOT NULL DEFAULT 0,
+  new_links REAL NOT NULL DEFAULT 0,
+  total_new INTEGER NOT NULL DEFAULT 0,
+  last_new_at INTEGER,
+  updated_at INTEGER NOT NULL,
+  PRIMARY KEY (source_id, url_key)
+) WITHOUT ROWID;
+
+-- WebSub subscriptions of feeds that advertise a hub (see src/core/websub.py). `token`
+-- is the callback path segment of the current subscription request; `polled_at` is the
+-- last time the feed itself was fetched, for the safety-net poll.
+CREATE TABLE IF NOT EXISTS websub (
+  feed_url TEXT PRIMARY KEY,
+  source_id TEXT NOT NULL,
+  topic TEXT NOT NULL,
+  hub TEXT NOT NULL,
+  token TEXT,
+  secret TEXT,
+  state TEXT NOT NULL DEFAULT 'discovered',
+  lease_expires INTEGER,
+  polled_at INTEGER,
+  last_push_at INTEGER,
+  pushes INTEGER NOT NULL DEFAULT 0,
+  updated_at INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_websub_token ON websub(token);
+
+-- Per-host rewrite rules learned from canonical resolutions (see src/core/hostrules.py)
+CREATE TABLE IF NOT EXISTS host_rules (
+  host TEXT NOT NULL,
+  rule TEXT NOT NULL,
+  hits INTEGER NOT NULL DEFAULT 0,
+  misses INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (host, rule)
+);
+
+-- Durable read positions of downstream consumers (see src/query.py)
+CREATE TABLE IF NOT EXISTS consumers (
+  name TEXT PRIMARY KEY,
+  cursor INTEGER NOT NULL DEFAULT 0,
+  updated_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  run_key TEXT NOT NULL,
+  started_at INTEGER NOT NULL,
+  finished_at INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS maintenance (
+  task TEXT PRIMARY KEY,
+  last_run_at INTEGER NOT NULL
+);
+
+-- Work claims for coordinated multi-node runs (see src/core/leases.py)
+CREATE TABLE IF NOT EXISTS leases (
+  round TEXT NOT NULL,
+  group_key TEXT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'pending',
+  owner TEXT,
+  expires_at REAL,
+  heartbeat_at REAL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (round, group_key)
+);
+
+-- Counters maintained in the same transactions that insert url_by_source rows
+CREATE TABLE IF NOT EXISTS source_stats (
+  source_id TEXT PRIMARY KEY,
+  total_seen INTEGER NOT NULL DEFAULT 0,
+  errors INTEGER NOT NULL DEFAULT 0
+);
+
+-- Smoothed wall-clock time per site, used to start the longest sites first
+CREATE TABLE IF NOT EXISTS site_durations (
+  source_id TEXT PRIMARY KEY,
+  ewma_seconds REAL NOT NULL,
+  last_seconds REAL NOT NULL,
+  runs INTEGER NOT NULL DEFAULT 1,
+  updated_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS run_source_stats (
+  run_id INTEGER NOT NULL,
+  source_id TEXT NOT NULL,
+  new_count INTEGER NOT NULL DEFAULT 0,
+  errors INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (run_id, source_id)
+);
+
 CREATE INDEX IF NOT EXISTS idx_urls_last_seen ON urls(last_seen);
 CREATE INDEX IF NOT EXISTS idx_ubs_last_seen ON url_by_source(last_seen);
 """
 
+# Indexes on columns added after the initial schema; created once _migrate has
+# brought older databases up to date.
+SCHEMA_INDEXES = r"""
+CREATE INDEX IF NOT EXISTS idx_ubs_first_run ON url_by_source(first_run);
+CREATE INDEX IF NOT EXISTS idx_ubs_first_seen ON url_by_source(first_seen);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ubs_seq ON url_by_source(seq);
+CREATE INDEX IF NOT EXISTS idx_ubs_source_seq ON url_by_source(source_id, seq);
+"""
+
+# (table, column, declaration) for columns added to existing tables
+_ADDED_COLUMNS = [
+    ('url_by_source', 'first_run', 'INTEGER'),
+    ('urls', 'content_hash', 'TEXT'),
+    ('url_by_source', 'seq', 'INTEGER'),
+]
+
+_UBS_SEQ = 'url_by_source'
+
+# Stored in PRAGMA user_version once the schema is in place: a database carrying the
+# current stamp needs no CREATE/ALTER pass. Any change to the schema changes the stamp.
+_SCHEMA_STAMP = zlib.crc32((SCHEMA + SCHEMA_INDEXES + repr(_ADDED_COLUMNS)).encode('utf-8')) & 0x7FFFFFFF
+
+# Storage PRAGMAs applied to every connection. `default` keeps SQLite's own settings
+# (2 MiB page cache, no memory-mapped I/O). `fast` maps the first 256 MiB of the file,
+# so hot index pages are read without a copy, and gives each connection a 64 MiB page
+# cache. `large` is for databases in the tens of millions of URLs; its page_size only
+# applies to a new file.
+STORAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    'default': {},
+    'fast': {'mmap_size': 256 << 20, 'cache_size': -(64 << 10), 'temp_store': 'MEMORY'},
+    'large': {'mmap_size': 1 << 30, 'cache_size': -(256 << 10), 'temp_store': 'MEMORY', 'page_size': 8192},
+}
 
-def ensure_db(path: str) -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    # Increase timeout to reduce SQLITE_BUSY under concurrent writers
-    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
-    conn.execute('PRAGMA journal_mode=WAL;')
-    conn.execute('PRAGMA synchronous=NORMAL;')
-    conn.execute('PRAGMA busy_timeout=30000;')
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    for table, column, decl in _ADDED_COLUMNS:
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            if (table, column) == ('url_by_source', 'seq'):
+                # Existing rows keep their insertion order
+                conn.execute("UPDATE url_by_source SET seq = rowid")
+    if conn.execute("SELECT 1 FROM sequences WHERE name=?", (_UBS_SEQ,)).fetchone() is None:
+        conn.execute(
+            "INSERT OR IGNORE INTO sequences(name, value) SELECT ?, COALESCE(MAX(seq), 0) FROM url_by_source", (_UBS_SEQ,)
+        )
+    # Backfill counters for databases created before source_stats existed
+    if conn.execute("SELECT 1 FROM source_stats LIMIT 1").fetchone() is None \
+            and conn.execute("SELECT 1 FROM url_by_source LIMIT 1").fetchone() is not None:
+        conn.execute(
+            "INSERT OR IGNORE INTO source_stats(source_id, total_seen) "
+            "SELECT source_id, COUNT(*) FROM url_by_source GROUP BY source_id"
+        )
+
+
+def storage_pragmas(storage: Union[None, str, Dict[str, Any]]) -> Dict[str, Any]:
+    """PRAGMAs for a profile name, or for {'profile': name, 'pragmas': {...overrides}}."""
+    if not storage:
+        return {}
+    if isinstance(storage, str):
+        storage = {'profile': storage}
+    name = storage.get('profile') or 'default'
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"unknown storage profile {name!r} (expected one of {', '.join(STORAGE_PROFILES)})")
+    return {**STORAGE_PROFILES[name], **(storage.get('pragmas') or {})}
+
+
+# Seconds a connection waits for a lock before SQLITE_BUSY. A writer may stamp a row and
+# commit it up to this much later (src/export.py lags its watermark accordingly).
+BUSY_TIMEOUT = 30.0
+
+
+def _connect(path: str, pragmas: Optional[Dict[str, Any]] = None, *, readonly: bool = False) -> sqlite3.Connection:
+    pragmas = dict(pragmas or {})
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        pragmas.pop('page_size', None)
+    else:
+        # Increase timeout to reduce SQLITE_BUSY under concurrent writers
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # page_size has to come before anything writes the file (WAL included)
+        page_size = pragmas.pop('page_size', None)
+        if page_size:
+            conn.execute(f"PRAGMA page_size={int(page_size)};")
+        # Only takes effect on a fresh file; existing databases are converted by retention (VACUUM)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+    conn.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)};')
+    for key, value in pragmas.items():
+        conn.execute(f"PRAGMA {key}={value};")
     # Use autocommit by default to minimize the time any writer holds the DB lock
     conn.isolation_level = None
+    return conn
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    """Create and migrate the schema, unless the database already carries the current one."""
+    if conn.execute('PRAGMA user_version').fetchone()[0] == _SCHEMA_STAMP:
+        return
     conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.executescript(SCHEMA_INDEXES)
+    conn.execute(f"PRAGMA user_version={_SCHEMA_STAMP}")
+
+
+def ensure_db(path: str, pragmas: Optional[Dict[str, Any]] = None) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = _connect(path, pragmas)
+    init_schema(conn)
     return conn
 
 
+def open_readonly(path: str, pragmas: Optional[Dict[str, Any]] = None) -> sqlite3.Connection:
+    """Query-only connection to an existing database (created and migrated by ensure_db)."""
+    return _connect(path, pragmas, readonly=True)
+
+
+WRITER, READER = 'writer', 'reader'
+
+
+class ConnectionManager:
+    """Connections to one database, opened once and reused across sites.
+
+    The schema is checked (and created or migrated) once, when the manager is built.
+    `writer()` lends a read-write connection, `reader()` a read-only one for reports and
+    the membership check. Returned connections go back to an idle pool, so a run opens
+    about `concurrency` connections per role however many sites it processes. Every
+    connection gets the PRAGMAs of `storage` (see `storage_pragmas`). Thread-safe.
+    """
+
+    def __init__(self, path: str, storage: Union[None, str, Dict[str, Any]] = None):
+        self.path = path
+        self.pragmas = storage_pragmas(storage)
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[sqlite3.Connection]] = {WRITER: [], READER: []}
+        self._stats = {role: {'opened': 0, 'checkouts': 0} for role in (WRITER, READER)}
+        self._closed = False
+        conn = ensure_db(path, self.pragmas)
+        self._stats[WRITER]['opened'] += 1
+        self._idle[WRITER].append(conn)
+
+    def acquire(self, role: str = WRITER) -> sqlite3.Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('connection manager is closed')
+            self._stats[role]['checkouts'] += 1
+            if self._idle[role]:
+                return self._idle[role].pop()
+            self._stats[role]['opened'] += 1
+        return _connect(self.path, self.pragmas, readonly=role == READER)
+
+    def release(self, conn: sqlite3.Connection, role: str = WRITER) -> None:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        with self._lock:
+            if not self._closed:
+                self._idle[role].append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire(WRITER)
+        try:
+            yield conn
+        finally:
+            self.release(conn, WRITER)
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire(READER)
+        try:
+            yield conn
+        finally:
+            self.release(conn, READER)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {role: dict(st) for role, st in self._stats.items()}
+
+    def close(self) -> None:
+        """Close the idle connections; ones still lent out are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle = [c for conns in self._idle.values() for c in conns]
+            self._idle = {WRITER: [], READER: []}
+        for conn in idle:
+            conn.close()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    # Connections are in autocommit mode, so `with conn:` alone does not open a
+    # transaction; take the write lock up front and keep the block short.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
 def upsert_source(conn: sqlite3.Connection, sid: str, kind: str, base: Optional[str], cfg_json: str) -> None:
     conn.execute(
         "INSERT INTO sources(id, kind, base, cfg) VALUES(?,?,?,?)\n"
@@ -62,6 +386,59 @@ def _now() -> int:
     return int(time.time())
 
 
+def start_run(conn: sqlite3.Connection, run_key: str) -> int:
+    # AUTOINCREMENT guarantees ids are never reused, so overlapping runs get distinct stamps
+    cur = conn.execute("INSERT INTO runs(run_key, started_at) VALUES(?,?)", (run_key, _now()))
+    return int(cur.lastrowid)
+
+
+def finish_run(conn: sqlite3.Connection, run_id: int) -> None:
+    conn.execute("UPDATE runs SET finished_at=? WHERE id=?", (_now(), run_id))
+
+
+def register_run_source(conn: sqlite3.Connection, run_id: int, sid: str) -> None:
+    # Registration order is the row order of site_counts_for_run
+    conn.execute("INSERT OR IGNORE INTO run_source_stats(run_id, source_id) VALUES(?,?)", (run_id, sid))
+    conn.execute("INSERT OR IGNORE INTO source_stats(source_id) VALUES(?)", (sid,))
+
+
+def add_site_errors(conn: sqlite3.Connection, run_id: int, sid: str, errors: int) -> None:
+    if errors <= 0:
+        return
+    with transaction(conn):
+        conn.execute("UPDATE run_source_stats SET errors=errors+? WHERE run_id=? AND source_id=?", (errors, run_id, sid))
+        conn.execute(
+            "INSERT INTO source_stats(source_id, errors) VALUES(?,?)\n"
+            "ON CONFLICT(source_id) DO UPDATE SET errors=errors+excluded.errors",
+            (sid, errors),
+        )
+
+
+def get_site_durations(conn: sqlite3.Connection) -> Dict[str, float]:
+    return {sid: float(sec) for sid, sec in conn.execute("SELECT source_id, ewma_seconds FROM site_durations")}
+
+
+def record_site_duration(conn: sqlite3.Connection, sid: str, seconds: float, alpha: float = 0.3) -> None:
+    # Exponentially weighted: one unusual run moves the estimate without replacing it
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO site_durations(source_id, ewma_seconds, last_seconds, runs, updated_at) VALUES(?,?,?,1,?)\n"
+            "ON CONFLICT(source_id) DO UPDATE SET ewma_seconds = ? * excluded.ewma_seconds + (1 - ?) * ewma_seconds, "
+            "last_seconds = excluded.last_seconds, runs = runs + 1, updated_at = excluded.updated_at",
+            (sid, seconds, seconds, _now(), alpha, alpha),
+        )
+
+
+def site_counts_for_run(conn: sqlite3.Connection, run_id: int) -> Iterable[Tuple[str, int, int, int]]:
+    sql = (
+        "SELECT r.source_id, r.new_count, COALESCE(s.total_seen, 0), r.errors "
+        "FROM run_source_stats r LEFT JOIN source_stats s ON s.source_id = r.source_id "
+        "WHERE r.run_id = ? ORDER BY r.rowid ASC"
+    )
+    for row in conn.execute(sql, (run_id,)):
+        yield row  # (source_id, new_count, total_seen, errors)
+
+
 def upsert_url(conn: sqlite3.Connection, url: str, *, canonical: Optional[str], discovered_via: Optional[str], http_status: Optional[int], lastmod: Optional[str], etag: Optional[str]) -> Tuple[bool, int]:
     now = _now()
     cur = conn.execute("SELECT first_seen FROM urls WHERE url=?", (url,))
@@ -82,16 +459,34 @@ def upsert_url(conn: sqlite3.Connection, url: str, *, canonical: Optional[str],
     return is_new, first_seen
 
 
-def touch_url_by_source(conn: sqlite3.Connection, sid: str, url: str) -> Tuple[bool, int]:
+def _take_seq(conn: sqlite3.Connection, n: int) -> int:
+    # First of `n` fresh sequence numbers. Run it in the transaction that inserts the
+    # rows, so rows become visible in seq order and cursor readers never skip one.
+    (last,) = conn.execute("UPDATE sequences SET value = value + ? WHERE name = ? RETURNING value", (n, _UBS_SEQ)).fetchone()
+    return last - n + 1
+
+
+def touch_url_by_source(conn: sqlite3.Connection, sid: str, url: str, run_id: Optional[int] = None) -> Tuple[bool, int]:
     now = _now()
     cur = conn.execute("SELECT first_seen FROM url_by_source WHERE source_id=? AND url=?", (sid, url))
     row = cur.fetchone()
     is_new = row is None
     if is_new:
         conn.execute(
-            "INSERT INTO url_by_source(source_id, url, first_seen, last_seen) VALUES(?,?,?,?)",
-            (sid, url, now, now),
+            "INSERT INTO url_by_source(source_id, url, first_seen, last_seen, first_run, seq) VALUES(?,?,?,?,?,?)",
+            (sid, url, now, now, run_id, _take_seq(conn, 1)),
         )
+        conn.execute(
+            "INSERT INTO source_stats(source_id, total_seen) VALUES(?, 1)\n"
+            "ON CONFLICT(source_id) DO UPDATE SET total_seen=total_seen+1",
+            (sid,),
+        )
+        if run_id is not None:
+            conn.execute(
+                "INSERT INTO run_source_stats(run_id, source_id, new_count) VALUES(?,?,1)\n"
+                "ON CONFLICT(run_id, source_id) DO UPDATE SET new_count=new_count+1",
+                (run_id, sid),
+            )
         first_seen = now
     else:
         first_seen = row[0]
@@ -126,6 +521,221 @@ def get_resource_etag_lastmod(conn: sqlite3.Connection, resource_url: str) -> Tu
     return row[0], row[1]
 
 
+def get_resource_hash(conn: sqlite3.Connection, resource_url: str) -> Optional[str]:
+    cur = conn.execute("SELECT content_hash FROM urls WHERE url=?", (resource_url,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_resource_hash(conn: sqlite3.Connection, resource_url: str, content_hash: str) -> None:
+    # Row exists: set_resource_etag_lastmod runs on every 200 before parsing
+    conn.execute("UPDATE urls SET content_hash=? WHERE url=?", (content_hash, resource_url))
+
+
+# Bound parameters per IN (...) list; stays under SQLITE_MAX_VARIABLE_NUMBER on old builds (999)
+_IN_CHUNK = 500
+
+
+def known_urls(conn: sqlite3.Connection, urls: Sequence[str]) -> Set[str]:
+    """Subset of `urls` already in the urls table, checked with one IN (...) query per chunk."""
+    found: Set[str] = set()
+    for i in range(0, len(urls), _IN_CHUNK):
+        chunk = urls[i:i + _IN_CHUNK]
+        sql = f"SELECT url FROM urls WHERE url IN ({','.join('?' * len(chunk))})"
+        found.update(r[0] for r in conn.execute(sql, chunk))
+    return found
+
+
+def get_watermarks(conn: sqlite3.Connection, sid: str, keys: Sequence[int]) -> Dict[int, Tuple[Optional[str], int]]:
+    """url_key -> (lastmod, seen_at) for the stored subset of `keys`."""
+    found: Dict[int, Tuple[Optional[str], int]] = {}
+    for i in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[i:i + _IN_CHUNK]
+        sql = f"SELECT url_key, lastmod, seen_at FROM source_watermarks WHERE source_id=? AND url_key IN ({','.join('?' * len(chunk))})"
+        for key, lastmod, seen_at in conn.execute(sql, (sid, *chunk)):
+            found[key] = (lastmod, seen_at)
+    return found
+
+
+def write_watermarks(conn: sqlite3.Connection, sid: str, rows: Sequence[Tuple[int, Optional[str]]], now: Optional[int] = None) -> None:
+    """Store (url_key, lastmod) rows; run it in the transaction that writes the same entries."""
+    now = _now() if now is None else now
+    conn.executemany(
+        "INSERT INTO source_watermarks(source_id, url_key, lastmod, seen_at) VALUES(?,?,?,?)\n"
+        "ON CONFLICT(source_id, url_key) DO UPDATE SET lastmod=COALESCE(excluded.lastmod, lastmod), seen_at=excluded.seen_at",
+        [(sid, key, lastmod, now) for key, lastmod in rows],
+    )
+
+
+def queue_pending_canonical(conn: sqlite3.Connection, sid: str, rows: Sequence[Tuple[str, Optional[str], Optional[str], Optional[str]]], now: Optional[int] = None) -> None:
+    """Park (url, canonical, discovered_via, lastmod) rows for the site's next run."""
+    now = _now() if now is None else now
+    conn.executemany(
+        "INSERT OR REPLACE INTO pending_canonical(source_id, url, canonical, discovered_via, lastmod, queued_at) VALUES(?,?,?,?,?,?)",
+        [(sid, url, canonical, via, lastmod, now) for url, canonical, via, lastmod in rows],
+    )
+
+
+def get_pending_canonical(conn: sqlite3.Connection, sid: str) -> List[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """The site's parked (url, canonical, discovered_via, lastmod) rows, oldest first."""
+    return conn.execute(
+        "SELECT url, canonical, discovered_via, lastmod FROM pending_canonical WHERE source_id=? ORDER BY queued_at, url", (sid,)
+    ).fetchall()
+
+
+def drop_pending_canonical(conn: sqlite3.Connection, sid: str, urls: Sequence[str]) -> None:
+    conn.executemany("DELETE FROM pending_canonical WHERE source_id=? AND url=?", [(sid, u) for u in urls])
+
+
+def get_page_yield(conn: sqlite3.Connection, sid: str, keys: Sequence[int]) -> Dict[int, Tuple[float, float]]:
+    """url_key -> (decayed new links, decayed fetches) for the crawled subset of `keys`."""
+    found: Dict[int, Tuple[float, float]] = {}
+    for i in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[i:i + _IN_CHUNK]
+        sql = f"SELECT url_key, new_links, fetches FROM page_yield WHERE source_id=? AND url_key IN ({','.join('?' * len(chunk))})"
+        for key, new_links, fetches in conn.execute(sql, (sid, *chunk)):
+            found[key] = (new_links, fetches)
+    return found
+
+
+def record_page_yield(conn: sqlite3.Connection, sid: str, key: int, url: str, new_links: int, decay: float = 0.8, now: Optional[int] = None) -> None:
+    now = _now() if now is None else now
+    conn.execute(
+        "INSERT INTO page_yield(source_id, url_key, url, fetches, new_links, total_new, last_new_at, updated_at) VALUES(?,?,?,1,?,?,?,?)\n"
+        "ON CONFLICT(source_id, url_key) DO UPDATE SET fetches = fetches * ? + 1, new_links = new_links * ? + excluded.new_links, "
+        "total_new = total_new + excluded.total_new, last_new_at = COALESCE(excluded.last_new_at, last_new_at), updated_at = excluded.updated_at",
+        (sid, key, url, new_links, new_links, now if new_links else None, now, decay, decay),
+    )
+
+
+def top_page_yield(conn: sqlite3.Connection, sid: str, limit: int = 10) -> List[Tuple[str, float, float, int]]:
+    """(url, new links, fetches, total new) of the pages that yield the most per fetch."""
+    return conn.execute(
+        "SELECT url, new_links, fetches, total_new FROM page_yield WHERE source_id=? ORDER BY new_links / fetches DESC LIMIT ?",
+        (sid, limit),
+    ).fetchall()
+
+
+def note_websub_hub(conn: sqlite3.Connection, sid: str, feed_url: str, topic: str, hub: str, now: Optional[int] = None) -> None:
+    """Record that `feed_url` advertises `hub` for `topic`; a new hub or topic starts over as 'discovered'."""
+    now = _now() if now is None else now
+    conn.execute(
+        "INSERT INTO websub(feed_url, source_id, topic, hub, state, updated_at) VALUES(?,?,?,?,'discovered',?)\n"
+        "ON CONFLICT(feed_url) DO UPDATE SET source_id=excluded.source_id, "
+        "state=CASE WHEN hub=excluded.hub AND topic=excluded.topic THEN state ELSE 'discovered' END, "
+        "updated_at=CASE WHEN hub=excluded.hub AND topic=excluded.topic THEN updated_at ELSE excluded.updated_at END, "
+        "hub=excluded.hub, topic=excluded.topic",
+        (feed_url, sid, topic, hub, now),
+    )
+
+
+def mark_websub_polled(conn: sqlite3.Connection, feed_url: str, now: Optional[int] = None) -> None:
+    conn.execute("UPDATE websub SET polled_at=? WHERE feed_url=?", (_now() if now is None else now, feed_url))
+
+
+def websub_covered(conn: sqlite3.Connection, feed_url: str, poll_seconds: float, now: Optional[int] = None) -> bool:
+    """True while `feed_url` has a verified, unexpired subscription and was polled within `poll_seconds`."""
+    now = _now() if now is None else now
+    row = conn.execute("SELECT state, lease_expires, polled_at FROM websub WHERE feed_url=?", (feed_url,)).fetchone()
+    return bool(row and row[0] == 'active' and (row[1] or 0) > now and (row[2] or 0) > now - poll_seconds)
+
+
+def websub_due(conn: sqlite3.Connection, renew_before: int, retry_after: int, now: Optional[int] = None) -> List[Tuple[str, str, str, str]]:
+    """(feed_url, source_id, topic, hub) of subscriptions to request: new ones, leases about to
+    expire, and requests that were denied or never verified `retry_after` seconds ago. A
+    renewal that is still unverified is not sent again before `retry_after` either."""
+    now = _now() if now is None else now
+    return conn.execute(
+        "SELECT feed_url, source_id, topic, hub FROM websub WHERE state='discovered' "
+        "OR (state='active' AND COALESCE(lease_expires, 0) < ? AND updated_at < ?) "
+        "OR (state IN ('pending', 'denied') AND updated_at < ?) ORDER BY feed_url",
+        (now + renew_before, now - retry_after, now - retry_after),
+    ).fetchall()
+
+
+def set_websub_pending(conn: sqlite3.Connection, feed_url: str, token: str, secret: Optional[str], now: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Mark a subscription request as sent; returns the (token, secret) to send with it.
+
+    A feed keeps its first token and secret, so a renewal never orphans the callback the
+    hub is still delivering to. An active subscription stays active while it renews.
+    """
+    conn.execute(
+        "UPDATE websub SET token=COALESCE(token, ?), secret=COALESCE(secret, ?), "
+        "state=CASE WHEN state='active' THEN state ELSE 'pending' END, updated_at=? WHERE feed_url=?",
+        (token, secret, _now() if now is None else now, feed_url),
+    )
+    return conn.execute("SELECT token, secret FROM websub WHERE feed_url=?", (feed_url,)).fetchone()
+
+
+def get_websub_by_token(conn: sqlite3.Connection, token: str) -> Optional[Tuple[str, str, str, str, Optional[str], str]]:
+    """(feed_url, source_id, topic, hub, secret, state) of the subscription behind a callback token."""
+    return conn.execute(
+        "SELECT feed_url, source_id, topic, hub, secret, state FROM websub WHERE token=?", (token,)
+    ).fetchone()
+
+
+def set_websub_state(conn: sqlite3.Connection, token: str, state: str, lease_expires: Optional[int] = None, now: Optional[int] = None) -> None:
+    conn.execute(
+        "UPDATE websub SET state=?, lease_expires=COALESCE(?, lease_expires), updated_at=? WHERE token=?",
+        (state, lease_expires, _now() if now is None else now, token),
+    )
+
+
+def record_websub_push(conn: sqlite3.Connection, token: str, now: Optional[int] = None) -> None:
+    conn.execute("UPDATE websub SET pushes=pushes+1, last_push_at=? WHERE token=?", (_now() if now is None else now, token))
+
+
+def list_websub(conn: sqlite3.Connection) -> List[Tuple[str, str, str, str, Optional[int], Optional[int], Optional[int], int]]:
+    """(feed_url, source_id, hub, state, lease_expires, polled_at, last_push_at, pushes) per feed."""
+    return conn.execute(
+        "SELECT feed_url, source_id, hub, state, lease_expires, polled_at, last_push_at, pushes FROM websub ORDER BY source_id, feed_url"
+    ).fetchall()
+
+
+def write_discoveries(conn: sqlite3.Connection, sid: str, rows: Sequence[Tuple[str, Optional[str], Optional[str], Optional[str]]], run_id: Optional[int] = None, now: Optional[int] = None) -> List[str]:
+    """Bulk upsert_url + touch_url_by_source for (url, canonical, discovered_via, lastmod) rows.
+
+    Same effect as calling both per row in order; run it inside `transaction()`.
+    Returns the URLs that are new for the source (first_seen = `now`), in row order.
+    """
+    if not rows:
+        return []
+    now = _now() if now is None else now
+    conn.executemany(
+        "INSERT INTO urls(url, canonical, first_seen, last_seen, discovered_via, http_status, lastmod, etag) VALUES(?,?,?,?,?,NULL,?,NULL)\n"
+        "ON CONFLICT(url) DO UPDATE SET canonical=COALESCE(excluded.canonical, canonical), last_seen=excluded.last_seen, "
+        "discovered_via=COALESCE(excluded.discovered_via, discovered_via), lastmod=COALESCE(excluded.lastmod, lastmod)",
+        [(url, canonical, now, now, via, lastmod) for url, canonical, via, lastmod in rows],
+    )
+    urls = list(dict.fromkeys(r[0] for r in rows))
+    existing: Set[str] = set()
+    for i in range(0, len(urls), _IN_CHUNK):
+        chunk = urls[i:i + _IN_CHUNK]
+        sql = f"SELECT url FROM url_by_source WHERE source_id=? AND url IN ({','.join('?' * len(chunk))})"
+        existing.update(r[0] for r in conn.execute(sql, (sid, *chunk)))
+    new = [u for u in urls if u not in existing]
+    if existing:
+        conn.executemany("UPDATE url_by_source SET last_seen=? WHERE source_id=? AND url=?", [(now, sid, u) for u in existing])
+    if new:
+        seq = _take_seq(conn, len(new))
+        conn.executemany(
+            "INSERT INTO url_by_source(source_id, url, first_seen, last_seen, first_run, seq) VALUES(?,?,?,?,?,?)",
+            [(sid, u, now, now, run_id, seq + i) for i, u in enumerate(new)],
+        )
+        conn.execute(
+            "INSERT INTO source_stats(source_id, total_seen) VALUES(?, ?)\n"
+            "ON CONFLICT(source_id) DO UPDATE SET total_seen=total_seen+excluded.total_seen",
+            (sid, len(new)),
+        )
+        if run_id is not None:
+            conn.execute(
+                "INSERT INTO run_source_stats(run_id, source_id, new_count) VALUES(?,?,?)\n"
+                "ON CONFLICT(run_id, source_id) DO UPDATE SET new_count=new_count+excluded.new_count",
+                (run_id, sid, len(new)),
+            )
+    return new
+
+
 def has_url(conn: sqlite3.Connection, url: str) -> bool:
     cur = conn.execute("SELECT 1 FROM urls WHERE url=? LIMIT 1", (url,))
     return cur.fetchone() is not None
@@ -141,22 +751,89 @@ def get_last_seen(conn: sqlite3.Connection, url: str) -> Optional[int]:
 
 def query_new_urls(conn: sqlite3.Connection, *, start_ts: int, end_ts: int) -> Iterable[Tuple[str, str, int, Optional[str]]]:
     sql = (
-        "SELECT source_id, url, first_seen, (SELECT lastmod FROM urls u WHERE u.url = url_by_source.url) as lastmod "
-        "FROM url_by_source WHERE first_seen BETWEEN ? AND ? ORDER BY first_seen ASC"
+        "SELECT b.source_id, b.url, b.first_seen, u.lastmod "
+        "FROM url_by_source b LEFT JOIN urls u ON u.url = b.url "
+        "WHERE b.first_seen BETWEEN ? AND ? ORDER BY b.first_seen ASC"
     )
     for row in conn.execute(sql, (start_ts, end_ts)):
         yield row  # (source_id, url, first_seen, lastmod)
 
 
+def query_new_urls_for_run(conn: sqlite3.Connection, run_id: int) -> Iterable[Tuple[str, str, int, Optional[str]]]:
+    # Range scan on idx_ubs_first_run. Rows are ordered by site registration order,
+    # then insertion order, so the export does not depend on how sites were scheduled
+    # across threads or processes; only this run's rows are sorted.
+    sql = (
+        "SELECT b.source_id, b.url, b.first_seen, u.lastmod "
+        "FROM url_by_source b "
+        "LEFT JOIN run_source_stats r ON r.run_id = b.first_run AND r.source_id = b.source_id "
+        "LEFT JOIN urls u ON u.url = b.url "
+        "WHERE b.first_run = ? ORDER BY r.rowid ASC, b.rowid ASC"
+    )
+    for row in conn.execute(sql, (run_id,)):
+        yield row  # (source_id, url, first_seen, lastmod)
+
+
 def query_latest_all(conn: sqlite3.Connection, *, since_ts: int) -> Iterable[Tuple[str, str, int, Optional[str]]]:
     sql = (
-        "SELECT source_id, url, last_seen, (SELECT lastmod FROM urls u WHERE u.url = url_by_source.url) as lastmod "
-        "FROM url_by_source WHERE last_seen >= ? ORDER BY last_seen ASC"
+        "SELECT b.source_id, b.url, b.last_seen, u.lastmod "
+        "FROM url_by_source b LEFT JOIN urls u ON u.url = b.url "
+        "WHERE b.last_seen >= ? ORDER BY b.last_seen ASC"
     )
     for row in conn.execute(sql, (since_ts,)):
         yield row  # (source_id, url, last_seen, lastmod)
 
 
+def query_after(conn: sqlite3.Connection, after: int, *, sites: Optional[Sequence[str]] = None, limit: int = 1000) -> Iterable[Tuple[int, str, str, int, Optional[str]]]:
+    """Keyset page: up to `limit` (source, url) pairs with seq > `after`, in seq order.
+
+    A range scan on idx_ubs_seq (or idx_ubs_source_seq for a single site), so the cost
+    depends on the page size, not on the table size.
+    """
+    where, params = "b.seq > ?", [after]
+    if sites:
+        where += f" AND b.source_id IN ({','.join('?' * len(sites))})"
+        params.extend(sites)
+    sql = (
+        "SELECT b.seq, b.source_id, b.url, b.first_seen, u.lastmod "
+        "FROM url_by_source b LEFT JOIN urls u ON u.url = b.url "
+        f"WHERE {where} ORDER BY b.seq ASC LIMIT ?"
+    )
+    for row in conn.execute(sql, (*params, limit)):
+        yield row  # (seq, source_id, url, first_seen, lastmod)
+
+
+def get_consumer_cursor(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT cursor FROM consumers WHERE name=?", (name,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def ack_consumer(conn: sqlite3.Connection, name: str, cursor: int) -> int:
+    """Move a consumer's cursor forward to `cursor` (never back); returns the stored cursor."""
+    (stored,) = conn.execute(
+        "INSERT INTO consumers(name, cursor, updated_at) VALUES(?,?,?)\n"
+        "ON CONFLICT(name) DO UPDATE SET cursor=MAX(cursor, excluded.cursor), updated_at=excluded.updated_at RETURNING cursor",
+        (name, cursor, _now()),
+    ).fetchone()
+    return int(stored)
+
+
+def reset_consumer(conn: sqlite3.Connection, name: str, cursor: int = 0) -> None:
+    conn.execute(
+        "INSERT INTO consumers(name, cursor, updated_at) VALUES(?,?,?)\n"
+        "ON CONFLICT(name) DO UPDATE SET cursor=excluded.cursor, updated_at=excluded.updated_at",
+        (name, cursor, _now()),
+    )
+
+
+def list_consumers(conn: sqlite3.Connection) -> List[Tuple[str, int, int, int]]:
+    """(name, cursor, updated_at, backlog) per consumer; backlog counts rows past the cursor."""
+    return [
+        (name, cursor, updated_at, conn.execute("SELECT COUNT(*) FROM url_by_source WHERE seq > ?", (cursor,)).fetchone()[0])
+        for name, cursor, updated_at in conn.execute("SELECT name, cursor, updated_at FROM consumers ORDER BY name").fetchall()
+    ]
+
+
 def counts_for_site(conn: sqlite3.Connection, sid: str) -> Tuple[int, int]:
     cur = conn.execute("SELECT COUNT(*) FROM url_by_source WHERE source_id=?", (sid,))
     total_seen = cur.fetchone()[0]
@@ -0,0 +1,103 @@
+"""Crawl frontier ordered by how many new links a page has turned up before.
+
+Each crawled page's history is kept in the `page_yield` table: decayed counts of
+fetches and of links on it that were not yet known. A queued URL is scored by its
+expected new links per fetch, `(new_links + prior) / (fetches + 1)`. A page never
+crawled scores `prior`, a hub that keeps listing fresh articles scores well above it,
+and an article page whose links are all known sinks below it. The best URL is crawled
+next. With probability `explore`, the oldest queued URL is taken instead, in BFS
+order, so pages with poor or no history still get crawled and can prove themselves.
+"""
+from __future__ import annotations
+
+import heapq
+import random
+import sqlite3
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from src.core import db as dbm
+from src.core.contenthash import url_key
+from src.core.normalize import normalize_url
+
+
+class Frontier:
+    def __init__(self, *, explore: float = 0.1, prior: float = 1.0, seed: Optional[int] = None):
+        self.explore = explore
+        self.prior = prior
+        self._rng = random.Random(seed)
+        # Entries are [neg score, depth, seq, url, taken], shared by the heap and the FIFO
+        self._heap: List[list] = []
+        self._fifo: Deque[list] = deque()
+        self._seq = 0
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def score(self, stats: Optional[Tuple[float, float]]) -> float:
+        new_links, fetches = stats if stats is not None else (0.0, 0.0)
+        return (new_links + self.prior) / (fetches + 1.0)
+
+    def push(self, url: str, depth: int, stats: Optional[Tuple[float, float]] = None) -> None:
+        """Queue `url`; `stats` is its (new_links, fetches) history, None if never crawled."""
+        entry = [-self.score(stats), depth, self._seq, url, False]
+        self._seq += 1
+        self._live += 1
+        # Ties go to the shallower, then the earlier URL: BFS among equals
+        if self.explore < 1:
+            heapq.heappush(self._heap, entry)
+        if self.explore > 0:
+            self._fifo.append(entry)
+
+    def pop(self) -> Tuple[str, int]:
+        """(url, depth) of the next URL to crawl; raises IndexError when empty."""
+        if self._live == 0:
+            raise IndexError('pop from an empty frontier')
+        if self.explore >= 1 or (self.explore > 0 and self._rng.random() < self.explore):
+            src = self._fifo
+            while src[0][4]:
+                src.popleft()
+            entry = src.popleft()
+        else:
+            while self._heap[0][4]:
+                heapq.heappop(self._heap)
+            entry = heapq.heappop(self._heap)
+        # The entry stays in the other structure; marking it taken skips it there later
+        entry[4] = True
+        self._live -= 1
+        return entry[3], entry[1]
+
+
+class PageYield:
+    """Reads and records one site's `page_yield` history for a crawl adapter.
+
+    Also keeps the run's totals in the site's counters: `new_links` and the five
+    pages that turned up the most (`top_pages`), which end up in run.log.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, site_id: str, counters: Dict):
+        self.conn = conn
+        self.site_id = site_id
+        self.counters = counters
+        self._top: List[Tuple[int, str]] = []
+
+    def history(self, urls: Sequence[str]) -> Dict[str, Tuple[float, float]]:
+        """url -> (new_links, fetches) for the URLs crawled before."""
+        if not urls:
+            return {}
+        keys = {url_key(u): u for u in urls}
+        return {keys[k]: v for k, v in dbm.get_page_yield(self.conn, self.site_id, list(keys)).items()}
+
+    def record(self, url: str, links: Sequence[str] = ()) -> int:
+        """Count the links of `url` not in the database yet; call it before yielding any
+        of them, since the runner writes each yielded link right away."""
+        norms = list(dict.fromkeys(normalize_url(link) for link in links))
+        new_links = len(norms) - len(dbm.known_urls(self.conn, norms)) if norms else 0
+        dbm.record_page_yield(self.conn, self.site_id, url_key(url), url, new_links)
+        c = self.counters
+        c['new_links'] = c.get('new_links', 0) + new_links
+        if new_links:
+            (heapq.heappush if len(self._top) < 5 else heapq.heappushpop)(self._top, (new_links, url))
+            c['top_pages'] = sorted(self._top, reverse=True)
+        return new_links
@@ -0,0 +1,191 @@
+"""Per-host URL rewrite rules learned from canonical resolutions.
+
+Most canonical lookups on a host come out the same way: http -> https, `www.` added
+or dropped, a trailing slash added or removed, a fixed path prefix swapped, or the
+URL unchanged. Every resolution the runner observes is reduced to such a rule (when it
+is one) and counted per host. A rule whose count reaches `min_hits` with a miss ratio
+of at most `max_miss_ratio` is confirmed and applied locally instead of fetching; a
+`spot_check` fraction of those URLs is still fetched, and a spot check that disagrees
+resets the rule's hits, so drift on the site sends the host back to fetching.
+"""
+from __future__ import annotations
+
+import random
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+# A rule is "scheme|host|slash|prefix_from|prefix_to": empty scheme/host keep the URL's,
+# slash is keep/add/remove, and prefix_from -> prefix_to rewrites a leading path segment run.
+_KEEP = 'keep'
+MAX_RULES_PER_HOST = 8
+
+
+def _split(url: str):
+    p = urlsplit(url)
+    return p.scheme, p.netloc, p.path or '/', p.query
+
+
+def derive_rule(src: str, dst: str) -> Optional[str]:
+    """The rule that turns `src` into `dst`, or None when the change is not one of ours."""
+    s_scheme, s_host, s_path, s_query = _split(src)
+    d_scheme, d_host, d_path, d_query = _split(dst)
+    if not d_scheme or not d_host or s_query != d_query:
+        return None
+    scheme = d_scheme if d_scheme != s_scheme else ''
+    host = d_host if d_host != s_host else ''
+    slash, p_from, p_to = _KEEP, '', ''
+    if d_path == s_path:
+        pass
+    elif d_path == s_path + '/':
+        slash = 'add'
+    elif s_path == d_path + '/' and d_path:
+        slash = 'remove'
+    else:
+        # Longest common tail starting at a '/' that leaves a real suffix: /amp/x/y -> /x/y
+        i = 0
+        while i < min(len(s_path), len(d_path)) and s_path[-1 - i] == d_path[-1 - i]:
+            i += 1
+        tail = s_path[len(s_path) - i:]
+        cut = tail.find('/')
+        if cut < 0 or len(tail) - cut <= 1:
+            return None
+        tail = tail[cut:]
+        p_from, p_to = s_path[:len(s_path) - len(tail)], d_path[:len(d_path) - len(tail)]
+    return '|'.join((scheme, host, slash, p_from, p_to))
+
+
+def apply_rule(rule: str, url: str) -> Optional[str]:
+    """`url` rewritten by `rule`, or None when the rule does not apply to it."""
+    scheme, host, slash, p_from, p_to = rule.split('|')
+    u_scheme, u_host, path, query = _split(url)
+    if p_from or p_to:
+        if not (path.startswith(p_from + '/') and len(path) > len(p_from) + 1):
+            return None
+        path = p_to + path[len(p_from):]
+    elif slash == 'add':
+        if path.endswith('/'):
+            return None
+        path += '/'
+    elif slash == 'remove':
+        if not path.endswith('/') or path == '/':
+            return None
+        path = path[:-1]
+    return urlunsplit((scheme or u_scheme, host or u_host, path, query, ''))
+
+
+class HostRules:
+    """Learned rules for all hosts, shared by a process's site workers.
+
+    Counts change in memory and are written back as deltas by `flush`, inside the
+    caller's transaction, so processes and nodes sharing the database add up.
+    """
+
+    def __init__(self, *, min_hits: int = 20, max_miss_ratio: float = 0.02, spot_check: float = 0.05,
+                 apply: bool = True, seed: Optional[int] = None):
+        self.min_hits = min_hits
+        self.max_miss_ratio = max_miss_ratio
+        self.spot_check = spot_check
+        self.apply = apply
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # host -> rule -> [hits, misses]
+        self._rules: Dict[str, Dict[str, List[int]]] = {}
+        # (host, rule) -> [hit delta, miss delta, reset]
+        self._pending: Dict[Tuple[str, str], List[int]] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> Optional['HostRules']:
+        if not settings or settings.get('mode', 'apply') == 'off':
+            return None
+        return cls(
+            min_hits=int(settings.get('min_hits', 20)),
+            max_miss_ratio=float(settings.get('max_miss_ratio', 0.02)),
+            spot_check=float(settings.get('spot_check', 0.05)),
+            apply=settings.get('mode', 'apply') == 'apply',
+        )
+
+    def load(self, conn: sqlite3.Connection) -> 'HostRules':
+        with self._lock:
+            for host, rule, hits, misses in conn.execute("SELECT host, rule, hits, misses FROM host_rules"):
+                self._rules.setdefault(host, {})[rule] = [int(hits), int(misses)]
+        return self
+
+    def _confirmed(self, counts: List[int]) -> bool:
+        hits, misses = counts
+        return hits >= self.min_hits and misses <= self.max_miss_ratio * (hits + misses)
+
+    def rewrite(self, url: str) -> Tuple[Optional[str], bool]:
+        """(locally resolved URL or None, spot_check). None means: fetch as usual.
+
+        With spot_check True the caller should fetch anyway and `observe` the result;
+        the returned URL is what the rule predicted.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            rules = self._rules.get(host)
+            if not rules:
+                return None, False
+            best, best_hits = None, -1
+            for rule, counts in rules.items():
+                if counts[0] > best_hits and self._confirmed(counts):
+                    out = apply_rule(rule, url)
+                    if out is not None:
+                        best, best_hits = out, counts[0]
+            if best is None or not self.apply:
+                return None, False
+            return best, self._rng.random() < self.spot_check
+
+    def observe(self, src: str, dst: str, *, spot_check: bool = False) -> None:
+        """Count a fetched resolution `src` -> `dst` (both normalized) against the host's rules."""
+        host = urlsplit(src).netloc
+        seen = derive_rule(src, dst)
+        with self._lock:
+            rules = self._rules.setdefault(host, {})
+            if seen is not None and seen not in rules:
+                if len(rules) >= MAX_RULES_PER_HOST:
+                    weakest = min(rules, key=lambda r: rules[r][0])
+                    if rules[weakest][0] > 1:
+                        seen = None
+                    else:
+                        del rules[weakest]
+                        self._pending.pop((host, weakest), None)
+                if seen is not None:
+                    rules[seen] = [0, 0]
+            for rule, counts in rules.items():
+                out = apply_rule(rule, src)
+                if out is None:
+                    continue
+                delta = self._pending.setdefault((host, rule), [0, 0, 0])
+                if out == dst:
+                    counts[0] += 1
+                    delta[0] += 1
+                    continue
+                if spot_check and self._confirmed(counts):
+                    # Drift: the site stopped doing what the rule says; relearn from scratch
+                    counts[0] = 0
+                    delta[0], delta[2] = 0, 1
+                counts[1] += 1
+                delta[1] += 1
+
+    def flush(self, conn: sqlite3.Connection) -> None:
+        """Write pending count changes; call it inside a write transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for (host, rule), (dh, dm, reset) in pending.items():
+            conn.execute(
+                "INSERT INTO host_rules(host, rule, hits, misses) VALUES(?,?,?,?)\n"
+                "ON CONFLICT(host, rule) DO UPDATE SET hits = CASE WHEN ? THEN excluded.hits ELSE hits + excluded.hits END, "
+                "misses = misses + excluded.misses",
+                (host, rule, dh, dm, reset),
+            )
+
+    def report(self) -> List[Dict]:
+        """Confirmed rules, strongest first, for run.log."""
+        with self._lock:
+            out = [
+                {'host': h, 'rule': r, 'hits': c[0], 'misses': c[1]}
+                for h, rules in self._rules.items() for r, c in rules.items() if self._confirmed(c)
+            ]
+        return sorted(out, key=lambda x: -x['hits'])
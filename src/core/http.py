@@ -6,21 +6,32 @@ from typing import Dict, Optional, Tuple
 
 import httpx
 
+from src.core.breaker import HostBreakers, RetryDeferred
+from src.core.metrics import NULL_METRICS, Metrics, host_of
+
 RETRY_STATUS = {429, 500, 502, 503, 504}
 
 
 class HttpClient:
-    def __init__(self, user_agent: str = "LinkHarvest/1.0", connect_timeout: float = 5.0, read_timeout: float = 20.0):
+    def __init__(self, user_agent: str = "LinkHarvest/1.0", connect_timeout: float = 5.0, read_timeout: float = 20.0, metrics: Optional[Metrics] = None, transport: Optional[httpx.BaseTransport] = None,
+                 breakers: Optional[HostBreakers] = None, defer_retries: bool = False):
         # httpx requires either a default timeout or all four parameters explicitly
+        # transport: optional record/replay transport (src.core.archive); RobotsCache shares self.client
+        # breakers: per-host circuit breakers (src.core.breaker); with defer_retries a retryable
+        # failure raises RetryDeferred at once instead of sleeping before the next attempt
         self.client = httpx.Client(
             timeout=httpx.Timeout(
                 connect=connect_timeout,
                 read=read_timeout,
                 write=read_timeout,
                 pool=connect_timeout,
-            )
+            ),
+            transport=transport,
         )
         self.ua = user_agent
+        self.metrics = metrics or NULL_METRICS
+        self.breakers = breakers
+        self.defer_retries = defer_retries
 
     def get(
         self,
@@ -31,7 +42,10 @@ class HttpClient:
         extra_headers: Optional[Dict[str, str]] = None,
         max_retries: int = 3,
         follow_redirects: bool = True,
+        defer_retries: Optional[bool] = None,
     ) -> httpx.Response:
+        # defer_retries overrides the client's setting for this call
+        defer = self.defer_retries if defer_retries is None else defer_retries
         headers = {"User-Agent": self.ua}
         if etag:
             headers["If-None-Match"] = etag
@@ -40,23 +54,50 @@ class HttpClient:
         if extra_headers:
             headers.update(extra_headers)
 
+        host = host_of(url)
+        metrics = self.metrics
+        breakers = self.breakers
         delay = 0.5
         for attempt in range(1, max_retries + 1):
+            if breakers is not None:
+                breakers.before(host, url)
+            t0 = time.perf_counter()
             try:
                 resp = self.client.get(url, headers=headers, follow_redirects=follow_redirects)
             except Exception as e:
+                elapsed = time.perf_counter() - t0
+                metrics.observe('http', host, elapsed)
+                if breakers is not None:
+                    # Only transport failures say the host is down; others (bad redirects) got an answer
+                    if isinstance(e, httpx.TransportError):
+                        breakers.failure(host, elapsed)
+                    else:
+                        breakers.success(host)
                 if attempt == max_retries:
                     raise
-                self._backoff_sleep(delay)
+                if defer:
+                    raise RetryDeferred(url, time.time() + delay, type(e).__name__) from e
+                with metrics.time('http.backoff', host):
+                    self._backoff_sleep(delay)
                 delay = min(delay * 2, 8.0)
                 continue
+            elapsed = time.perf_counter() - t0
+            metrics.observe('http', host, elapsed)
+            metrics.add_bytes('http', host, len(resp.content))
 
             if resp.status_code in RETRY_STATUS:
+                if breakers is not None:
+                    breakers.failure(host, elapsed)
                 if attempt == max_retries:
                     return resp
-                self._backoff_sleep(delay)
+                if defer:
+                    raise RetryDeferred(url, time.time() + max(delay, _retry_after(resp)), f"HTTP {resp.status_code}")
+                with metrics.time('http.backoff', host):
+                    self._backoff_sleep(delay)
                 delay = min(delay * 2, 8.0)
                 continue
+            if breakers is not None:
+                breakers.success(host)
             return resp
         return resp  # type: ignore
 
@@ -64,3 +105,11 @@ class HttpClient:
     def _backoff_sleep(base: float) -> None:
         jitter = base * random.uniform(0.8, 1.2)
         time.sleep(jitter)
+
+
+def _retry_after(resp: httpx.Response, cap: float = 300.0) -> float:
+    # Seconds form only; an HTTP-date Retry-After falls back to the normal delay
+    try:
+        return min(float(resp.headers.get('Retry-After', 0)), cap)
+    except ValueError:
+        return 0.0
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.core import db as dbm
+
+
+class LeaseManager:
+    """Claims work groups (one per host) for one round through the shared `leases` table.
+
+    A claimed lease is kept alive by a heartbeat thread; a lease whose owner stops
+    heartbeating expires after `ttl` seconds and is taken over by the next claimer.
+    Completed groups are never handed out again within the same round. When a heartbeat
+    finds a held lease taken over, the group's `lost(key)` event is set; the worker on it
+    stops at its next batch.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, round_key: str, owner: str, ttl: float = 120.0):
+        self._conn = conn
+        self.round = round_key
+        self.owner = owner
+        self.ttl = ttl
+        self._held: Set[str] = set()
+        self._lost: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._hb: Optional[threading.Thread] = None
+
+    def seed(self, keys: Iterable[str]) -> None:
+        with self._lock, dbm.transaction(self._conn):
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO leases(round, group_key) VALUES(?,?)",
+                [(self.round, k) for k in keys],
+            )
+
+    def claim(self) -> Optional[str]:
+        now = time.time()
+        with self._lock, dbm.transaction(self._conn):
+            # BEGIN IMMEDIATE holds the write lock, so select + update is atomic across nodes
+            row = self._conn.execute(
+                "SELECT group_key FROM leases WHERE round=? AND "
+                "(state='pending' OR (state='claimed' AND expires_at < ?)) "
+                "ORDER BY state='claimed', attempts, group_key LIMIT 1",
+                (self.round, now),
+            ).fetchone()
+            if row is None:
+                return None
+            key = row[0]
+            self._conn.execute(
+                "UPDATE leases SET state='claimed', owner=?, expires_at=?, heartbeat_at=?, attempts=attempts+1 "
+                "WHERE round=? AND group_key=?",
+                (self.owner, now + self.ttl, now, self.round, key),
+            )
+            self._held.add(key)
+            self._lost[key] = threading.Event()
+        return key
+
+    def lost(self, key: str) -> threading.Event:
+        """Set once a heartbeat finds `key` taken over by another node."""
+        with self._lock:
+            return self._lost.setdefault(key, threading.Event())
+
+    def heartbeat(self) -> List[str]:
+        """Extend all held leases; returns keys that were taken over by another node."""
+        now = time.time()
+        lost = []
+        with self._lock:
+            held = list(self._held)
+            if not held:
+                return lost
+            with dbm.transaction(self._conn):
+                for key in held:
+                    cur = self._conn.execute(
+                        "UPDATE leases SET expires_at=?, heartbeat_at=? "
+                        "WHERE round=? AND group_key=? AND owner=? AND state='claimed'",
+                        (now + self.ttl, now, self.round, key, self.owner),
+                    )
+                    if cur.rowcount == 0:
+                        lost.append(key)
+            self._held.difference_update(lost)
+            for key in lost:
+                self._lost.setdefault(key, threading.Event()).set()
+        return lost
+
+    def complete(self, key: str) -> None:
+        with self._lock, dbm.transaction(self._conn):
+            self._conn.execute(
+                "UPDATE leases SET state='done', expires_at=NULL, heartbeat_at=? "
+                "WHERE round=? AND group_key=? AND owner=?",
+                (time.time(), self.round, key, self.owner),
+            )
+            self._held.discard(key)
+            self._lost.pop(key, None)
+
+    def start_heartbeat(self) -> None:
+        def _loop():
+            while not self._stop.wait(self.ttl / 3.0):
+                try:
+                    # Lost keys are signalled through their `lost` events
+                    self.heartbeat()
+                except sqlite3.Error:
+                    pass  # transient lock contention; next beat retries well before expiry
+
+        self._hb = threading.Thread(target=_loop, name='lease-heartbeat', daemon=True)
+        self._hb.start()
+
+    def stop_heartbeat(self) -> None:
+        self._stop.set()
+        if self._hb is not None:
+            self._hb.join()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import orjson
+
+# Upper bounds in seconds; the implicit last bucket is +Inf
+BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def merge(self, d: Dict[str, Any]) -> None:
+        for i, c in enumerate(d['counts']):
+            self.counts[i] += c
+        self.count += d['count']
+        self.sum += d['sum']
+        self.max = max(self.max, d['max'])
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'counts': list(self.counts),
+        }
+
+
+class Metrics:
+    """Thread-safe timing histograms and byte counters keyed by (stage, host).
+
+    Stages used by the pipeline: http, ratelimit.wait, robots.fetch, parse,
+    canonical, db.lookup, db.lock_wait, db.write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: Dict[Tuple[str, str], _Histogram] = {}
+        self._bytes: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stage: str, host: str, seconds: float) -> None:
+        key = (stage, host)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = _Histogram()
+            h.observe(seconds)
+
+    def add_bytes(self, stage: str, host: str, n: int) -> None:
+        key = (stage, host)
+        with self._lock:
+            self._bytes[key] = self._bytes.get(key, 0) + int(n)
+
+    @contextmanager
+    def time(self, stage: str, host: str = '') -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, host, time.perf_counter() - t0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Raw, mergeable state (used to ship worker-process metrics to the parent)."""
+        with self._lock:
+            return {
+                'hist': [[stage, host, h.to_dict()] for (stage, host), h in self._hist.items()],
+                'bytes': [[stage, host, n] for (stage, host), n in self._bytes.items()],
+            }
+
+    def merge(self, snap: Dict[str, Any]) -> None:
+        with self._lock:
+            for stage, host, d in snap.get('hist', []):
+                h = self._hist.get((stage, host))
+                if h is None:
+                    h = self._hist[(stage, host)] = _Histogram()
+                h.merge(d)
+            for stage, host, n in snap.get('bytes', []):
+                self._bytes[(stage, host)] = self._bytes.get((stage, host), 0) + n
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages: Dict[str, Dict[str, Any]] = {}
+            totals: Dict[str, _Histogram] = {}
+            for (stage, host), h in sorted(self._hist.items()):
+                stages.setdefault(stage, {'hosts': {}})['hosts'][host or '-'] = h.to_dict()
+                t = totals.setdefault(stage, _Histogram())
+                t.merge(h.to_dict())
+            for stage, t in totals.items():
+                stages[stage]['total'] = t.to_dict()
+            byte_stages: Dict[str, Dict[str, int]] = {}
+            for (stage, host), n in sorted(self._bytes.items()):
+                byte_stages.setdefault(stage, {})[host or '-'] = n
+        return {'buckets': list(BUCKETS), 'stages': stages, 'bytes': byte_stages}
+
+    def write_json(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(self.report(), option=orjson.OPT_INDENT_2))
+
+    def write_prometheus(self, path: str, prefix: str = 'linkharvest') -> None:
+        """Prometheus textfile-collector format; written atomically via rename."""
+        lines: List[str] = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage and host",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            hist = sorted(self._hist.items())
+            byts = sorted(self._bytes.items())
+        for (stage, host), h in hist:
+            labels = f'stage="{_esc(stage)}",host="{_esc(host)}"'
+            cum = 0
+            for i, c in enumerate(h.counts):
+                cum += c
+                le = repr(BUCKETS[i]) if i < len(BUCKETS) else '+Inf'
+                lines.append(f'{prefix}_stage_seconds_bucket{{{labels},le="{le}"}} {cum}')
+            lines.append(f'{prefix}_stage_seconds_sum{{{labels}}} {h.sum:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{{labels}}} {h.count}')
+        lines.append(f"# HELP {prefix}_bytes_total Bytes transferred per stage and host")
+        lines.append(f"# TYPE {prefix}_bytes_total counter")
+        for (stage, host), n in byts:
+            lines.append(f'{prefix}_bytes_total{{stage="{_esc(stage)}",host="{_esc(host)}"}} {n}')
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+
+def _esc(v: str) -> str:
+    return v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class NullMetrics(Metrics):
+    """Drop-in no-op used when no metrics sink is configured."""
+
+    def observe(self, stage: str, host: str, seconds: float) -> None:
+        return None
+
+    def add_bytes(self, stage: str, host: str, n: int) -> None:
+        return None
+
+    @contextmanager
+    def time(self, stage: str, host: str = '') -> Iterator[None]:
+        yield
+
+
+NULL_METRICS = NullMetrics()
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, Dict, NamedTuple, Literal, Any
+from typing import Optional, Dict, Iterator, List, NamedTuple, Literal, Any
 
 SourceKind = Literal['wordpress', 'rss', 'sitemap', 'crawl', 'jscrawl']
 DiscoverySource = Literal['api', 'rss', 'sitemap', 'crawl']
@@ -14,6 +14,54 @@ class Discovered(NamedTuple):
     meta: Dict[str, str]
 
 
+class DiscoveredBatch:
+    """Columnar chunk of discoveries from one source: parallel url/lastmod lists, no per-item meta.
+
+    `canonicals` is None when no item carries a canonical (the common case). `keys` holds
+    the items' lastmod-watermark keys when the adapter filtered the batch against them;
+    the runner then stores them in the transaction that writes the batch.
+    """
+
+    __slots__ = ('source', 'urls', 'lastmods', 'canonicals', 'keys')
+
+    def __init__(self, source: DiscoverySource, urls: Optional[List[str]] = None, lastmods: Optional[List[Optional[str]]] = None, canonicals: Optional[List[Optional[str]]] = None, keys: Optional[List[int]] = None):
+        self.source = source
+        self.urls = urls if urls is not None else []
+        self.lastmods = lastmods if lastmods is not None else [None] * len(self.urls)
+        self.canonicals = canonicals
+        self.keys = keys
+
+    @classmethod
+    def of(cls, d: Discovered) -> 'DiscoveredBatch':
+        return cls(d.source, [d.url], [d.lastmod], [d.canonical] if d.canonical else None)
+
+    def append(self, url: str, lastmod: Optional[str] = None) -> None:
+        self.urls.append(url)
+        self.lastmods.append(lastmod)
+
+    def select(self, indices: List[int]) -> 'DiscoveredBatch':
+        canon = [self.canonicals[i] for i in indices] if self.canonicals is not None else None
+        keys = [self.keys[i] for i in indices] if self.keys is not None else None
+        return DiscoveredBatch(self.source, [self.urls[i] for i in indices], [self.lastmods[i] for i in indices], canon, keys)
+
+    def chunks(self, size: int) -> Iterator['DiscoveredBatch']:
+        if len(self.urls) <= size:
+            yield self
+            return
+        for i in range(0, len(self.urls), size):
+            canon = self.canonicals[i:i + size] if self.canonicals is not None else None
+            keys = self.keys[i:i + size] if self.keys is not None else None
+            yield DiscoveredBatch(self.source, self.urls[i:i + size], self.lastmods[i:i + size], canon, keys)
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __iter__(self) -> Iterator[Discovered]:
+        canon = self.canonicals or [None] * len(self.urls)
+        for url, lastmod, c in zip(self.urls, self.lastmods, canon):
+            yield Discovered(url=url, canonical=c, lastmod=lastmod, source=self.source, meta={})
+
+
 class SiteConfig(NamedTuple):
     id: str
     kind: SourceKind
@@ -4,7 +4,6 @@ import re
 from typing import Optional, Tuple, Dict
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-from lxml import html
 
 try:
     import httpx  # type: ignore
@@ -48,10 +47,12 @@ def normalize_url(url: str) -> str:
     return urlunsplit((scheme, netloc, path, query, fragment))
 
 
-def resolve_canonical_once(url: str, http_client, *, robots=None, ratelimiter=None, rps: float = 1.0, ua: Optional[str] = None, extra_headers: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[str]]:
+def resolve_canonical_once(url: str, http_client, *, robots=None, ratelimiter=None, rps: float = 1.0, ua: Optional[str] = None, extra_headers: Optional[Dict[str, str]] = None, detail: Optional[Dict] = None) -> Tuple[str, Optional[str]]:
     """
     Try a single redirect resolution via HEAD, and if HTML, prefer <link rel="canonical">.
     Returns (final_url, canonical_tag_url_or_None). If network unavailable, returns input.
+    When `detail` is given, the response status is stored in it as 'status' (absent when
+    nothing was fetched), so callers can tell a real answer from a fallback.
     """
     try:
         if robots and not robots.allowed(url, user_agent=ua):
@@ -66,11 +67,14 @@ def resolve_canonical_once(url: str, http_client, *, robots=None, ratelimiter=No
         resp = http_client.get(url, extra_headers=headers, max_retries=1)
     except Exception:
         return url, None
+    if detail is not None:
+        detail['status'] = resp.status_code
     if 300 <= resp.status_code < 400 and resp.headers.get('Location'):
         return resp.headers['Location'], None
     content_type = resp.headers.get('Content-Type', '')
     if 'html' in content_type and resp.text:
         try:
+            from lxml import html
             doc = html.fromstring(resp.text)
             link = doc.xpath("//link[@rel='canonical']/@href")
             if link:
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import cProfile
+import heapq
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+# Hard cap on buffered trace events so a long run with a high sample rate stays bounded
+MAX_TRACE_EVENTS = 200_000
+
+
+def _now_us() -> int:
+    # Wall clock so events from several worker processes line up on one timeline
+    return time.time_ns() // 1000
+
+
+class UrlTrace:
+    """Timing of one discovered URL through the pipeline; spans are only emitted when sampled."""
+
+    __slots__ = ('_profiler', 'site_id', 'url', 'sampled', 'stages')
+
+    def __init__(self, profiler: 'Profiler', site_id: str, url: str, sampled: bool):
+        self._profiler = profiler
+        self.site_id = site_id
+        self.url = url
+        self.sampled = sampled
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        ts = _now_us()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dur = time.perf_counter() - t0
+            self.stages[name] = self.stages.get(name, 0.0) + dur
+            if self.sampled:
+                self._profiler._event(name, ts, dur, {'site': self.site_id, 'url': self.url})
+
+    def add(self, name: str, ts: int, dur: float, share: float) -> None:
+        # A stage run once for a whole batch: the span is shared, the URL is charged `share` of it
+        self.stages[name] = self.stages.get(name, 0.0) + share
+        if self.sampled:
+            self._profiler._event(name, ts, dur, {'site': self.site_id, 'url': self.url, 'batch_share': round(share / dur, 4) if dur else 1.0})
+
+    def done(self) -> None:
+        # Sum of stages rather than wall time, so URLs handled in one batch are not charged for each other
+        self._profiler._url_done(self, sum(self.stages.values()))
+
+
+class _NullTrace:
+    __slots__ = ()
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def add(self, name: str, ts: int, dur: float, share: float) -> None:
+        return None
+
+    def done(self) -> None:
+        return None
+
+
+NULL_TRACE = _NullTrace()
+
+
+@contextmanager
+def shared_stage(traces: List[Any], name: str) -> Iterator[None]:
+    """Time one operation done for several URLs at once (e.g. a batched DB statement)."""
+    ts = _now_us()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dur = time.perf_counter() - t0
+        share = dur / len(traces) if traces else 0.0
+        for t in traces:
+            t.add(name, ts, dur, share)
+
+
+class Profiler:
+    """Per-site cProfile collection, sampled URL tracing and top-N slow lists.
+
+    Only one site per process runs under cProfile at a time: from Python 3.12 cProfile
+    hooks into sys.monitoring, which is interpreter-wide, and a second `enable()` raises
+    ValueError. A site that starts while another one is profiled (or while some other
+    profiling tool is active) runs without cProfile and is counted in `skipped`; it still
+    gets its trace span and slow-list entry. On 3.12+ a site's stats can include work
+    that other worker threads did while it was profiled.
+    """
+
+    def __init__(self, out_dir: str, *, site_sample: float = 1.0, url_sample: float = 0.01, top_n: int = 20):
+        self.out_dir = out_dir
+        self.site_sample = site_sample
+        self.url_sample = url_sample
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._cprofile = threading.Lock()
+        self.skipped = 0
+        self._events: List[Dict[str, Any]] = []
+        self._dropped = 0
+        self._slow_sites: List[Tuple[float, str]] = []
+        self._slow_urls: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = 0
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]]) -> Optional['Profiler']:
+        if not settings:
+            return None
+        return cls(
+            settings['out_dir'],
+            site_sample=float(settings.get('site_sample', 1.0)),
+            url_sample=float(settings.get('url_sample', 0.01)),
+            top_n=int(settings.get('top_n', 20)),
+        )
+
+    @contextmanager
+    def site(self, site_id: str) -> Iterator[None]:
+        prof = self._start_cprofile() if random.random() < self.site_sample else None
+        ts = _now_us()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+                self._cprofile.release()
+            dur = time.perf_counter() - t0
+            self._event('site', ts, dur, {'site': site_id})
+            with self._lock:
+                self._push(self._slow_sites, (dur, site_id))
+            if prof is not None:
+                pdir = os.path.join(self.out_dir, 'profile')
+                os.makedirs(pdir, exist_ok=True)
+                prof.dump_stats(os.path.join(pdir, f"{_safe_name(site_id)}.pstats"))
+
+    def _start_cprofile(self) -> Optional[cProfile.Profile]:
+        if not self._cprofile.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Another profiling tool is already active in this interpreter
+            self._cprofile.release()
+            with self._lock:
+                self.skipped += 1
+            return None
+        return prof
+
+    def url(self, site_id: str, url: str) -> UrlTrace:
+        return UrlTrace(self, site_id, url, random.random() < self.url_sample)
+
+    def _push(self, heap: list, item: tuple) -> None:
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def _event(self, name: str, ts: int, dur: float, args: Dict[str, Any]) -> None:
+        ev = {
+            'name': name,
+            'ph': 'X',
+            'ts': ts,
+            'dur': int(dur * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            if len(self._events) < MAX_TRACE_EVENTS:
+                self._events.append(ev)
+            else:
+                self._dropped += 1
+
+    def _url_done(self, trace: UrlTrace, total: float) -> None:
+        with self._lock:
+            self._seq += 1
+            if len(self._slow_urls) >= self.top_n and total <= self._slow_urls[0][0]:
+                return
+            rec = {
+                'site_id': trace.site_id,
+                'url': trace.url,
+                'seconds': round(total, 6),
+                'stages': {k: round(v, 6) for k, v in trace.stages.items()},
+            }
+            self._push(self._slow_urls, (total, self._seq, rec))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'events': list(self._events),
+                'dropped': self._dropped,
+                'skipped': self.skipped,
+                'sites': list(self._slow_sites),
+                'urls': [rec for _, _, rec in self._slow_urls],
+            }
+
+    def merge(self, snap: Dict[str, Any]) -> None:
+        with self._lock:
+            room = MAX_TRACE_EVENTS - len(self._events)
+            self._events.extend(snap['events'][:room])
+            self._dropped += snap['dropped'] + max(0, len(snap['events']) - room)
+            self.skipped += snap.get('skipped', 0)
+            for dur, sid in snap['sites']:
+                self._push(self._slow_sites, (dur, sid))
+            for rec in snap['urls']:
+                self._seq += 1
+                self._push(self._slow_urls, (rec['seconds'], self._seq, rec))
+
+    def write(self) -> None:
+        os.makedirs(self.out_dir, exist_ok=True)
+        snap = self.snapshot()
+        with open(os.path.join(self.out_dir, 'trace.json'), 'wb') as f:
+            f.write(orjson.dumps({'traceEvents': snap['events'], 'displayTimeUnit': 'ms', 'otherData': {'dropped_events': snap['dropped']}}))
+        slowest = {
+            'profile_skipped_sites': snap['skipped'],
+            'sites': [{'site_id': sid, 'seconds': round(d, 6)} for d, sid in sorted(snap['sites'], reverse=True)],
+            'urls': sorted(snap['urls'], key=lambda r: r['seconds'], reverse=True),
+        }
+        with open(os.path.join(self.out_dir, 'slowest.json'), 'wb') as f:
+            f.write(orjson.dumps(slowest, option=orjson.OPT_INDENT_2))
+
+
+def _safe_name(s: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', s)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from src.core import db as dbm
+
+TABLES = ('urls', 'url_by_source')
+ACTIONS = ('delete', 'archive')
+TASK = 'retention'
+
+
+class RetentionPolicy(NamedTuple):
+    table: str
+    max_age_days: float
+    action: str = 'delete'
+    # urls only: 'api' | 'rss' | 'sitemap' | 'crawl', or 'resource' for rows written by
+    # conditional-GET bookkeeping (feeds, listing pages, WP API pages; discovered_via IS NULL)
+    discovered_via: Optional[str] = None
+    # url_by_source only
+    source_id: Optional[str] = None
+
+
+def parse_policies(cfg: Dict[str, Any]) -> List[RetentionPolicy]:
+    out = []
+    for raw in cfg.get('policies') or []:
+        p = RetentionPolicy(
+            table=raw['table'],
+            max_age_days=float(raw['max_age_days']),
+            action=raw.get('action', 'delete'),
+            discovered_via=raw.get('discovered_via'),
+            source_id=raw.get('source_id'),
+        )
+        if p.table not in TABLES:
+            raise ValueError(f"Unknown retention table: {p.table}")
+        if p.action not in ACTIONS:
+            raise ValueError(f"Unknown retention action: {p.action}")
+        if p.discovered_via and p.table != 'urls':
+            raise ValueError("discovered_via filter only applies to the urls table")
+        if p.source_id and p.table != 'url_by_source':
+            raise ValueError("source_id filter only applies to the url_by_source table")
+        if p.action == 'archive' and not cfg.get('archive_db'):
+            raise ValueError("archive action requires retention.archive_db")
+        out.append(p)
+    return out
+
+
+def is_due(conn: sqlite3.Connection, cfg: Dict[str, Any], now: Optional[int] = None) -> bool:
+    now = now if now is not None else int(time.time())
+    interval = float(cfg.get('interval_hours', 24)) * 3600
+    row = conn.execute("SELECT last_run_at FROM maintenance WHERE task=?", (TASK,)).fetchone()
+    return row is None or (now - int(row[0])) >= interval
+
+
+def _where(p: RetentionPolicy, cutoff: int) -> Tuple[str, List[Any]]:
+    clauses, params = ["last_seen < ?"], [cutoff]
+    if p.discovered_via == 'resource':
+        clauses.append("discovered_via IS NULL")
+    elif p.discovered_via:
+        clauses.append("discovered_via = ?")
+        params.append(p.discovered_via)
+    if p.source_id:
+        clauses.append("source_id = ?")
+        params.append(p.source_id)
+    return " AND ".join(clauses), params
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _ensure_archive_table(conn: sqlite3.Connection, table: str) -> List[str]:
+    cols = _columns(conn, 'main', table)
+    existing = _columns(conn, 'archive', table)
+    if not existing:
+        conn.execute(f"CREATE TABLE archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+        conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN archived_at INTEGER")
+    else:
+        for c in cols:
+            if c not in existing:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {c}")
+    return cols
+
+
+def _apply_policy(conn: sqlite3.Connection, p: RetentionPolicy, *, now: int, batch_size: int, pause: float) -> int:
+    cutoff = now - int(p.max_age_days * 86400)
+    where, params = _where(p, cutoff)
+    cols = _ensure_archive_table(conn, p.table) if p.action == 'archive' else None
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_batch(rid INTEGER PRIMARY KEY)")
+    removed = 0
+    while True:
+        # One short write transaction per batch so concurrent writers can interleave
+        with dbm.transaction(conn):
+            conn.execute("DELETE FROM temp.retention_batch")
+            # ORDER BY last_seen walks the last_seen index instead of the whole table
+            conn.execute(
+                f"INSERT INTO temp.retention_batch(rid) SELECT rowid FROM main.{p.table} "
+                f"WHERE {where} ORDER BY last_seen LIMIT ?",
+                params + [batch_size],
+            )
+            sel = "rowid IN (SELECT rid FROM temp.retention_batch)"
+            if cols is not None:
+                col_list = ", ".join(cols)
+                conn.execute(
+                    f"INSERT INTO archive.{p.table}({col_list}, archived_at) "
+                    f"SELECT {col_list}, ? FROM main.{p.table} WHERE {sel}",
+                    (now,),
+                )
+            if p.table == 'url_by_source':
+                # Keep maintained totals consistent with the rows that remain
+                conn.execute(
+                    "UPDATE source_stats SET total_seen = MAX(0, total_seen - ("
+                    f"SELECT COUNT(*) FROM main.url_by_source b WHERE b.source_id = source_stats.source_id AND b.{sel})) "
+                    f"WHERE source_id IN (SELECT DISTINCT source_id FROM main.url_by_source WHERE {sel})"
+                )
+            n = conn.execute(f"DELETE FROM main.{p.table} WHERE {sel}").rowcount
+        removed += n
+        if n < batch_size:
+            return removed
+        if pause > 0:
+            time.sleep(pause)
+
+
+def _page_stats(conn: sqlite3.Connection) -> Tuple[int, int, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size, page_count, freelist
+
+
+def incremental_vacuum(conn: sqlite3.Connection, *, pages_per_step: int = 2000, max_seconds: float = 30.0) -> int:
+    """Release free pages in small steps; returns pages released."""
+    released = 0
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before == 0:
+            break
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages_per_step)})").fetchall()
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        released += before - after
+        if after >= before:
+            break
+    return released
+
+
+def run_retention(conn: sqlite3.Connection, cfg: Dict[str, Any], *, now: Optional[int] = None) -> Dict[str, Any]:
+    """Apply the configured policies, vacuum incrementally and report what was reclaimed."""
+    now = now if now is not None else int(time.time())
+    policies = parse_policies(cfg)
+    batch_size = int(cfg.get('batch_size', 5000))
+    pause = float(cfg.get('batch_pause_seconds', 0.05))
+    started = time.monotonic()
+    page_size, pages_before, _ = _page_stats(conn)
+
+    report: Dict[str, Any] = {'policies': []}
+    archive_db = cfg.get('archive_db')
+    attached = False
+    if any(p.action == 'archive' for p in policies):
+        d = os.path.dirname(archive_db)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_db,))
+        attached = True
+    try:
+        for p in policies:
+            n = _apply_policy(conn, p, now=now, batch_size=batch_size, pause=pause)
+            report['policies'].append({**p._asdict(), 'rows': n})
+    finally:
+        if attached:
+            conn.execute("DETACH DATABASE archive")
+
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if auto_vacuum == 0 and cfg.get('convert_auto_vacuum'):
+        # One-off full rewrite for databases created before auto_vacuum was enabled
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    released = 0
+    if auto_vacuum == 2:
+        released = incremental_vacuum(
+            conn,
+            pages_per_step=int(cfg.get('vacuum_pages', 2000)),
+            max_seconds=float(cfg.get('vacuum_max_seconds', 30)),
+        )
+    page_size, pages_after, freelist = _page_stats(conn)
+    conn.execute(
+        "INSERT INTO maintenance(task, last_run_at) VALUES(?,?)\n"
+        "ON CONFLICT(task) DO UPDATE SET last_run_at=excluded.last_run_at",
+        (TASK, now),
+    )
+    report.update({
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, str(auto_vacuum)),
+        'pages_released': released,
+        'bytes_reclaimed': max(0, pages_before - pages_after) * page_size,
+        'db_bytes': pages_after * page_size,
+        'free_bytes': freelist * page_size,
+        'seconds': round(time.monotonic() - started, 3),
+    })
+    return report
@@ -8,10 +8,15 @@ import threading
 
 import httpx
 
+from src.core.breaker import CircuitOpen, HostBreakers
+from src.core.metrics import NULL_METRICS, Metrics
+
 
 class RobotsCache:
-    def __init__(self, client: httpx.Client, user_agent: str = "LinkHarvest/1.0"):
+    def __init__(self, client: httpx.Client, user_agent: str = "LinkHarvest/1.0", metrics: Optional[Metrics] = None, breakers: Optional[HostBreakers] = None):
         self._client = client
+        self.metrics = metrics or NULL_METRICS
+        self.breakers = breakers
         self._ua = user_agent
         self._cache: Dict[str, robotparser.RobotFileParser] = {}
         self._fetched_at: Dict[str, float] = {}
@@ -29,8 +34,25 @@ class RobotsCache:
         with self._lock:
             needs_fetch = rob_url not in self._cache or (now - self._fetched_at.get(rob_url, 0)) > self._ttl
         if needs_fetch:
+            host = urlsplit(url).netloc.lower()
+            breakers = self.breakers
+            if breakers is not None:
+                try:
+                    # On a half-open host robots.txt is the probe, so no page goes out unchecked
+                    breakers.before(host, rob_url)
+                except CircuitOpen:
+                    # Not cached: the request itself fails fast on the open breaker too
+                    return True
+            t0 = time.perf_counter()
             try:
-                resp = self._client.get(rob_url, headers={"User-Agent": ua}, timeout=5.0, follow_redirects=True)
+                with self.metrics.time('robots.fetch', host):
+                    resp = self._client.get(rob_url, headers={"User-Agent": ua}, timeout=5.0, follow_redirects=True)
+                self.metrics.add_bytes('robots.fetch', host, len(resp.content))
+                if breakers is not None:
+                    if resp.status_code >= 500:
+                        breakers.failure(host, time.perf_counter() - t0)
+                    else:
+                        breakers.success(host)
                 rp = robotparser.RobotFileParser()
                 if resp.status_code == 200:
                     rp.parse(resp.text.splitlines())
@@ -39,7 +61,12 @@ class RobotsCache:
                 with self._lock:
                     self._cache[rob_url] = rp
                     self._fetched_at[rob_url] = now
-            except Exception:
+            except Exception as e:
+                if breakers is not None:
+                    if isinstance(e, httpx.TransportError):
+                        breakers.failure(host, time.perf_counter() - t0)
+                        return True
+                    breakers.success(host)
                 rp = robotparser.RobotFileParser()
                 rp.parse(":\n".splitlines())
                 with self._lock:
@@ -1,19 +1,24 @@
 from __future__ import annotations
 
+import heapq
 import time
 from urllib.parse import urlsplit
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 import threading
 
+from src.core.metrics import NULL_METRICS, Metrics
+
 
 class RateLimiter:
-    def __init__(self):
+    def __init__(self, metrics: Optional[Metrics] = None):
         self._next_ok: Dict[str, float] = {}
         self._lock = threading.Lock()
+        self.metrics = metrics or NULL_METRICS
 
     def await_slot(self, url: str, rps: float) -> None:
         host = urlsplit(url).netloc
         min_interval = 1.0 / max(rps, 0.01)
+        started = time.time()
         while True:
             now = time.time()
             with self._lock:
@@ -21,7 +26,39 @@ class RateLimiter:
                 if next_ok <= now:
                     # claim the slot
                     self._next_ok[host] = now + min_interval
+                    self.metrics.observe('ratelimit.wait', host.lower(), now - started)
                     return
                 wait = next_ok - now
             # Sleep outside the lock
             time.sleep(wait)
+
+
+class RetryQueue:
+    """Work deferred to a later pass, ordered by when it is due.
+
+    Filled while a pass runs and drained between passes, so no worker sleeps while
+    a retry waits for its backoff or for a host's breaker to close.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._n = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: Any, ready_at: float) -> None:
+        heapq.heappush(self._heap, (ready_at, self._n, item))
+        self._n += 1
+
+    def wait_time(self, max_wait: float) -> float:
+        """Seconds until everything queued is due, at most `max_wait`."""
+        if not self._heap:
+            return 0.0
+        latest = max(t for t, _, _ in self._heap)
+        return max(0.0, min(latest - time.time(), max_wait))
+
+    def drain(self) -> List[Any]:
+        """All queued items, earliest due first."""
+        items = [heapq.heappop(self._heap)[2] for _ in range(len(self._heap))]
+        return items
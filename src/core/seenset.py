@@ -0,0 +1,182 @@
+"""Compact set of seen URLs for large crawls.
+
+URLs are reduced to 64-bit fingerprints in an open-addressing table backed by
+`array('Q')`: 8 bytes per slot instead of a Python str plus a set entry (~100+ bytes
+per URL). When the table would outgrow `max_bytes`, its keys are merged into a sorted
+run on disk, which is memory-mapped and binary-searched from then on, and the table
+starts over empty. A collision between two URLs' fingerprints (about n^2 / 2^65 for n
+URLs) makes the crawl skip one of them.
+"""
+from __future__ import annotations
+
+import heapq
+import mmap
+import os
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+
+_MASK = (1 << 64) - 1
+_EMPTY = 0
+_MIN_SLOTS = 1024
+# Grow (or spill) once this many of every 8 slots are taken
+_MAX_LOAD_EIGHTHS = 5
+# Spills sort and write keys in chunks of this many
+_CHUNK = 65536
+
+
+def fingerprint(url: str) -> int:
+    """Unsigned 64-bit fingerprint of `url`; never 0, which marks an empty slot.
+
+    The interpreter's keyed string hash (SipHash) is good enough here and much faster
+    than a digest. It differs between processes, which is fine: a set and its spill
+    file live and die with one crawl.
+    """
+    return (hash(url) & _MASK) or 1
+
+
+class _SortedRun:
+    """A sorted file of uint64 keys, memory-mapped for lookups.
+
+    The file is unlinked as soon as it is open, so it disappears with the mapping even
+    when the owner is dropped without `close` (an abandoned adapter generator).
+    """
+
+    def __init__(self, path: str, count: int):
+        self.count = count
+        self._f = open(path, 'rb')
+        os.unlink(path)
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.keys = memoryview(self._mm).cast('Q') if self._mm is not None else array('Q')
+
+    def __contains__(self, fp: int) -> bool:
+        i = bisect_left(self.keys, fp)
+        return i < self.count and self.keys[i] == fp
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self.keys.release()
+            self._mm.close()
+        self._f.close()
+
+
+class SeenSet:
+    """Set of URLs by fingerprint, bounded to about `max_bytes` of memory.
+
+    `close` (or the context manager) releases the spill file's mapping right away.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, spill_dir: Optional[str] = None):
+        self.max_bytes = max(int(max_bytes), _MIN_SLOTS * 8)
+        self.spill_dir = spill_dir
+        self._table = array('Q', bytes(8 * _MIN_SLOTS))
+        self._mask = _MIN_SLOTS - 1
+        self._used = 0
+        self._run: Optional[_SortedRun] = None
+        self.spills = 0
+
+    def __len__(self) -> int:
+        return self._used + (self._run.count if self._run is not None else 0)
+
+    def __contains__(self, url: str) -> bool:
+        fp = fingerprint(url)
+        return self._find(fp) >= 0 or (self._run is not None and fp in self._run)
+
+    def add(self, url: str) -> bool:
+        """Add `url`; True if it was not in the set yet."""
+        fp = fingerprint(url)
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while True:
+            v = table[i]
+            if v == fp:
+                return False
+            if v == _EMPTY:
+                break
+            i = (i + 1) & mask
+        if self._run is not None and fp in self._run:
+            return False
+        if (self._used + 1) * 8 > len(table) * _MAX_LOAD_EIGHTHS:
+            if len(table) * 16 <= self.max_bytes:
+                self._resize(len(table) * 2)
+            else:
+                self._spill()
+            self._insert(fp)
+        else:
+            table[i] = fp
+            self._used += 1
+        return True
+
+    def _find(self, fp: int) -> int:
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while True:
+            v = table[i]
+            if v == fp:
+                return i
+            if v == _EMPTY:
+                return -1
+            i = (i + 1) & mask
+
+    def _insert(self, fp: int) -> None:
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while table[i] != _EMPTY:
+            i = (i + 1) & mask
+        table[i] = fp
+        self._used += 1
+
+    def _resize(self, slots: int) -> None:
+        old = self._table
+        self._table = array('Q', bytes(8 * slots))
+        self._mask = slots - 1
+        self._used = 0
+        for v in old:
+            if v != _EMPTY:
+                self._insert(v)
+
+    def _spill(self) -> None:
+        # Merge the table's keys with the current run into a new sorted run, then start the
+        # table over; memory stays at the table's size while the run grows on disk. The keys
+        # are sorted in chunks and merged, so no list of all of them is ever built.
+        keys = array('Q', (v for v in self._table if v != _EMPTY))
+        self._table = array('Q')
+        chunks = [array('Q', sorted(keys[i:i + _CHUNK])) for i in range(0, len(keys), _CHUNK)]
+        del keys
+        if self._run is not None:
+            chunks.append(self._run)
+        fd, path = tempfile.mkstemp(prefix='seenset-', suffix='.u64', dir=self.spill_dir)
+        count = 0
+        with os.fdopen(fd, 'wb') as f:
+            merged: Iterable[int] = heapq.merge(*chunks)
+            buf = array('Q')
+            for v in merged:
+                buf.append(v)
+                if len(buf) >= _CHUNK:
+                    buf.tofile(f)
+                    count += len(buf)
+                    buf = array('Q')
+            buf.tofile(f)
+            count += len(buf)
+        if self._run is not None:
+            self._run.close()
+        del chunks
+        self._run = _SortedRun(path, count)
+        self._table = array('Q', bytes((self._mask + 1) * 8))
+        self._used = 0
+        self.spills += 1
+
+    def close(self) -> None:
+        if self._run is not None:
+            self._run.close()
+            self._run = None
+
+    def __enter__(self) -> 'SeenSet':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import orjson
+
+from src.core.metrics import NULL_METRICS, Metrics
+
+# A record is one new (site, URL) pair, shaped like a line of new.ndjson:
+# {'site_id', 'url', 'first_seen', 'lastmod'}
+Record = Dict[str, Any]
+
+
+class Sink:
+    """Destination for new URLs, fed as soon as their insert commits.
+
+    `emit` takes a list of records and may block or raise; `close` releases resources.
+    `flush_interval` is how long a QueuedSink may hold records back to fill a batch.
+    """
+
+    name = 'sink'
+    flush_interval = 0.0
+
+    def emit(self, records: List[Record]) -> None:
+        raise NotImplementedError
+
+    def close(self, timeout: float = 30.0) -> None:
+        return None
+
+
+def _ndjson(records: List[Record]) -> bytes:
+    return b''.join(orjson.dumps(r) + b'\n' for r in records)
+
+
+class NdjsonSink(Sink):
+    """Line-delimited JSON to stdout or a file, flushed after every batch of records."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.name = path or 'stdout'
+        self._lock = threading.Lock()
+        if path is None:
+            self._f = sys.stdout.buffer
+            self._own = False
+        else:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Append mode: worker processes can share one file, each write lands whole
+            self._f = open(path, 'ab', buffering=0)
+            self._own = True
+
+    def emit(self, records: List[Record]) -> None:
+        data = _ndjson(records)
+        with self._lock:
+            try:
+                self._f.write(data)
+                self._f.flush()
+            except BrokenPipeError:
+                if not self._own:
+                    # The reader (`| head`) is gone; keep the interpreter's exit flush from failing too
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                raise SinkGone(f"{self.name}: reader closed the pipe")
+
+    def close(self, timeout: float = 30.0) -> None:
+        if self._own:
+            self._f.close()
+
+
+class UnixSocketSink(Sink):
+    """NDJSON over a Unix domain stream socket; reconnects when the reader goes away."""
+
+    def __init__(self, path: str):
+        self.name = f"unix:{path}"
+        self._path = path
+        self._sock: Optional[socket.socket] = None
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(self._path)
+            self._sock = s
+        return self._sock
+
+    def emit(self, records: List[Record]) -> None:
+        # sendall blocks while the reader's buffer is full: a slow reader slows the sender.
+        # After a broken connection the batch is resent whole, so a reader may see a line twice.
+        try:
+            self._connect().sendall(_ndjson(records))
+        except OSError:
+            self._drop_socket()
+            raise
+
+    def _drop_socket(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def close(self, timeout: float = 30.0) -> None:
+        self._drop_socket()
+
+
+class HttpPostSink(Sink):
+    """POSTs each batch as an application/x-ndjson body; non-2xx answers raise so the batch is retried."""
+
+    flush_interval = 0.5
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.name = url
+        self._url = url
+        self._client = httpx.Client(timeout=timeout)
+
+    def emit(self, records: List[Record]) -> None:
+        resp = self._client.post(self._url, content=_ndjson(records), headers={'Content-Type': 'application/x-ndjson'})
+        if resp.status_code >= 300:
+            retry_after = resp.headers.get('Retry-After')
+            raise SinkBusy(resp.status_code, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    def close(self, timeout: float = 30.0) -> None:
+        self._client.close()
+
+
+class SinkBusy(Exception):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"sink answered {status}")
+        self.retry_after = retry_after
+
+
+class SinkGone(Exception):
+    """The sink can never accept records again; retrying is pointless."""
+
+
+class QueuedSink(Sink):
+    """Decouples site workers from a sink through a bounded queue and one delivery thread.
+
+    The thread sends up to `batch` records at a time, waiting at most `flush_interval`
+    seconds (default: the sink's own) for more once one is queued, and retries failed
+    deliveries with exponential backoff (or the sink's Retry-After). While it retries the
+    queue fills up. Then `overflow='block'`
+    stalls producers until there is room (backpressure into the crawl), and `overflow='drop'`
+    discards new records and counts them.
+    """
+
+    def __init__(self, inner: Sink, *, max_queue: int = 10000, batch: int = 200, flush_interval: float | None = None,
+                 overflow: str = 'block', metrics: Metrics | None = None, max_backoff: float = 30.0):
+        if overflow not in ('block', 'drop'):
+            raise ValueError(f"overflow must be 'block' or 'drop', not {overflow!r}")
+        self.inner = inner
+        self.name = inner.name
+        self._q: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._batch = batch
+        self._flush_interval = inner.flush_interval if flush_interval is None else flush_interval
+        self._overflow = overflow
+        self._metrics = metrics or NULL_METRICS
+        self._max_backoff = max_backoff
+        self._closing = threading.Event()
+        self._gone = False
+        self._deadline = float('inf')
+        self._lock = threading.Lock()
+        self._stats = {'emitted': 0, 'delivered': 0, 'dropped': 0, 'retries': 0, 'blocked_seconds': 0.0}
+        self._thread = threading.Thread(target=self._run, name=f"sink:{self.name}", daemon=True)
+        self._thread.start()
+
+    def emit(self, records: List[Record]) -> None:
+        for r in records:
+            try:
+                self._q.put_nowait(r)
+            except queue.Full:
+                if self._overflow == 'drop':
+                    with self._lock:
+                        self._stats['dropped'] += 1
+                    continue
+                t0 = time.perf_counter()
+                self._q.put(r)
+                with self._lock:
+                    self._stats['blocked_seconds'] += time.perf_counter() - t0
+        with self._lock:
+            self._stats['emitted'] += len(records)
+
+    def _take(self) -> List[Record]:
+        # Wait for a first record, then top the batch up for at most flush_interval
+        try:
+            out = [self._q.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        end = time.monotonic() + self._flush_interval
+        while len(out) < self._batch:
+            try:
+                out.append(self._q.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = end - time.monotonic()
+            if remaining <= 0 or self._closing.is_set():
+                break
+            try:
+                out.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return out
+
+    def _deliver(self, records: List[Record]) -> bool:
+        backoff = 0.5
+        while True:
+            t0 = time.perf_counter()
+            try:
+                self.inner.emit(records)
+                self._metrics.observe('sink.deliver', self.name, time.perf_counter() - t0)
+                return True
+            except SinkGone:
+                self._gone = True
+                return False
+            except Exception as e:
+                wait = e.retry_after if isinstance(e, SinkBusy) and e.retry_after else backoff
+                backoff = min(backoff * 2, self._max_backoff)
+                if time.monotonic() + wait > self._deadline:
+                    return False
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(wait)
+
+    def _run(self) -> None:
+        while True:
+            records = self._take()
+            if not records:
+                if self._closing.is_set() and self._q.empty():
+                    return
+                continue
+            ok = not self._gone and self._deliver(records)
+            with self._lock:
+                self._stats['delivered' if ok else 'dropped'] += len(records)
+
+    def close(self, timeout: float = 30.0) -> None:
+        # Stop retrying at the deadline; whatever is still queued then counts as dropped
+        self._deadline = time.monotonic() + timeout
+        self._closing.set()
+        self._thread.join(timeout + 1.0)
+        with self._lock:
+            self._stats['dropped'] += self._q.qsize()
+        self.inner.close(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        out['blocked_seconds'] = round(out['blocked_seconds'], 3)
+        return out
+
+
+class MultiSink(Sink):
+    def __init__(self, sinks: List[QueuedSink]):
+        self.sinks = sinks
+        self.name = ','.join(s.name for s in sinks)
+
+    def emit(self, records: List[Record]) -> None:
+        for s in self.sinks:
+            s.emit(records)
+
+    def close(self, timeout: float = 30.0) -> None:
+        for s in self.sinks:
+            s.close(timeout)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {s.name: s.stats() for s in self.sinks}
+
+
+def open_sink(spec: str) -> Sink:
+    """`stdout` (or `-`), `file:PATH`, `unix:PATH` or an http(s):// URL."""
+    if spec in ('stdout', '-'):
+        return NdjsonSink()
+    if spec.startswith('file:'):
+        return NdjsonSink(spec[len('file:'):])
+    if spec.startswith('unix:'):
+        return UnixSocketSink(spec[len('unix:'):])
+    if spec.startswith(('http://', 'https://')):
+        return HttpPostSink(spec)
+    raise ValueError(f"unknown sink {spec!r}; use stdout, file:PATH, unix:PATH or http(s)://URL")
+
+
+def make_sink(settings: Dict[str, Any] | None, metrics: Metrics | None = None) -> Optional[MultiSink]:
+    """Build the configured sinks; `settings` as assembled by the CLI (specs, queue, batch, flush, overflow)."""
+    if not settings or not settings.get('specs'):
+        return None
+    return MultiSink([
+        QueuedSink(
+            open_sink(spec),
+            max_queue=int(settings.get('queue', 10000)),
+            batch=int(settings.get('batch', 200)),
+            flush_interval=settings.get('flush'),
+            overflow=settings.get('overflow', 'block'),
+            metrics=metrics,
+        )
+        for spec in settings['specs']
+    ])
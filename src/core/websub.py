@@ -0,0 +1,129 @@
+"""WebSub (PubSubHubbub) subscriptions for feeds that advertise a hub.
+
+RSSAdapter notes `rel="hub"` / `rel="self"` links of the feeds it polls in the `websub`
+table. `SubscriptionManager.sync` asks each hub for a subscription, and renews leases
+before they run out. The hub then verifies the subscription against the callback server
+(src/websub.py) and pushes new feed content to it. While a feed has an active
+subscription, the runner's poll drops to a safety-net poll every `push_poll_seconds`
+(see RSSAdapter).
+
+Each feed gets its own callback URL, `<callback base>/<token>`, and an HMAC secret that
+the hub signs pushed content with (`X-Hub-Signature`).
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import re
+import secrets
+import sqlite3
+from html import unescape
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import httpx
+
+from src.core import db as dbm
+
+# Feed-level links sit before the first entry; no need to look further than this
+_HEAD_BYTES = 65536
+_ENTRY_RE = re.compile(rb'<(?:[\w.-]+:)?(?:item|entry)[\s>/]')
+_LINK_RE = re.compile(rb'<(?:[\w.-]+:)?link\b([^>]*)>', re.I)
+_ATTR_RE = re.compile(rb'([\w:.-]+)\s*=\s*(["\'])(.*?)\2', re.S)
+_SIGNATURE_ALGOS = {'sha1': hashlib.sha1, 'sha256': hashlib.sha256, 'sha384': hashlib.sha384, 'sha512': hashlib.sha512}
+
+
+def hub_links(body: bytes, links: Optional[Mapping[str, Mapping[str, str]]] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(hub, self) URLs a feed advertises, from its HTTP `Link` header (`links`, as in
+    httpx.Response.links) or from its feed-level <link> / <atom:link> elements."""
+    links = links or {}
+    hub = (links.get('hub') or {}).get('url')
+    topic = (links.get('self') or {}).get('url')
+    if hub and topic:
+        return hub, topic
+    head = body[:_HEAD_BYTES]
+    m = _ENTRY_RE.search(head)
+    if m:
+        head = head[:m.start()]
+    for tag in _LINK_RE.finditer(head):
+        attrs = {k.lower(): v for k, _, v in _ATTR_RE.findall(tag.group(1))}
+        href = attrs.get(b'href')
+        if not href:
+            continue
+        rels = attrs.get(b'rel', b'').lower().split()
+        if b'hub' in rels and not hub:
+            hub = unescape(href.decode('utf-8', 'replace')).strip()
+        if b'self' in rels and not topic:
+            topic = unescape(href.decode('utf-8', 'replace')).strip()
+    return hub, topic
+
+
+def sign(secret: str, body: bytes, algo: str = 'sha256') -> str:
+    """`X-Hub-Signature` value for `body`, as a hub computes it."""
+    return f"{algo}={hmac.new(secret.encode('utf-8'), body, _SIGNATURE_ALGOS[algo]).hexdigest()}"
+
+
+def signature_ok(secret: Optional[str], body: bytes, header: Optional[str]) -> bool:
+    """Whether a push is authentic. Without a secret every push is accepted; with one, the
+    `X-Hub-Signature` header must carry a matching HMAC of the body."""
+    if not secret:
+        return True
+    if not header or '=' not in header:
+        return False
+    algo, _, digest = header.partition('=')
+    fn = _SIGNATURE_ALGOS.get(algo.strip().lower())
+    if fn is None:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, fn).hexdigest()
+    return hmac.compare_digest(expected, digest.strip().lower())
+
+
+class SubscriptionManager:
+    """Requests and renews the subscriptions recorded in the `websub` table.
+
+    `callback_base` is the public URL of the callback server's `/websub` path. Hubs reach
+    it from outside, so behind a proxy it is the proxy's URL.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, client: httpx.Client, callback_base: str, *,
+                 lease_seconds: int = 86400 * 5, renew_before: int = 3600 * 6, retry_after: int = 3600,
+                 use_secret: bool = True, feeds: Optional[Mapping[str, str]] = None):
+        self.conn = conn
+        self.client = client
+        self.callback_base = callback_base.rstrip('/')
+        self.lease_seconds = lease_seconds
+        self.renew_before = renew_before
+        self.retry_after = retry_after
+        self.use_secret = use_secret
+        # feed URL -> site id of the configured RSS sites; other rows are left alone
+        self.feeds = feeds
+
+    def callback_url(self, token: str) -> str:
+        return f"{self.callback_base}/{token}"
+
+    def request(self, feed_url: str, topic: str, hub: str) -> bool:
+        """Send one subscription request; True if the hub accepted it for verification."""
+        token, secret = dbm.set_websub_pending(
+            self.conn, feed_url, secrets.token_urlsafe(18), secrets.token_hex(24) if self.use_secret else None
+        )
+        data = {'hub.mode': 'subscribe', 'hub.topic': topic, 'hub.callback': self.callback_url(token),
+                'hub.lease_seconds': str(self.lease_seconds)}
+        if secret:
+            data['hub.secret'] = secret
+        try:
+            resp = self.client.post(hub, data=data)
+        except httpx.HTTPError:
+            return False
+        # 202 per the spec; some hubs verify synchronously and answer 204
+        return resp.status_code in (202, 204)
+
+    def sync(self) -> Dict[str, List[str]]:
+        """Request every subscription that is new, about to expire or worth retrying.
+
+        Feeds no longer in the site list are not renewed; their leases run out.
+        """
+        out: Dict[str, List[str]] = {'requested': [], 'failed': []}
+        for feed_url, sid, topic, hub in dbm.websub_due(self.conn, self.renew_before, self.retry_after):
+            if self.feeds is not None and self.feeds.get(feed_url) != sid:
+                continue
+            out['requested' if self.request(feed_url, topic, hub) else 'failed'].append(feed_url)
+        return out
@@ -0,0 +1,275 @@
+"""Columnar export of the URL history for analytics.
+
+    python -m src.export --out data/export                     # incremental Parquet export of both tables
+    python -m src.export --out data/export --format arrow --tables url_by_source
+    python -m src.export --out data/export --full              # export everything again, replacing earlier files
+
+Rows whose `last_seen` changed since the previous export are appended as new files under
+`<out>/<table>/date=<YYYY-MM-DD of last_seen>/`, so the output is a Hive-partitioned
+dataset that pyarrow.dataset, DuckDB, Spark or pandas read directly. A row seen again
+later is exported again with its new `last_seen`; readers that want the current state
+keep the newest version per key. `--full` replaces a table's files instead of adding to
+them. Requires pyarrow.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.ipc as pa_ipc  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = None
+
+from src.core import db as dbm
+
+STATE_FILE = '_export_state.json'
+TABLES = ('url_by_source', 'urls')
+DEFAULT_BATCH_ROWS = 50000
+# A row stamped `last_seen = T` can commit as late as T + the lock wait + its transaction,
+# so an export only takes rows stamped at least this long ago; newer ones go next time
+DEFAULT_SETTLE_SECONDS = int(dbm.BUSY_TIMEOUT) * 4
+
+
+def _schemas() -> Dict[str, Any]:
+    ts = pa.timestamp('s', tz='UTC')
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    return {
+        'url_by_source': pa.schema([
+            ('site_id', dict_str),
+            ('url', pa.string()),
+            ('first_seen', ts),
+            ('last_seen', ts),
+            ('first_run', pa.int64()),
+            ('seq', pa.int64()),
+        ]),
+        'urls': pa.schema([
+            ('url', pa.string()),
+            ('canonical', pa.string()),
+            ('first_seen', ts),
+            ('last_seen', ts),
+            ('discovered_via', dict_str),
+            ('http_status', pa.int32()),
+            ('lastmod', pa.string()),
+            ('etag', pa.string()),
+            ('content_hash', pa.string()),
+        ]),
+    }
+
+
+class _DictEncoder:
+    """Dictionary encoding whose dictionary only grows, so every batch of one file shares
+    it (Arrow IPC files accept such growth as dictionary deltas)."""
+
+    def __init__(self):
+        self._index: Dict[Optional[str], int] = {}
+        self._values: List[str] = []
+
+    def encode(self, values: Sequence[Optional[str]]):
+        idx = self._index
+        out = []
+        for v in values:
+            if v is None:
+                out.append(None)
+                continue
+            i = idx.get(v)
+            if i is None:
+                i = idx[v] = len(self._values)
+                self._values.append(v)
+            out.append(i)
+        return pa.DictionaryArray.from_arrays(pa.array(out, pa.int32()), pa.array(self._values, pa.string()))
+
+
+class _PartitionWriter:
+    """One output file: a Parquet or Arrow IPC writer fed record batch by record batch."""
+
+    def __init__(self, path: str, schema, fmt: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self.encoders = {f.name: _DictEncoder() for f in schema if pa.types.is_dictionary(f.type)}
+        if fmt == 'parquet':
+            self._w = pq.ParquetWriter(path, schema, compression='zstd')
+            self._write = self._w.write_batch
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._w = pa_ipc.new_file(self._sink, schema, options=pa_ipc.IpcWriteOptions(compression='zstd', emit_dictionary_deltas=True))
+            self._write = self._w.write_batch
+
+    def write(self, batch) -> None:
+        self._write(batch)
+        self.rows += batch.num_rows
+
+    def close(self) -> None:
+        self._w.close()
+        if hasattr(self, '_sink'):
+            self._sink.close()
+
+
+# table -> (SELECT of the schema's columns, index of last_seen in a row)
+_QUERIES: Dict[str, Tuple[str, int]] = {
+    'url_by_source': ("SELECT source_id, url, first_seen, last_seen, first_run, seq FROM url_by_source", 3),
+    'urls': ("SELECT url, canonical, first_seen, last_seen, discovered_via, http_status, lastmod, etag, content_hash FROM urls", 3),
+}
+
+
+def _day_name(day: int) -> str:
+    return datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _to_batch(rows: List[tuple], schema, encoders: Dict[str, _DictEncoder]):
+    cols = list(zip(*rows))
+    arrays = []
+    for i, field in enumerate(schema):
+        if field.name in encoders:
+            arrays.append(encoders[field.name].encode(cols[i]))
+        else:
+            arrays.append(pa.array(cols[i], field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+
+def export_table(conn, table: str, out_dir: str, *, since: int, until: int, fmt: str = 'parquet',
+                 batch_rows: int = DEFAULT_BATCH_ROWS, stamp: str = '') -> Dict[str, Any]:
+    """Append rows with `since < last_seen <= until` to date partitions of `table`.
+
+    Rows come off the last_seen index in order, `batch_rows` at a time, and each batch
+    is written before the next is fetched, so memory stays bounded by one batch. Since
+    the order is by day, each partition's file is finished before the next one opens.
+    """
+    schema = _schemas()[table]
+    select, ts_col = _QUERIES[table]
+    cur = conn.execute(f"{select} WHERE last_seen > ? AND last_seen <= ? ORDER BY last_seen", (since, until))
+    ext = 'parquet' if fmt == 'parquet' else 'arrow'
+    writer: Optional[_PartitionWriter] = None
+    day = None
+    files: List[Dict[str, Any]] = []
+
+    def _close():
+        if writer is not None:
+            writer.close()
+            files.append({'path': os.path.relpath(writer.path, out_dir), 'rows': writer.rows})
+
+    try:
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            start = 0
+            # Split the batch where the day (and so the partition) changes
+            while start < len(rows):
+                d = rows[start][ts_col] // 86400
+                # Rows are sorted, so a batch that ends on the same day is one partition
+                end = len(rows) if rows[-1][ts_col] // 86400 == d else start + 1
+                while end < len(rows) and rows[end][ts_col] // 86400 == d:
+                    end += 1
+                if d != day:
+                    _close()
+                    day = d
+                    writer = _PartitionWriter(os.path.join(out_dir, table, f"date={_day_name(d)}", f"part-{stamp}.{ext}"), schema, fmt)
+                writer.write(_to_batch(rows[start:end], schema, writer.encoders))
+                start = end
+    finally:
+        _close()
+    return {'rows': sum(f['rows'] for f in files), 'files': files}
+
+
+def _load_state(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {'tables': {}, 'exports': []}
+
+
+def _save_state(out_dir: str, state: Dict[str, Any]) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, path)
+
+
+def _part_files(out_dir: str, table: str) -> List[str]:
+    return [os.path.join(d, f) for d, _, names in os.walk(os.path.join(out_dir, table)) for f in names if f.startswith('part-')]
+
+
+def _remove_files(paths: Sequence[str]) -> None:
+    for path in paths:
+        os.remove(path)
+        parent = os.path.dirname(path)
+        if not os.listdir(parent):
+            os.rmdir(parent)
+
+
+def run_export(conn, out_dir: str, *, tables: Sequence[str] = TABLES, fmt: str = 'parquet', batch_rows: int = DEFAULT_BATCH_ROWS,
+               full: bool = False, settle_seconds: int = DEFAULT_SETTLE_SECONDS, now: Optional[int] = None,
+               log: Callable[[str], None] = lambda _: None) -> Dict[str, Any]:
+    """Incremental export of `tables` into `out_dir`; returns a report of what was written.
+
+    The watermark per table (in `_export_state.json`) is the `last_seen` upper bound of the
+    previous export. The upper bound lags `now` by `settle_seconds`: a writer stamps a row
+    before its transaction commits, and may wait for the write lock up to the busy
+    timeout, so rows stamped just before `now` may not be visible yet. `full` exports every
+    row again and then deletes the table's files from earlier exports.
+    """
+    if pa is None:
+        raise RuntimeError('the columnar export needs pyarrow (pip install pyarrow)')
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"format must be 'parquet' or 'arrow', not {fmt!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    state = _load_state(out_dir)
+    now = int(time.time()) if now is None else now
+    until = now - max(1, int(settle_seconds))
+    stamp = datetime.fromtimestamp(now, tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    report: Dict[str, Any] = {'until': until, 'format': fmt, 'tables': {}}
+    for table in tables:
+        if table not in _QUERIES:
+            raise ValueError(f"unknown table {table!r}; choose from {', '.join(TABLES)}")
+        since = 0 if full else int(state['tables'].get(table, {}).get('watermark', 0))
+        # Replaced only once the new files are complete; until then readers see both
+        old = _part_files(out_dir, table) if full else []
+        t0 = time.perf_counter()
+        rep = export_table(conn, table, out_dir, since=since, until=until, fmt=fmt, batch_rows=batch_rows, stamp=stamp)
+        written = {os.path.join(out_dir, f['path']) for f in rep['files']}
+        _remove_files([p for p in old if p not in written])
+        rep.update(since=since, seconds=round(time.perf_counter() - t0, 3), removed=len(old))
+        report['tables'][table] = rep
+        # Advance the watermark only after this table's files are complete
+        state['tables'][table] = {'watermark': until, 'format': fmt}
+        state['exports'].append({'table': table, 'since': since, 'until': until, 'rows': rep['rows'], 'files': [f['path'] for f in rep['files']]})
+        _save_state(out_dir, state)
+        log(f"{table}: {rep['rows']} rows in {len(rep['files'])} files ({rep['seconds']}s)")
+    return report
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='Export URL history as partitioned Parquet / Arrow IPC files')
+    ap.add_argument('--db', default=os.path.join('data', 'urls.db'), help='SQLite database path')
+    ap.add_argument('--out', required=True, help='Dataset directory (holds the export watermark too)')
+    ap.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help='File format (Arrow IPC files are zstd-compressed)')
+    ap.add_argument('--tables', default=','.join(TABLES), help='Comma-separated subset of: ' + ', '.join(TABLES))
+    ap.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS, help='Rows per record batch / Parquet row group')
+    ap.add_argument('--full', action='store_true', help="Ignore the watermark, export every row again and replace the table's earlier files")
+    ap.add_argument('--settle-seconds', type=int, default=DEFAULT_SETTLE_SECONDS, help='Only export rows stamped at least this long ago (rows may commit after their stamp)')
+    args = ap.parse_args(argv)
+    if pa is None:
+        ap.error('pyarrow is not installed (pip install pyarrow)')
+    conn = dbm.open_readonly(args.db)
+    try:
+        run_export(conn, args.out, tables=[t for t in args.tables.split(',') if t], fmt=args.format,
+                   batch_rows=args.batch_rows, full=args.full, settle_seconds=args.settle_seconds, log=lambda m: print(m, file=sys.stderr))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
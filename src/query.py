@@ -0,0 +1,234 @@
+"""Incremental reads of discovered URLs for downstream consumers.
+
+Every (site, URL) pair gets a sequence number (`url_by_source.seq`) when it is first
+written. Consumers read "everything after cursor N" in keyset pages and store the last
+cursor they processed under their name, so each pair is handed out once per consumer,
+however many runs happened in between.
+
+    python -m src.query read --consumer indexer            # NDJSON on stdout, cursor acked per page
+    python -m src.query read --after 0 --site blog --limit 100
+    python -m src.query consumers
+    python -m src.query serve --port 8765                   # same reads over HTTP
+
+Each line is {cursor, site_id, url, first_seen, lastmod}.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+from src.core import db as dbm
+
+DEFAULT_LIMIT = 1000
+# Upper bound on one page, so a single request never holds a read snapshot for long
+MAX_LIMIT = 50000
+_CONSUMER_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def _line(row) -> bytes:
+    seq, site_id, url, first_seen, lastmod = row
+    return orjson.dumps({'cursor': seq, 'site_id': site_id, 'url': url, 'first_seen': first_seen, 'lastmod': lastmod}) + b'\n'
+
+
+def iter_pages(conn, after: int, *, sites: Optional[Sequence[str]] = None, limit: int = DEFAULT_LIMIT, max_rows: Optional[int] = None) -> Iterator[List[tuple]]:
+    """Consecutive keyset pages after `after` until caught up (or `max_rows` rows)."""
+    remaining = max_rows
+    while remaining is None or remaining > 0:
+        n = limit if remaining is None else min(limit, remaining)
+        page = list(dbm.query_after(conn, after, sites=sites, limit=n))
+        if not page:
+            return
+        yield page
+        after = page[-1][0]
+        if remaining is not None:
+            remaining -= len(page)
+        if len(page) < n:
+            return
+
+
+def _check_consumer(name: str) -> str:
+    if not _CONSUMER_RE.match(name):
+        raise ValueError(f"consumer names are 1-64 characters of [A-Za-z0-9_.-], got {name!r}")
+    return name
+
+
+def cmd_read(args) -> int:
+    wconn = dbm.ensure_db(args.db)
+    rconn = dbm.open_readonly(args.db)
+    consumer = _check_consumer(args.consumer) if args.consumer else None
+    after = args.after if args.after is not None else (dbm.get_consumer_cursor(wconn, consumer) if consumer else 0)
+    out = sys.stdout.buffer
+    n = 0
+    for page in iter_pages(rconn, after, sites=args.site, limit=min(args.limit, MAX_LIMIT), max_rows=args.max):
+        out.write(b''.join(_line(r) for r in page))
+        out.flush()
+        n += len(page)
+        # Ack only once the page has been handed on, so a crash re-delivers rather than loses
+        if consumer and not args.no_ack:
+            dbm.ack_consumer(wconn, consumer, page[-1][0])
+    print(f"read {n} rows after cursor {after}", file=sys.stderr)
+    return 0
+
+
+def cmd_ack(args) -> int:
+    conn = dbm.ensure_db(args.db)
+    stored = dbm.ack_consumer(conn, _check_consumer(args.consumer), args.cursor)
+    print(f"{args.consumer}: cursor={stored}")
+    return 0
+
+
+def cmd_reset(args) -> int:
+    conn = dbm.ensure_db(args.db)
+    dbm.reset_consumer(conn, _check_consumer(args.consumer), args.to)
+    print(f"{args.consumer}: cursor={args.to}")
+    return 0
+
+
+def cmd_consumers(args) -> int:
+    conn = dbm.ensure_db(args.db)
+    for name, cursor, updated_at, backlog in dbm.list_consumers(conn):
+        ts = datetime.fromtimestamp(updated_at, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        print(f"{name}\tcursor={cursor}\tbacklog={backlog}\tupdated={ts}")
+    return 0
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Read-only HTTP view of the cursor API. Each request reads through its own connection;
+    cursor acks share one writer connection."""
+
+    daemon_threads = True
+
+    def __init__(self, addr, db_path: str):
+        super().__init__(addr, QueryHandler)
+        self.db_path = db_path
+        self.wconn = dbm.ensure_db(db_path)
+        self.wlock = threading.Lock()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server: QueryServer
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, fmt, *args) -> None:
+        return None
+
+    def _json(self, status: int, obj: Dict) -> None:
+        body = orjson.dumps(obj)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        parts = urlsplit(self.path)
+        return [p for p in parts.path.split('/') if p], parse_qs(parts.query)
+
+    def _stream(self, after: int, q: Dict[str, List[str]]) -> None:
+        limit = min(int(q.get('limit', [DEFAULT_LIMIT])[0]), MAX_LIMIT)
+        rconn = dbm.open_readonly(self.server.db_path)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('X-Cursor-After', str(after))
+            self.end_headers()
+            # Rows go out as SQLite produces them; the last line's cursor is the next `after`
+            for row in dbm.query_after(rconn, after, sites=q.get('site'), limit=limit):
+                self.wfile.write(_line(row))
+        finally:
+            rconn.close()
+
+    def do_GET(self) -> None:
+        try:
+            path, q = self._params()
+            if path == ['urls']:
+                return self._stream(int(q.get('after', ['0'])[0]), q)
+            if path == ['consumers']:
+                with self.server.wlock:
+                    rows = dbm.list_consumers(self.server.wconn)
+                return self._json(200, {'consumers': [
+                    {'name': n, 'cursor': c, 'updated_at': u, 'backlog': b} for n, c, u, b in rows
+                ]})
+            if len(path) == 3 and path[0] == 'consumers' and path[2] == 'urls':
+                name = _check_consumer(path[1])
+                with self.server.wlock:
+                    after = dbm.get_consumer_cursor(self.server.wconn, name)
+                return self._stream(after, q)
+            self._json(404, {'error': 'not found'})
+        except ValueError as e:
+            self._json(400, {'error': str(e)})
+
+    def do_POST(self) -> None:
+        try:
+            path, q = self._params()
+            if len(path) == 3 and path[0] == 'consumers' and path[2] == 'ack':
+                name = _check_consumer(path[1])
+                with self.server.wlock:
+                    stored = dbm.ack_consumer(self.server.wconn, name, int(q['cursor'][0]))
+                return self._json(200, {'consumer': name, 'cursor': stored})
+            self._json(404, {'error': 'not found'})
+        except (KeyError, ValueError) as e:
+            self._json(400, {'error': str(e)})
+
+
+def cmd_serve(args) -> int:
+    srv = QueryServer((args.host, args.port), args.db)
+    print(f"serving {args.db} on http://{args.host}:{srv.server_address[1]}", file=sys.stderr)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='LinkHarvest incremental query API')
+    ap.add_argument('--db', default=os.path.join('data', 'urls.db'), help='SQLite database path')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    rd = sub.add_parser('read', help='Write (site, URL) pairs after a cursor as NDJSON to stdout')
+    rd.add_argument('--consumer', default=None, help='Start at this consumer\'s stored cursor and advance it after every page')
+    rd.add_argument('--after', type=int, default=None, help='Start after this cursor instead (default: the consumer\'s, else 0)')
+    rd.add_argument('--site', action='append', default=None, help='Only these site ids (repeatable)')
+    rd.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'Rows per page (at most {MAX_LIMIT})')
+    rd.add_argument('--max', type=int, default=None, help='Stop after this many rows')
+    rd.add_argument('--no-ack', action='store_true', help='Do not advance the consumer\'s cursor')
+    rd.set_defaults(fn=cmd_read)
+
+    ak = sub.add_parser('ack', help='Advance a consumer\'s cursor (never moves it back)')
+    ak.add_argument('--consumer', required=True)
+    ak.add_argument('cursor', type=int)
+    ak.set_defaults(fn=cmd_ack)
+
+    rs = sub.add_parser('reset', help='Set a consumer\'s cursor, e.g. to replay')
+    rs.add_argument('--consumer', required=True)
+    rs.add_argument('--to', type=int, default=0)
+    rs.set_defaults(fn=cmd_reset)
+
+    sub.add_parser('consumers', help='List consumers with their cursor and backlog').set_defaults(fn=cmd_consumers)
+
+    sv = sub.add_parser('serve', help='Serve the same reads over HTTP')
+    sv.add_argument('--host', default='127.0.0.1')
+    sv.add_argument('--port', type=int, default=8765)
+    sv.set_defaults(fn=cmd_serve)
+
+    args = ap.parse_args(argv)
+    try:
+        return args.fn(args)
+    except ValueError as e:
+        ap.error(str(e))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
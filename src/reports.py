@@ -12,27 +12,51 @@ def _iso(ts: int) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
+NEW_CSV_HEADER = ['site_id', 'url', 'first_seen_iso', 'lastmod']
+
+
+def _new_ndjson_line(site_id: str, url: str, first_seen: int, lastmod: Optional[str]) -> bytes:
+    return orjson.dumps({
+        'site_id': site_id,
+        'url': url,
+        'first_seen': first_seen,
+        'lastmod': lastmod,
+    }) + b"\n"
+
+
+def _new_csv_row(site_id: str, url: str, first_seen: int, lastmod: Optional[str]) -> list:
+    return [site_id, url, _iso(first_seen), lastmod or '']
+
+
 def write_new_ndjson(path: str, rows: Iterable[Tuple[str, str, int, Optional[str]]]) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, 'wb') as f:
-        for site_id, url, first_seen, lastmod in rows:
-            obj = {
-                'site_id': site_id,
-                'url': url,
-                'first_seen': first_seen,
-                'lastmod': lastmod,
-            }
-            f.write(orjson.dumps(obj))
-            f.write(b"\n")
+        for row in rows:
+            f.write(_new_ndjson_line(*row))
 
 
 def write_new_csv(path: str, rows: Iterable[Tuple[str, str, int, Optional[str]]]) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, 'w', newline='') as f:
         w = csv.writer(f)
-        w.writerow(['site_id', 'url', 'first_seen_iso', 'lastmod'])
-        for site_id, url, first_seen, lastmod in rows:
-            w.writerow([site_id, url, _iso(first_seen), lastmod or ''])
+        w.writerow(NEW_CSV_HEADER)
+        for row in rows:
+            w.writerow(_new_csv_row(*row))
+
+
+def write_new_artifacts(ndjson_path: str, csv_path: str, rows: Iterable[Tuple[str, str, int, Optional[str]]]) -> int:
+    # Single pass over a (possibly streaming) cursor: each row goes to both files
+    os.makedirs(os.path.dirname(ndjson_path), exist_ok=True)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    n = 0
+    with open(ndjson_path, 'wb') as fj, open(csv_path, 'w', newline='') as fc:
+        w = csv.writer(fc)
+        w.writerow(NEW_CSV_HEADER)
+        for row in rows:
+            fj.write(_new_ndjson_line(*row))
+            w.writerow(_new_csv_row(*row))
+            n += 1
+    return n
 
 
 def write_counts_csv(path: str, counts: Iterable[Tuple[str, int, int, int]]) -> None:
@@ -53,3 +77,13 @@ def write_latest_all_csv(path: str, rows: Iterable[Tuple[str, str, int, Optional
         w.writerow(['site_id', 'url', 'last_seen_iso', 'lastmod'])
         for site_id, url, last_seen, lastmod in rows:
             w.writerow([site_id, url, _iso(last_seen), lastmod or ''])
+
+
+def write_site_times_csv(path: str, rows: Iterable[Tuple[str, Optional[float], Optional[float], str]]) -> None:
+    # rows: (site_id, expected_seconds, actual_seconds, budget_stop)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['site_id', 'expected_seconds', 'actual_seconds', 'budget_stop'])
+        for site_id, expected, actual, stop in rows:
+            w.writerow([site_id, '' if expected is None else expected, '' if actual is None else actual, stop])
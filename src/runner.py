@@ -6,23 +6,33 @@ import os
 import sys
 import time
 from datetime import datetime, timezone
-from typing import Dict, List, Tuple
-from tqdm import tqdm
+import queue
+import socket
+import threading
+import zlib
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import urlsplit
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import yaml
+import orjson
 
 from src.core.http import HttpClient
 from src.core.robots import RobotsCache
-from src.core.scheduler import RateLimiter
+from src.core.scheduler import RateLimiter, RetryQueue
 from src.core.normalize import normalize_url, resolve_canonical_once
 from src.core import db as dbm
-from src.core.models import SiteConfig, Discovered
-from src.adapters.wordpress import WordPressAdapter
-from src.adapters.rss import RSSAdapter
-from src.adapters.sitemap import SitemapAdapter
-from src.adapters.crawl import CrawlerAdapter
-from src.adapters.jscrawl import JsCrawlAdapter
+from src.core import retention
+from src.core.archive import make_transport
+from src.core.leases import LeaseManager
+from src.core.metrics import Metrics, host_of
+from src.core.profiling import NULL_TRACE, Profiler, shared_stage
+from src.core.sinks import make_sink
+from src.core.hostrules import HostRules
+from src.core.budget import BudgetExceeded, BudgetedHttp, SiteBudget
+from src.core.breaker import DeferredTracker, HostBreakers, merge_reports, summarize
+from src.core.models import SiteConfig, DiscoveredBatch
+from src.adapters import adapter_kind, get_adapter_class
 from src import reports
 
 
@@ -30,9 +40,15 @@ def _utcnow_iso() -> str:
     return datetime.now(tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')
 
 
-def _load_sites(path: str) -> List[SiteConfig]:
+def _read_config(path: str) -> Dict:
+    import yaml
     with open(path, 'r') as f:
-        data = yaml.safe_load(f)
+        return yaml.safe_load(f) or {}
+
+
+def _load_sites(path: str, data: Dict | None = None) -> List[SiteConfig]:
+    if data is None:
+        data = _read_config(path)
     sites = []
     for s in data.get('sites', []):
         sites.append(SiteConfig(id=s['id'], kind=s['kind'], cfg=s))
@@ -40,155 +56,602 @@ def _load_sites(path: str) -> List[SiteConfig]:
 
 
 def _select_adapter(site: SiteConfig, ctx: Dict):
-    if site.kind == 'wordpress':
-        return WordPressAdapter(site.id, site.cfg, ctx)
-    if site.kind == 'rss':
-        return RSSAdapter(site.id, site.cfg, ctx)
-    if site.kind == 'sitemap':
-        return SitemapAdapter(site.id, site.cfg, ctx)
-    if site.kind == 'crawl':
-        if site.cfg.get('js_render'):
-            return JsCrawlAdapter(site.id, site.cfg, ctx)
-        return CrawlerAdapter(site.id, site.cfg, ctx)
-    raise ValueError(f"Unknown site kind: {site.kind}")
-
-
-def run_once(*, sites_path: str, out_dir: str, since_seconds: int | None, concurrency: int = 1) -> int:
-    os.makedirs(out_dir, exist_ok=True)
-    run_id = _utcnow_iso()
-    run_dir = os.path.join(out_dir, run_id)
-    os.makedirs(run_dir, exist_ok=True)
-    log_path = os.path.join(run_dir, 'run.log')
+    # Adapter modules are imported on first use (see src.adapters)
+    return get_adapter_class(adapter_kind(site.kind, site.cfg))(site.id, site.cfg, ctx)
 
-    db_path = os.path.join('data', 'urls.db')
-    conn = dbm.ensure_db(db_path)
 
-    http = HttpClient()
-    robots = RobotsCache(http.client)
-    rl = RateLimiter()
+def _new_counters() -> Dict:
+    return {
+        'fetched': 0,
+        'parsed': 0,
+        'discovered': 0,
+        'inserted': 0,
+        'skipped_robots': 0,
+        'skipped_unchanged': 0,
+        'skipped_watermark': 0,
+        'skipped_push': 0,
+        'canonical_fetched': 0,
+        'canonical_local': 0,
+        'canonical_pending': 0,
+        'errors': 0,
+        'deferred': 0,
+        'status': {},
+    }
 
-    sites = _load_sites(sites_path)
 
-    run_start = int(time.time())
-    # Upsert sources
-    for s in sites:
-        base = s.cfg.get('base')
-        dbm.upsert_source(conn, s.id, s.kind, base, json.dumps(s.cfg))
-    conn.commit()
+def _make_env(db_path: str, run_seq: int, *, progress: bool = True, metrics: Metrics | None = None, profiler: Profiler | None = None, archive: Dict | None = None, sink: Dict | None = None, rules: Dict | None = None, budget: Dict | None = None, breakers: Dict | None = None, retry: Dict | None = None, db: dbm.ConnectionManager | None = None, storage: Dict | None = None) -> Dict:
+    # Shared, thread-safe per-process state handed to every site worker. `db` is the
+    # caller's connection manager; without one the env opens its own from `storage`.
+    db = db if db is not None else dbm.ConnectionManager(db_path, storage)
+    metrics = metrics if metrics is not None else Metrics()
+    transport = make_transport(**archive) if archive else None
+    host_breakers = HostBreakers.from_settings(breakers, metrics)
+    # With retry passes, failed requests are retried by a later pass instead of in place
+    defer = bool(retry and int(retry.get('passes', 0)) > 0)
+    http = HttpClient(metrics=metrics, transport=transport, breakers=host_breakers, defer_retries=defer)
+    host_rules = HostRules.from_settings(rules)
+    if host_rules is not None:
+        with db.reader() as rconn:
+            host_rules.load(rconn)
+    return {
+        'db_path': db_path,
+        'db': db,
+        'run_seq': run_seq,
+        'http': http,
+        'robots': RobotsCache(http.client, metrics=metrics, breakers=host_breakers),
+        'ratelimiter': RateLimiter(metrics=metrics),
+        'metrics': metrics,
+        'profiler': profiler,
+        'progress': progress,
+        'sink': make_sink(sink, metrics),
+        'rules': host_rules,
+        'budget': budget,
+        'breakers': host_breakers,
+        'retry': retry if defer else None,
+    }
 
-    # Logging and counters per site
-    summary: List[Tuple[str, int, int, int]] = []  # site_id, new_count, total_seen, errors
-
-    def _process_site(s: SiteConfig, position: int) -> Tuple[str, Dict]:
-        # Per-site DB connection to avoid sharing sqlite across threads
-        sconn = dbm.ensure_db(db_path)
-        counters: Dict = {
-            'fetched': 0,
-            'parsed': 0,
-            'discovered': 0,
-            'inserted': 0,
-            'skipped_robots': 0,
-            'errors': 0,
-            'status': {},
-        }
-        ctx = {
-            'http': http,
-            'robots': robots,
-            'ratelimiter': rl,
-            'db': sconn,
-            'counters': counters,
-        }
-        adapter = _select_adapter(s, ctx)
-        site_bar = tqdm(desc=f"{s.id}", position=position, leave=False)
-        try:
-            for d in adapter.discover():
-                site_bar.update(1)
-                naive_norm = normalize_url(d.url)
-                final_url, canon_tag = naive_norm, None
+
+def _close_env(env: Dict) -> Dict:
+    # Flushes the sinks (bounded by their close timeout); returns their delivery stats and
+    # the breaker report, both mergeable across processes
+    env['http'].client.close()
+    sink = env.get('sink')
+    if sink is not None:
+        sink.close()
+    breakers = env.get('breakers')
+    return {
+        'sinks': sink.stats() if sink is not None else {},
+        'breakers': breakers.report() if breakers is not None else {},
+    }
+
+
+def _process_batch(s: SiteConfig, batch: DiscoveredBatch, sconn, env: Dict, counters: Dict | None = None, http=None, rconn=None, from_pending: bool = False) -> int:
+    """Normalize, membership-check, canonicalize and write one batch; returns new (site, url) pairs.
+
+    `http` is the site's budgeted client. Once its budget is spent, items that still need
+    a canonical lookup are parked in `pending_canonical` instead of being written under
+    their naive URLs; the site's next run resolves them first (`from_pending` marks such
+    a batch). The membership check runs on `rconn`, a read-only connection, when one is given.
+    """
+    http = http if http is not None else env['http']
+    metrics = env['metrics']
+    profiler = env.get('profiler')
+    rules = env.get('rules')
+    counters = counters if counters is not None else _new_counters()
+    urls = batch.urls
+    if not urls:
+        return 0
+    traces = [profiler.url(s.id, u) for u in urls] if profiler is not None else [NULL_TRACE] * len(urls)
+    norms = []
+    for u, trace in zip(urls, traces):
+        with trace.stage('normalize'):
+            norms.append(normalize_url(u))
+    # A batch comes from one response, so its first URL stands for the host
+    host = host_of(norms[0])
+
+    t0 = time.perf_counter()
+    with shared_stage(traces, 'membership'):
+        known = dbm.known_urls(rconn if rconn is not None else sconn, norms)
+    metrics.observe('db.lookup', host, time.perf_counter() - t0)
+
+    site_ua = s.cfg.get('user_agent') if isinstance(s.cfg, dict) else None
+    site_headers = s.cfg.get('headers') if isinstance(s.cfg, dict) else None
+    canonicals = batch.canonicals or [None] * len(urls)
+    resolved: Dict[str, Tuple[str, str | None]] = {}
+    rows = []
+    pending = []
+    out_of_budget = False
+    for i, naive_norm in enumerate(norms):
+        final_url, canon_tag = naive_norm, None
+        if naive_norm in resolved:
+            final_url, canon_tag = resolved[naive_norm]
+        elif naive_norm not in known:
+            # A confirmed host rule answers locally; a sampled few are still fetched as spot checks
+            local, spot_check = rules.rewrite(naive_norm) if rules is not None else (None, False)
+            if local is not None and not spot_check:
+                final_url = normalize_url(local)
+                counters['canonical_local'] += 1
+            if (local is None or spot_check) and not out_of_budget:
+                detail: Dict = {}
                 try:
-                    if not dbm.has_url(sconn, naive_norm):
-                        site_ua = s.cfg.get('user_agent') if isinstance(s.cfg, dict) else None
-                        site_headers = s.cfg.get('headers') if isinstance(s.cfg, dict) else None
-                        resolved, canon = resolve_canonical_once(
-                            d.url,
+                    with metrics.time('canonical', host_of(naive_norm)), traces[i].stage('canonical'):
+                        res, canon = resolve_canonical_once(
+                            urls[i],
                             http,
-                            robots=robots,
-                            ratelimiter=rl,
+                            robots=env['robots'],
+                            ratelimiter=env['ratelimiter'],
                             rps=float(s.cfg.get('rate_limit_rps', 1.0)),
                             ua=site_ua,
                             extra_headers=site_headers,
+                            detail=detail,
                         )
-                        candidate = canon or resolved
-                        canon_tag = canon
-                        final_url = normalize_url(candidate)
+                    canon_tag = canon
+                    final_url = normalize_url(canon or res)
+                except BudgetExceeded as e:
+                    out_of_budget = True
+                    counters['budget'] = e.kind
                 except Exception:
                     final_url = naive_norm
+                if 'status' in detail:
+                    counters['canonical_fetched'] += 1
+                    # Only real answers teach rules; errors fall back to the input URL
+                    if rules is not None and detail['status'] < 400:
+                        rules.observe(naive_norm, final_url, spot_check=spot_check)
+            if out_of_budget and (local is None or spot_check):
+                if local is None:
+                    pending.append((urls[i], canonicals[i], batch.source, batch.lastmods[i]))
+                    continue
+                # A spot check the budget has no room for: the confirmed rule answers
+                final_url = normalize_url(local)
+                counters['canonical_local'] += 1
+            resolved[naive_norm] = (final_url, canon_tag)
+        # Later items see earlier ones as known, as if written one at a time
+        known.add(final_url)
+        rows.append((final_url, canon_tag or canonicals[i], batch.source, batch.lastmods[i]))
+
+    # One short transaction per batch keeps locks brief and amortizes the commit
+    t0 = time.perf_counter()
+    with shared_stage(traces, 'db_write'), dbm.transaction(sconn):
+        # BEGIN IMMEDIATE returns once the write lock is ours. Rows are stamped after that,
+        # so a stamp is never older than the lock wait (see src/export.py)
+        metrics.observe('db.lock_wait', host, time.perf_counter() - t0)
+        now = int(time.time())
+        new = dbm.write_discoveries(sconn, s.id, rows, env['run_seq'], now=now)
+        if from_pending:
+            dbm.drop_pending_canonical(sconn, s.id, urls)
+        if pending:
+            dbm.queue_pending_canonical(sconn, s.id, pending, now)
+            counters['canonical_pending'] += len(pending)
+        if batch.keys is not None:
+            # Watermarks commit with the entries they cover (written or parked), never ahead of them
+            dbm.write_watermarks(sconn, s.id, list(zip(batch.keys, batch.lastmods)), now)
+        if rules is not None:
+            rules.flush(sconn)
+    metrics.observe('db.write', host, time.perf_counter() - t0)
+    for trace in traces:
+        trace.done()
+    sink = env.get('sink')
+    if sink is not None and new:
+        # Only after the commit: a consumer never sees a URL the database could still roll back
+        lastmods: Dict[str, str | None] = {}
+        for url, _, _, lastmod in rows:
+            if lastmods.get(url) is None:
+                lastmods[url] = lastmod
+        sink.emit([{'site_id': s.id, 'url': u, 'first_seen': now, 'lastmod': lastmods.get(u)} for u in new])
+    return len(new)
+
+
+def _process_site(s: SiteConfig, position: int, env: Dict) -> Tuple[str, Dict]:
+    http = env['http']
+    robots = env['robots']
+    rl = env['ratelimiter']
+    metrics = env['metrics']
+    # Connections are lent to one site at a time, never shared between threads
+    db = env['db']
+    sconn = db.acquire(dbm.WRITER)
+    rconn = db.acquire(dbm.READER)
+    counters = _new_counters()
+    budget = SiteBudget.for_site(s.cfg, env.get('budget'))
+    http = BudgetedHttp(http, budget)
+    ctx = {
+        # Canonical lookups use `http` directly: a failed one falls back to the naive URL
+        # and is no reason to run the site again
+        'http': DeferredTracker(http, counters, in_place=env.get('final_pass', False)),
+        'robots': robots,
+        'ratelimiter': rl,
+        'db': sconn,
+        'counters': counters,
+        'metrics': metrics,
+        'retry_pass': env.get('retry_pass', False),
+    }
+    adapter = _select_adapter(s, ctx)
+    from tqdm import tqdm
+    site_bar = tqdm(desc=f"{s.id}", position=position, leave=False, disable=not env['progress'])
+    profiler = env.get('profiler')
+    site_ctx = profiler.site(s.id) if profiler is not None else nullcontext()
+    # Set in coordinated runs once another node has taken over this host's lease
+    lease_lost = env.get('lease_lost')
+    try:
+        with site_ctx:
+            # Items an earlier run parked when its budget ran out go first
+            for batch in _pending_batches(sconn, s.id):
+                counters['inserted'] += _process_batch(s, batch, sconn, env, counters, http, rconn, from_pending=True)
+            batches = adapter.discover_batches() if lease_lost is None or not lease_lost.is_set() else iter(())
+            for batch in batches:
+                if lease_lost is not None and lease_lost.is_set():
+                    # The new owner crawls the host from here; this batch is left to it
+                    break
+                site_bar.update(len(batch))
+                # Budgets stop a site at its next request, never inside a batch: a sitemap
+                # child whose ETag is stored has all of its chunks written
+                counters['inserted'] += _process_batch(s, batch, sconn, env, counters, http, rconn)
+            if lease_lost is not None and lease_lost.is_set():
+                counters['stopped'] = 'lease_lost'
+    except BudgetExceeded as e:
+        # Not an error: every batch before this point is committed, the rest waits for the next run
+        counters['budget'] = e.kind
+    except Exception as e:
+        counters['errors'] += 1
+        counters['last_error'] = str(e)
+    finally:
+        counters['seconds'] = round(budget.elapsed(), 3)
+        counters['requests'] = budget.used
+        site_bar.close()
+        db.release(sconn, dbm.WRITER)
+        db.release(rconn, dbm.READER)
+    return s.id, counters
+
+
+def _pending_batches(conn, sid: str, size: int = 500) -> Iterator[DiscoveredBatch]:
+    groups: Dict[str, List[Tuple]] = {}
+    for row in dbm.get_pending_canonical(conn, sid):
+        groups.setdefault(row[2], []).append(row)
+    for source, rows in groups.items():
+        for i in range(0, len(rows), size):
+            chunk = rows[i:i + size]
+            canonicals = [r[1] for r in chunk]
+            yield DiscoveredBatch(source, [r[0] for r in chunk], [r[3] for r in chunk],
+                                  canonicals if any(canonicals) else None)
+
+
+def _failed_counters(e: BaseException) -> Dict:
+    counters = _new_counters()
+    counters['errors'] = 1
+    counters['last_error'] = str(e)
+    return counters
+
+
+def _iter_site_results(sites: List[SiteConfig], env: Dict, concurrency: int, first_position: int = 1) -> Iterator[Tuple[SiteConfig, Dict]]:
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as ex:
+        futures = {ex.submit(_process_site, s, first_position + i, env): s for i, s in enumerate(sites)}
+        for fut in as_completed(futures):
+            s = futures[fut]
+            try:
+                _, counters = fut.result()
+            except Exception as e:
+                counters = _failed_counters(e)
+            yield s, counters
 
-                # Group upsert + touch in a short transaction to keep locks brief
-                with sconn:
-                    dbm.upsert_url(
-                        sconn,
-                        final_url,
-                        canonical=canon_tag or d.canonical,
-                        discovered_via=d.source,
-                        http_status=None,
-                        lastmod=d.lastmod,
-                        etag=None,
-                    )
-                    is_new_pair, _ = dbm.touch_url_by_source(sconn, s.id, final_url)
-                if is_new_pair:
-                    counters['inserted'] += 1
-        except Exception as e:
-            counters['errors'] += 1
-            counters['last_error'] = str(e)
+
+# Counters that add up across a site's first pass and its retry passes
+_SUMMED = ('fetched', 'parsed', 'discovered', 'inserted', 'skipped_robots', 'skipped_unchanged', 'skipped_watermark', 'skipped_push',
+           'canonical_fetched', 'canonical_local', 'canonical_pending', 'seconds', 'requests')
+
+
+def _merge_retry(first: Dict, again: Dict) -> Dict:
+    out = dict(again)
+    for k in _SUMMED:
+        if k in first or k in again:
+            out[k] = first.get(k, 0) + again.get(k, 0)
+    status = dict(first.get('status', {}))
+    for code, n in again.get('status', {}).items():
+        status[code] = status.get(code, 0) + n
+    out['status'] = status
+    # Deferred requests were counted as errors by the adapter; the retry pass decides them
+    out['errors'] = max(0, first.get('errors', 0) - first.get('deferred', 0)) + again.get('errors', 0)
+    out['retried'] = first.get('retried', 0) + first.get('deferred', 0)
+    return out
+
+
+def _iter_with_retries(sites: List[SiteConfig], env: Dict, concurrency: int, first_position: int = 1) -> Iterator[Tuple[SiteConfig, Dict]]:
+    """`_iter_site_results`, then retry passes over the sites that deferred requests.
+
+    A site whose pass deferred requests (a retryable failure, or its host's breaker open)
+    is held back and run again once its retries are due, up to `retry['passes']` times.
+    The wait happens here, between passes, not in a site worker. The last pass retries
+    in place, so a request still gets its full `max_retries` attempts.
+    """
+    retry = env.get('retry')
+    if not retry:
+        yield from _iter_site_results(sites, env, concurrency, first_position)
+        return
+    passes = int(retry.get('passes', 1))
+    pending = RetryQueue()
+    todo: List[SiteConfig] = sites
+    held: Dict[str, Dict] = {}
+    for attempt in range(passes + 1):
+        pass_env = env if attempt == 0 else {**env, 'retry_pass': True, 'final_pass': attempt == passes}
+        for s, counters in _iter_site_results(todo, pass_env, concurrency, first_position):
+            if s.id in held:
+                counters = _merge_retry(held.pop(s.id), counters)
+            retry_at = counters.pop('retry_at', None)
+            if retry_at is not None and attempt < passes and not counters.get('budget') and not counters.get('stopped'):
+                pending.push((s, counters), retry_at)
+            else:
+                yield s, counters
+        if not pending:
+            return
+        time.sleep(pending.wait_time(float(retry.get('max_wait', 10.0))))
+        drained = pending.drain()
+        todo = [s for s, _ in drained]
+        held = {s.id: c for s, c in drained}
+
+
+def _iter_leased_results(sites: List[SiteConfig], env: Dict, concurrency: int, leases: LeaseManager) -> Iterator[Tuple[SiteConfig, Dict]]:
+    # Each worker thread claims a whole host group, so no two nodes hit one host at once.
+    # A group's retry passes run while its lease is held (the heartbeat keeps it alive
+    # through the wait), so deferred requests are retried before the group is completed.
+    # If the heartbeat finds the lease taken over, the group stops at its next batch and
+    # its remaining sites are left to the new owner.
+    groups: Dict[str, List[SiteConfig]] = {}
+    for s in sites:
+        groups.setdefault(_site_host(s), []).append(s)
+    leases.seed(groups)
+    results: queue.Queue = queue.Queue()
+    done = object()
+    # Progress bar rows: each group gets its own block
+    next_position = [1]
+    pos_lock = threading.Lock()
+
+    def _worker():
+        try:
+            while True:
+                key = leases.claim()
+                if key is None:
+                    return
+                group = groups.get(key, [])
+                with pos_lock:
+                    first, next_position[0] = next_position[0], next_position[0] + len(group)
+                lost = leases.lost(key)
+                for s, counters in _iter_with_retries(group, {**env, 'lease_lost': lost}, 1, first):
+                    # A site that never got to send a request belongs to the new owner
+                    if not (counters.get('stopped') == 'lease_lost' and not counters.get('requests')):
+                        results.put((s, counters))
+                if not lost.is_set():
+                    leases.complete(key)
         finally:
-            site_bar.close()
-            sconn.close()
-        return s.id, counters
+            results.put(done)
+
+    n = max(1, int(concurrency))
+    workers = [threading.Thread(target=_worker, daemon=True) for _ in range(n)]
+    leases.start_heartbeat()
+    try:
+        for t in workers:
+            t.start()
+        finished = 0
+        while finished < n:
+            item = results.get()
+            if item is done:
+                finished += 1
+                continue
+            yield item
+    finally:
+        leases.stop_heartbeat()
+
+
+def _site_host(site: SiteConfig) -> str:
+    for key in ('base', 'feed', 'sitemap'):
+        url = site.cfg.get(key)
+        if url:
+            return urlsplit(url).netloc.lower()
+    return site.id
+
+
+def _shard_sites(sites: List[SiteConfig], n: int) -> List[List[SiteConfig]]:
+    # Stable host hash: every site of a host lands in the same process, so that
+    # process's RateLimiter still sees all requests to the host.
+    shards: List[List[SiteConfig]] = [[] for _ in range(n)]
+    for s in sites:
+        shards[zlib.crc32(_site_host(s).encode('utf-8')) % n].append(s)
+    return [sh for sh in shards if sh]
+
+
+def _run_shard(sites: List[SiteConfig], db_path: str, run_seq: int, concurrency: int, profile: Dict | None = None, archive: Dict | None = None, sink: Dict | None = None, rules: Dict | None = None, budget: Dict | None = None, breakers: Dict | None = None, retry: Dict | None = None, storage: Dict | None = None) -> Tuple[List[Tuple[str, Dict]], Dict, Dict | None, Dict]:
+    # Worker process entry point; writes go straight to the shared WAL database and each
+    # process streams to its own sink connections. Metrics, profiling results, sink stats
+    # and the breaker report travel back as snapshots merged into the parent's.
+    profiler = Profiler.from_settings(profile)
+    env = _make_env(db_path, run_seq, progress=False, profiler=profiler, archive=archive, sink=sink, rules=rules, budget=budget, breakers=breakers, retry=retry, storage=storage)
+    try:
+        results = [(s.id, counters) for s, counters in _iter_with_retries(sites, env, concurrency)]
+    finally:
+        env_stats = _close_env(env)
+        env['db'].close()
+    return results, env['metrics'].snapshot(), profiler.snapshot() if profiler is not None else None, env_stats
+
+
+def _merge_env_stats(total: Dict[str, Dict], stats: Dict | None) -> None:
+    for name, st in (stats or {}).get('sinks', {}).items():
+        acc = total['sinks'].setdefault(name, {})
+        for k, v in st.items():
+            acc[k] = acc.get(k, 0) + v
+    merge_reports(total['breakers'], (stats or {}).get('breakers'))
+
+
+def _longest_first(sites: List[SiteConfig], expected: Dict[str, float]) -> List[SiteConfig]:
+    # LPT: starting the longest sites first keeps one long site from running alone at the
+    # end. Sites without history go first, since they may well be the long ones.
+    return sorted(sites, key=lambda s: expected.get(s.id, float('inf')), reverse=True)
+
+
+def _default_round(round_seconds: int) -> str:
+    # Nodes started by the same cron tick agree on the round without talking to each other
+    bucket = int(time.time()) // max(1, int(round_seconds)) * max(1, int(round_seconds))
+    return datetime.fromtimestamp(bucket, tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def run_once(*, sites_path: str, out_dir: str, since_seconds: int | None, concurrency: int = 1, retention_mode: str = 'auto', processes: int = 1, db_path: str | None = None, coordinate: Dict | None = None, metrics_prom: str | None = None, profile: Dict | None = None, archive: Dict | None = None, sink: Dict | None = None, host_rules: Dict | None = None, budget: Dict | None = None, breakers: Dict | None = None, retry: Dict | None = None, storage: Dict | None = None) -> int:
+    os.makedirs(out_dir, exist_ok=True)
+    run_id = _utcnow_iso()
+    run_dir = os.path.join(out_dir, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    log_path = os.path.join(run_dir, 'run.log')
+
+    db_path = db_path or os.path.join('data', 'urls.db')
+    # Checks the schema once; the run's own bookkeeping keeps one writer for its duration
+    db = dbm.ConnectionManager(db_path, storage)
+    conn = db.acquire(dbm.WRITER)
 
+    config = _read_config(sites_path)
+    expected = dbm.get_site_durations(conn)
+    sites = _longest_first(_load_sites(sites_path, config), expected)
+    metrics = Metrics()
+    # stdout belongs to the stream when a sink writes there; messages go to stderr instead
+    out = sys.stderr if sink and any(spec in ('stdout', '-') for spec in sink.get('specs', [])) else sys.stdout
+    if profile is not None:
+        profile = {**profile, 'out_dir': run_dir}
+    profiler = Profiler.from_settings(profile)
+
+    run_seq = dbm.start_run(conn, run_id)
+    # Upsert sources
+    for s in sites:
+        base = s.cfg.get('base')
+        dbm.upsert_source(conn, s.id, s.kind, base, json.dumps(s.cfg))
+        if coordinate is None:
+            dbm.register_run_source(conn, run_seq, s.id)
+    conn.commit()
+
+    from tqdm import tqdm
+    site_times: List[Tuple[str, float | None, float | None, str]] = []
     with open(log_path, 'w') as logf:
         overall = tqdm(total=len(sites), desc='sites', position=0)
-        with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as ex:
-            futures = {ex.submit(_process_site, s, i + 1): s for i, s in enumerate(sites)}
-            for fut in as_completed(futures):
-                s = futures[fut]
-                try:
-                    sid, counters = fut.result()
-                except Exception as e:
-                    sid = s.id
-                    counters = {'errors': 1, 'fetched': 0, 'parsed': 0, 'discovered': 0, 'inserted': 0, 'skipped_robots': 0, 'status': {}, 'last_error': str(e)}
-                overall.update(1)
-                logf.write(f"[{sid}] start kind={s.kind}\n")
-                logf.write(f"[{sid}] metrics: {json.dumps(counters)}\n")
+
+        def _record(s: SiteConfig, counters: Dict) -> None:
+            # Coordinated runs only report the sites this node actually processed
+            dbm.register_run_source(conn, run_seq, s.id)
+            dbm.add_site_errors(conn, run_seq, s.id, int(counters.get('errors', 0)))
+            overall.update(1)
+            logf.write(f"[{s.id}] start kind={s.kind}\n")
+            logf.write(f"[{s.id}] metrics: {json.dumps(counters)}\n")
+            actual = counters.get('seconds')
+            if actual is not None:
+                dbm.record_site_duration(conn, s.id, actual)
+            exp = expected.get(s.id)
+            site_times.append((s.id, None if exp is None else round(exp, 3), actual, counters.get('budget', '')))
+            logf.write(f"[{s.id}] time: expected={'-' if exp is None else f'{exp:.1f}s'} actual={'-' if actual is None else f'{actual:.1f}s'}"
+                       f"{' stopped=' + counters['budget'] if counters.get('budget') else ''}\n")
+
+        shards = _shard_sites(sites, int(processes)) if int(processes) > 1 else []
+        env_stats: Dict[str, Dict] = {'sinks': {}, 'breakers': {}}
+        if coordinate is not None:
+            lconn = dbm.ensure_db(coordinate.get('db') or db_path)
+            leases = LeaseManager(
+                lconn,
+                coordinate.get('round') or _default_round(coordinate.get('round_seconds', 3600)),
+                coordinate.get('node_id') or f"{socket.gethostname()}-{os.getpid()}",
+                ttl=float(coordinate.get('lease_ttl', 120)),
+            )
+            env = _make_env(db_path, run_seq, metrics=metrics, profiler=profiler, archive=archive, sink=sink, rules=host_rules, budget=budget, breakers=breakers, retry=retry, db=db)
+            try:
+                for s, counters in _iter_leased_results(sites, env, concurrency, leases):
+                    _record(s, counters)
+            finally:
+                lconn.close()
+                _merge_env_stats(env_stats, _close_env(env))
+        elif len(shards) > 1:
+            by_id = {s.id: s for s in sites}
+            # spawn: worker processes must not inherit the parent's threads or sockets
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            mp = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=len(shards), mp_context=mp) as px:
+                futures = {px.submit(_run_shard, shard, db_path, run_seq, concurrency, profile, archive, sink, host_rules, budget, breakers, retry, storage): shard for shard in shards}
+                for fut in as_completed(futures):
+                    try:
+                        results, snap, psnap, estats = fut.result()
+                        metrics.merge(snap)
+                        if profiler is not None and psnap is not None:
+                            profiler.merge(psnap)
+                        _merge_env_stats(env_stats, estats)
+                    except Exception as e:
+                        results = [(s.id, _failed_counters(e)) for s in futures[fut]]
+                    for sid, counters in results:
+                        _record(by_id[sid], counters)
+        else:
+            env = _make_env(db_path, run_seq, metrics=metrics, profiler=profiler, archive=archive, sink=sink, rules=host_rules, budget=budget, breakers=breakers, retry=retry, db=db)
+            try:
+                for s, counters in _iter_with_retries(sites, env, concurrency):
+                    _record(s, counters)
+            finally:
+                _merge_env_stats(env_stats, _close_env(env))
         overall.close()
+        for name, st in env_stats['sinks'].items():
+            logf.write(f"[sink] {name}: {json.dumps(st)}\n")
+        for line in summarize(env_stats['breakers']):
+            logf.write(f"[breaker] {line}\n")
+        learned = HostRules.from_settings(host_rules)
+        if learned is not None:
+            confirmed = learned.load(conn).report()
+            logf.write(f"[rules] confirmed={len(confirmed)} top: {json.dumps(confirmed[:20])}\n")
 
-    # After all sites processed, compute per-site counts summary
-    for s in sites:
-        new_count, total_seen = dbm.counts_for_site(conn, s.id)
-        # errors are already written in per-site metrics; for summary CSV, we don't aggregate errors here
-        summary.append((s.id, new_count, total_seen, 0))
+    # Reports read through a read-only connection, never the writer
+    rconn = db.acquire(dbm.READER)
+    # Per-site counts come from counters maintained during the run, in one query
+    summary = list(dbm.site_counts_for_run(rconn, run_seq))
 
-    run_end = int(time.time())
-    # Select new this run, or since flag override
+    dbm.finish_run(conn, run_seq)
+    # Select new this run (rows stamped with our run id), or since flag override
     if since_seconds is not None:
-        window_start = int(time.time()) - since_seconds
         window_end = int(time.time())
+        new_rows = dbm.query_new_urls(rconn, start_ts=window_end - since_seconds, end_ts=window_end)
     else:
-        window_start = run_start
-        window_end = run_end
-
-    new_rows = list(dbm.query_new_urls(conn, start_ts=window_start, end_ts=window_end))
-    # Artifacts
-    reports.write_new_ndjson(os.path.join(run_dir, 'new.ndjson'), new_rows)
-    reports.write_new_csv(os.path.join(run_dir, 'new.csv'), new_rows)
+        new_rows = dbm.query_new_urls_for_run(rconn, run_seq)
+    # Artifacts (streamed from the cursor into both writers)
+    reports.write_new_artifacts(os.path.join(run_dir, 'new.ndjson'), os.path.join(run_dir, 'new.csv'), new_rows)
     reports.write_counts_csv(os.path.join(run_dir, 'per_site_counts.csv'), summary)
+    reports.write_site_times_csv(os.path.join(run_dir, 'site_times.csv'), site_times)
+    metrics.write_json(os.path.join(run_dir, 'metrics.json'))
+    if metrics_prom:
+        metrics.write_prometheus(metrics_prom)
+    if profiler is not None:
+        profiler.write()
     if since_seconds is not None:
-        latest_rows = list(dbm.query_latest_all(conn, since_ts=int(time.time()) - since_seconds))
+        latest_rows = list(dbm.query_latest_all(rconn, since_ts=int(time.time()) - since_seconds))
         reports.write_latest_all_csv(os.path.join(run_dir, 'latest_all.csv'), latest_rows)
+    db.release(rconn, dbm.READER)
+
+    # Retention runs after the artifacts are written so it never races the export
+    retention_cfg = config.get('retention')
+    if retention_cfg and retention_mode != 'off':
+        if retention_mode == 'force' or retention.is_due(conn, retention_cfg):
+            rep = retention.run_retention(conn, retention_cfg)
+            with open(os.path.join(run_dir, 'retention.json'), 'wb') as f:
+                f.write(orjson.dumps(rep, option=orjson.OPT_INDENT_2))
+            removed = sum(p['rows'] for p in rep['policies'])
+            print(f"Retention: removed={removed} rows, reclaimed={rep['bytes_reclaimed']} bytes", file=out)
 
     # Print compact summary
     total_new = sum(n for _, n, _, _ in summary)
-    print(f"Run {run_id}: new={total_new}, sites={len(sites)}, out={run_dir}")
+    print(f"Run {run_id}: new={total_new}, sites={len(summary)}, out={run_dir}", file=out)
+    slowest = sorted((t for t in site_times if t[2] is not None), key=lambda t: -t[2])[:5]
+    if slowest:
+        print("Slowest: " + ", ".join(
+            f"{sid} {actual:.1f}s (expected {'-' if exp is None else f'{exp:.1f}s'}{', ' + stop + ' budget' if stop else ''})"
+            for sid, exp, actual, stop in slowest
+        ), file=out)
+    stopped = [t[0] for t in site_times if t[3]]
+    if stopped:
+        print(f"Budget stops: {len(stopped)} sites ({', '.join(stopped[:10])}{', ...' if len(stopped) > 10 else ''})", file=out)
+    tripped = env_stats['breakers']
+    if tripped:
+        rejected = sum(r['rejected'] for r in tripped.values())
+        avoided = sum(r['avoided_seconds'] for r in tripped.values())
+        still_open = sum(1 for r in tripped.values() if r['state'] != 'closed')
+        print(f"Breakers: opened on {len(tripped)} hosts ({still_open} still open), rejected={rejected} requests, avoided~{avoided:.1f}s", file=out)
+    for name, st in env_stats['sinks'].items():
+        print(f"Sink {name}: delivered={st['delivered']}, dropped={st['dropped']}, retries={st['retries']}, blocked={st['blocked_seconds']}s", file=out)
+    db.release(conn, dbm.WRITER)
+    db.close()
     return 0
 
 
@@ -198,9 +661,76 @@ def main(argv: List[str] | None = None) -> int:
     ap.add_argument('--out', default=os.path.join('data', 'runs'), help='Output directory')
     ap.add_argument('--since', type=int, default=None, help='SECONDS window for new items (overrides run window)')
     ap.add_argument('--concurrency', type=int, default=1, help='Number of sites to process in parallel')
+    ap.add_argument('--processes', type=int, default=1, help='Worker processes; sites are sharded across them by host hash')
+    ap.add_argument('--db', default=os.path.join('data', 'urls.db'), help='SQLite database path (shared store for coordinated runs)')
+    ap.add_argument('--coordinate', action='store_true', help='Claim host groups through the lease table so several nodes can share one site list')
+    ap.add_argument('--node-id', default=None, help='Lease owner name (default: hostname-pid)')
+    ap.add_argument('--round', default=None, help='Coordination round key shared by all nodes (default: start of the current --round-seconds bucket)')
+    ap.add_argument('--round-seconds', type=int, default=3600, help='Bucket size for the default round key')
+    ap.add_argument('--lease-ttl', type=float, default=120.0, help='Seconds before an unrenewed lease can be taken over')
+    ap.add_argument('--coord-db', default=None, help='Database holding the lease table (default: --db)')
+    ap.add_argument('--metrics-prom', default=None, help='Also write metrics as a Prometheus textfile to this path')
+    ap.add_argument('--profile', action='store_true', help='Collect per-site cProfile stats, a sampled URL trace (trace.json) and slowest.json in the run directory')
+    ap.add_argument('--profile-sites', type=float, default=1.0, help='Fraction of sites run under cProfile when --profile is set')
+    ap.add_argument('--profile-urls', type=float, default=0.01, help='Fraction of discovered URLs traced span by span when --profile is set')
+    ap.add_argument('--profile-top', type=int, default=20, help='Number of slowest sites and URLs to report')
+    ap.add_argument('--record', default=None, metavar='PATH', help='Append every HTTP request/response of this run to an archive')
+    ap.add_argument('--replay', default=None, metavar='PATH', help='Serve HTTP from an archive instead of the network')
+    ap.add_argument('--replay-speed', choices=['fast', 'original'], default='fast', help='Replay at full speed or with the recorded response times')
+    ap.add_argument('--sink', action='append', default=[], metavar='SPEC', help='Stream new URLs as NDJSON as they are committed: stdout, file:PATH, unix:PATH or an http(s) URL (repeatable)')
+    ap.add_argument('--sink-queue', type=int, default=10000, help='Records buffered per sink before --sink-overflow applies')
+    ap.add_argument('--sink-batch', type=int, default=200, help='Maximum records per sink write / POST')
+    ap.add_argument('--sink-flush', type=float, default=None, help='Seconds a sink may wait to fill a batch (default 0; 0.5 for HTTP)')
+    ap.add_argument('--sink-overflow', choices=['block', 'drop'], default='block', help='When a sink falls behind: slow discovery down (block) or drop records and count them (drop)')
+    ap.add_argument('--host-rules', choices=['apply', 'learn', 'off'], default='apply', help='Learn per-host canonical rewrite rules and use confirmed ones instead of fetching (apply), only learn (learn), or neither (off)')
+    ap.add_argument('--rule-min-hits', type=int, default=20, help='Observations before a host rule is trusted')
+    ap.add_argument('--rule-spot-check', type=float, default=0.05, help='Fraction of rule-resolved URLs still fetched to catch drift')
+    ap.add_argument('--site-time-budget', type=float, default=None, metavar='SECONDS', help='Stop a site after this much wall-clock time, keeping what it found (site key time_budget_seconds overrides)')
+    ap.add_argument('--site-request-budget', type=int, default=None, metavar='N', help='Stop a site after N HTTP requests, keeping what it found (site key request_budget overrides)')
+    ap.add_argument('--breaker-failures', type=int, default=5, metavar='N', help='Consecutive failures that open a host\'s circuit breaker (0 disables breakers)')
+    ap.add_argument('--breaker-cooldown', type=float, default=30.0, metavar='SECONDS', help='Seconds an open breaker waits before letting one probe request through')
+    ap.add_argument('--retry-passes', type=int, default=1, metavar='N', help='Retry passes over sites with failed requests, instead of retrying in place (0: retry in place with backoff)')
+    ap.add_argument('--retry-max-wait', type=float, default=10.0, metavar='SECONDS', help='Longest wait for deferred retries to become due before a retry pass')
+    ap.add_argument('--db-profile', choices=sorted(dbm.STORAGE_PROFILES), default='default', help='SQLite storage profile: page cache, memory-mapped I/O and temp store settings for every connection (fast and large use more memory per connection)')
+    ap.add_argument('--db-pragma', action='append', default=[], metavar='NAME=VALUE', help='Override one PRAGMA of --db-profile, e.g. mmap_size=1073741824 (repeatable)')
+    ap.add_argument('--retention', choices=['auto', 'force', 'off'], default='auto', help='Run the retention pass when due (auto), now (force) or never (off)')
     args = ap.parse_args(argv)
+    if args.record and args.replay:
+        ap.error('--record and --replay are mutually exclusive')
+    if args.coordinate and args.processes > 1:
+        ap.error('--coordinate runs one process per node; start more nodes instead of --processes')
+    pragmas = dict(p.split('=', 1) for p in args.db_pragma if '=' in p)
+    if len(pragmas) != len(args.db_pragma):
+        ap.error('--db-pragma takes NAME=VALUE')
 
-    return run_once(sites_path=args.sites, out_dir=args.out, since_seconds=args.since, concurrency=args.concurrency)
+    coordinate = None
+    if args.coordinate:
+        coordinate = {
+            'db': args.coord_db,
+            'round': args.round,
+            'round_seconds': args.round_seconds,
+            'node_id': args.node_id,
+            'lease_ttl': args.lease_ttl,
+        }
+    return run_once(
+        sites_path=args.sites,
+        out_dir=args.out,
+        since_seconds=args.since,
+        concurrency=args.concurrency,
+        retention_mode=args.retention,
+        processes=args.processes,
+        db_path=args.db,
+        coordinate=coordinate,
+        metrics_prom=args.metrics_prom,
+        archive={'record': args.record, 'replay': args.replay, 'speed': args.replay_speed} if (args.record or args.replay) else None,
+        profile={'site_sample': args.profile_sites, 'url_sample': args.profile_urls, 'top_n': args.profile_top} if args.profile else None,
+        breakers={'failures': args.breaker_failures, 'cooldown': args.breaker_cooldown},
+        retry={'passes': args.retry_passes, 'max_wait': args.retry_max_wait},
+        storage={'profile': args.db_profile, 'pragmas': pragmas},
+        budget={'seconds': args.site_time_budget, 'requests': args.site_request_budget},
+        host_rules={'mode': args.host_rules, 'min_hits': args.rule_min_hits, 'spot_check': args.rule_spot_check},
+        sink={'specs': args.sink, 'queue': args.sink_queue, 'batch': args.sink_batch, 'flush': args.sink_flush, 'overflow': args.sink_overflow} if args.sink else None,
+    )
 
 
 if __name__ == '__main__':
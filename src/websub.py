@@ -0,0 +1,256 @@
+"""WebSub push ingestion: the callback server that hubs deliver feed updates to.
+
+    python -m src.websub serve --sites config/sites.yaml --callback-url https://crawler.example.org/websub
+    python -m src.websub status
+
+`serve` answers hub verifications and pushes on `/websub/<token>`, and every
+--sync-seconds requests new or expiring subscriptions (src/core/websub.py). Which feeds
+have a hub is learned by the runner's RSS polls. A pushed feed is parsed like a polled
+one (RSSAdapter, including lastmod watermarks) and written through the runner's batch
+pipeline: normalization, membership check, canonical resolution, sinks. Its new URLs
+are stamped with the server's own run (`websub-<start time>` in `runs`).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from src import runner
+from src.adapters.rss import RSSAdapter
+from src.core import db as dbm
+from src.core.models import SiteConfig
+from src.core.websub import SubscriptionManager, signature_ok
+
+DEFAULT_LEASE = 86400 * 5
+# Larger pushes are refused; a hub sends the changed entries, not an archive
+MAX_PUSH_BYTES = 10 << 20
+
+
+class PushIngestor:
+    """Writes pushed feed content through the runner's pipeline on one worker thread, so
+    the callback can acknowledge a push before canonical lookups run."""
+
+    def __init__(self, env: Dict, sites: Dict[str, SiteConfig]):
+        self.env = env
+        # feed URL -> site
+        self.sites = sites
+        self.stats = {'pushes': 0, 'inserted': 0, 'errors': 0}
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='websub-ingest', daemon=True)
+        self._thread.start()
+
+    def submit(self, feed_url: str, body: bytes) -> None:
+        self._queue.put((feed_url, body))
+
+    def join(self) -> None:
+        """Block until every submitted push has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self.ingest(*item)
+            finally:
+                self._queue.task_done()
+
+    def ingest(self, feed_url: str, body: bytes) -> Dict:
+        """Parse and write one push; returns the site's counters for it."""
+        counters = runner._new_counters()
+        site = self.sites.get(feed_url)
+        if site is None:
+            return counters
+        db = self.env['db']
+        try:
+            with db.writer() as sconn, db.reader() as rconn:
+                ctx = {'db': sconn, 'counters': counters, 'metrics': self.env['metrics']}
+                adapter = RSSAdapter(site.id, site.cfg, ctx)
+                for batch in adapter.entry_batches(list(RSSAdapter.parse_feed(body))):
+                    counters['inserted'] += runner._process_batch(site, batch, sconn, self.env, counters, None, rconn)
+        except Exception as e:
+            counters['errors'] += 1
+            counters['last_error'] = str(e)
+        self.stats['pushes'] += 1
+        self.stats['inserted'] += counters['inserted']
+        self.stats['errors'] += counters['errors']
+        return counters
+
+
+class WebSubServer(ThreadingHTTPServer):
+    """Callback endpoint for every subscription: `/websub/<token>`."""
+
+    daemon_threads = True
+
+    def __init__(self, addr, db: dbm.ConnectionManager, ingestor: PushIngestor, *, default_lease: int = DEFAULT_LEASE):
+        super().__init__(addr, WebSubHandler)
+        self.db = db
+        self.ingestor = ingestor
+        self.default_lease = default_lease
+        self.rejected = 0
+
+
+class WebSubHandler(BaseHTTPRequestHandler):
+    server: WebSubServer
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, fmt, *args) -> None:
+        return None
+
+    def _reply(self, status: int, body: bytes = b'') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _subscription(self) -> Tuple[Optional[str], Optional[tuple], Dict[str, List[str]]]:
+        parts = urlsplit(self.path)
+        path = [p for p in parts.path.split('/') if p]
+        if len(path) != 2 or path[0] != 'websub':
+            return None, None, {}
+        with self.server.db.reader() as rconn:
+            row = dbm.get_websub_by_token(rconn, path[1])
+        return path[1], row, parse_qs(parts.query)
+
+    def do_GET(self) -> None:
+        # Intent verification: echo the challenge only for a subscription we asked for
+        token, row, q = self._subscription()
+        mode = q.get('hub.mode', [''])[0]
+        topic = q.get('hub.topic', [''])[0]
+        if row is None or topic != row[2]:
+            return self._reply(404)
+        if mode == 'subscribe' and row[5] in ('pending', 'active'):
+            try:
+                lease = int(q.get('hub.lease_seconds', [self.server.default_lease])[0])
+            except ValueError:
+                lease = self.server.default_lease
+            with self.server.db.writer() as conn:
+                dbm.set_websub_state(conn, token, 'active', int(time.time()) + lease)
+            return self._reply(200, q.get('hub.challenge', [''])[0].encode('utf-8'))
+        if mode == 'denied':
+            with self.server.db.writer() as conn:
+                dbm.set_websub_state(conn, token, 'denied')
+            return self._reply(200)
+        self._reply(404)
+
+    def do_POST(self) -> None:
+        token, row, _ = self._subscription()
+        if row is None or row[5] != 'active':
+            # Gone: the hub should stop delivering to this callback
+            return self._reply(410)
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            return self._reply(400)
+        if length > MAX_PUSH_BYTES:
+            return self._reply(413)
+        body = self.rfile.read(length)
+        # A push that fails the signature check is acknowledged like any other (so a forger
+        # learns nothing) and dropped
+        if not signature_ok(row[4], body, self.headers.get('X-Hub-Signature')):
+            self.server.rejected += 1
+            return self._reply(202)
+        with self.server.db.writer() as conn:
+            dbm.record_websub_push(conn, token)
+        self.server.ingestor.submit(row[0], body)
+        self._reply(202)
+
+
+def rss_sites(sites: List[SiteConfig]) -> Dict[str, SiteConfig]:
+    """feed URL -> site for the RSS sites that may use WebSub."""
+    return {s.cfg['feed']: s for s in sites if s.kind == 'rss' and s.cfg.get('feed') and s.cfg.get('websub', True)}
+
+
+def cmd_serve(args) -> int:
+    feeds = rss_sites(runner._load_sites(args.sites))
+    db = dbm.ConnectionManager(args.db, {'profile': args.db_profile})
+    conn = db.acquire(dbm.WRITER)
+    run_seq = dbm.start_run(conn, f"websub-{datetime.now(tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+    sink = {'specs': args.sink} if args.sink else None
+    env = runner._make_env(args.db, run_seq, progress=False, db=db, sink=sink,
+                           rules={'mode': args.host_rules}, breakers={'failures': 5})
+    ingestor = PushIngestor(env, feeds)
+    srv = WebSubServer((args.host, args.port), db, ingestor, default_lease=args.lease_seconds)
+    callback = args.callback_url or f"http://{args.host}:{srv.server_address[1]}/websub"
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    print(f"websub callback {callback} for {len(feeds)} feeds, writing to {args.db}", file=sys.stderr)
+    client = httpx.Client(timeout=httpx.Timeout(10.0))
+    manager = SubscriptionManager(conn, client, callback, lease_seconds=args.lease_seconds,
+                                  feeds={url: s.id for url, s in feeds.items()})
+    try:
+        while True:
+            res = manager.sync()
+            if res['requested'] or res['failed']:
+                print(f"subscriptions: requested={len(res['requested'])} failed={len(res['failed'])}; "
+                      f"pushes={ingestor.stats['pushes']} new={ingestor.stats['inserted']}", file=sys.stderr)
+            time.sleep(args.sync_seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        ingestor.close()
+        client.close()
+        runner._close_env(env)
+        dbm.finish_run(conn, run_seq)
+        db.release(conn, dbm.WRITER)
+        db.close()
+    return 0
+
+
+def cmd_status(args) -> int:
+    conn = dbm.open_readonly(args.db)
+    try:
+        rows = dbm.list_websub(conn)
+    finally:
+        conn.close()
+
+    def ts(v: Optional[int]) -> str:
+        return datetime.fromtimestamp(v, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ') if v else '-'
+
+    for feed_url, sid, hub, state, lease_expires, polled_at, last_push_at, pushes in rows:
+        print(f"{sid}\t{feed_url}\tstate={state}\thub={hub}\tlease_expires={ts(lease_expires)}\tpolled={ts(polled_at)}\tlast_push={ts(last_push_at)}\tpushes={pushes}")
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description='LinkHarvest WebSub push ingestion')
+    ap.add_argument('--db', default=os.path.join('data', 'urls.db'), help='SQLite database path')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    sv = sub.add_parser('serve', help='Run the callback server and keep subscriptions current')
+    sv.add_argument('--sites', required=True, help='YAML config path; its RSS sites may be subscribed')
+    sv.add_argument('--host', default='127.0.0.1')
+    sv.add_argument('--port', type=int, default=8766)
+    sv.add_argument('--callback-url', default=None, help='Public URL of /websub as hubs reach it (default: http://HOST:PORT/websub)')
+    sv.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE, help='Subscription lease to ask hubs for')
+    sv.add_argument('--sync-seconds', type=float, default=300.0, help='How often to request new and expiring subscriptions')
+    sv.add_argument('--host-rules', choices=['apply', 'learn', 'off'], default='apply', help='Canonical host rules for pushed URLs, as in the runner')
+    sv.add_argument('--sink', action='append', default=[], metavar='SPEC', help='Stream new URLs from pushes as NDJSON, as in the runner (repeatable)')
+    sv.add_argument('--db-profile', choices=sorted(dbm.STORAGE_PROFILES), default='default', help='SQLite storage profile')
+    sv.set_defaults(fn=cmd_serve)
+
+    sub.add_parser('status', help='List feeds with a hub and their subscription state').set_defaults(fn=cmd_status)
+
+    args = ap.parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
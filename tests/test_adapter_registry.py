@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import src.adapters as registry
+from src.adapters import adapter_kind, available_kinds, get_adapter_class, register_adapter
+from src.adapters.rss import RSSAdapter
+
+
+class TestAdapterRegistry(unittest.TestCase):
+    def setUp(self):
+        # Registrations made by a test stay local to it
+        for patcher in (mock.patch.dict(registry._registered), mock.patch.dict(registry._loaded)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_builtin_and_registered_kinds(self):
+        self.assertIs(get_adapter_class('rss'), RSSAdapter)
+        self.assertEqual(adapter_kind('crawl', {'js_render': True}), 'jscrawl')
+        self.assertEqual(adapter_kind('crawl', {}), 'crawl')
+        register_adapter('rss-alias', 'src.adapters.rss:RSSAdapter')
+        self.assertIs(get_adapter_class('rss-alias'), RSSAdapter)
+        self.assertIn('rss-alias', available_kinds())
+        with self.assertRaises(ValueError):
+            get_adapter_class('no-such-kind')
+
+    def test_registration_does_not_leak(self):
+        self.assertNotIn('rss-alias', available_kinds())
+
+    def test_runner_import_is_lazy(self):
+        code = ("import sys, src.runner; "
+                "print(','.join(m for m in ('playwright', 'feedparser', 'yaml', 'src.adapters.jscrawl') if m in sys.modules))")
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(out, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from src.core.archive import ArchiveReader, ArchiveWriter, RecordingTransport, ReplayTransport
+from src.core.http import HttpClient
+
+
+def _origin(request: httpx.Request) -> httpx.Response:
+    if request.headers.get('If-None-Match') == '"v1"':
+        return httpx.Response(304, headers={'ETag': '"v1"'})
+    body = gzip.compress(b'<rss><channel></channel></rss>')
+    return httpx.Response(200, headers={'ETag': '"v1"', 'Content-Encoding': 'gzip', 'Content-Type': 'application/rss+xml'}, content=body)
+
+
+class TestArchive(unittest.TestCase):
+    def test_record_then_replay(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'run.lha')
+            rec = HttpClient(transport=RecordingTransport(ArchiveWriter(path), inner=httpx.MockTransport(_origin)))
+            first = rec.get('https://x.example/feed')
+            second = rec.get('https://x.example/feed', etag='"v1"')
+            rec.client.close()
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(second.status_code, 304)
+
+            reader = ArchiveReader(path)
+            self.assertEqual(len(reader.records), 2)
+            rep = HttpClient(transport=ReplayTransport(reader))
+            # Same request as recorded: same answer, body decoded exactly once
+            r = rep.get('https://x.example/feed')
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.text, '<rss><channel></channel></rss>')
+            self.assertEqual(rep.get('https://x.example/feed', etag='"v1"').status_code, 304)
+            # Unknown validator: fall back to a full (non-304) answer for the URL
+            self.assertEqual(rep.get('https://x.example/feed', etag='"other"').status_code, 200)
+            with self.assertRaises(httpx.ConnectError):
+                rep.get('https://x.example/missing', max_retries=1)
+            rep.client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+
+from src import runner
+from src.core import db as dbm
+from src.core.breaker import CircuitOpen, HostBreakers, RetryDeferred
+from src.core.http import HttpClient
+from src.core.leases import LeaseManager
+from src.core.models import SiteConfig
+from src.core.robots import RobotsCache
+
+
+class TestHostBreakers(unittest.TestCase):
+    def test_open_half_open_close(self):
+        b = HostBreakers(failure_threshold=2, cooldown=0.05)
+        b.failure('x', 1.5)
+        b.before('x', 'https://x/a')
+        b.failure('x', 2.5)
+        with self.assertRaises(CircuitOpen):
+            b.before('x', 'https://x/a')
+        time.sleep(0.06)
+        b.before('x', 'https://x/probe')
+        # Only one probe while half-open
+        with self.assertRaises(CircuitOpen):
+            b.before('x', 'https://x/b')
+        b.failure('x', 2.0)
+        self.assertEqual(b.state('x'), 'open')
+        time.sleep(0.06)
+        # The failed probe doubled the cooldown
+        with self.assertRaises(CircuitOpen):
+            b.before('x', 'https://x/c')
+        time.sleep(0.05)
+        b.before('x', 'https://x/probe')
+        b.success('x')
+        b.before('x', 'https://x/d')
+        self.assertEqual(b.report(), {'x': {'state': 'closed', 'opens': 2, 'rejected': 3, 'avoided_seconds': 5.46}})
+
+    def test_client_and_robots_fail_fast_on_open_host(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            raise httpx.ConnectError('down', request=request)
+
+        b = HostBreakers(failure_threshold=2, cooldown=60)
+        http = HttpClient(transport=httpx.MockTransport(handler), breakers=b, defer_retries=True)
+        robots = RobotsCache(http.client, breakers=b)
+        self.assertTrue(robots.allowed('https://x.com/a'))
+        with self.assertRaises(RetryDeferred):
+            http.get('https://x.com/a')
+        self.assertEqual(calls, ['/robots.txt', '/a'])
+        with self.assertRaises(CircuitOpen):
+            http.get('https://x.com/b')
+        self.assertTrue(robots.allowed('https://x.com/b'))
+        self.assertEqual(len(calls), 2)
+
+
+class TestRetryPass(unittest.TestCase):
+    def test_deferred_child_is_fetched_by_the_retry_pass(self):
+        failed = set()
+
+        def handler(request):
+            path = request.url.path
+            if path == '/sitemap.xml':
+                return httpx.Response(200, headers={'ETag': '"i"'}, text=(
+                    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    '<sitemap><loc>https://x.com/s1.xml</loc></sitemap><sitemap><loc>https://x.com/s2.xml</loc></sitemap></sitemapindex>'))
+            if path.startswith('/s'):
+                if path == '/s2.xml' and path not in failed:
+                    failed.add(path)
+                    return httpx.Response(503)
+                if request.headers.get('If-None-Match'):
+                    return httpx.Response(304)
+                n = path[2]
+                return httpx.Response(200, headers={'ETag': f'"{n}"'}, text=(
+                    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    f"<url><loc>https://x.com/{n}a</loc></url><url><loc>https://x.com/{n}b</loc></url></urlset>"))
+            return httpx.Response(404)
+
+        with tempfile.TemporaryDirectory() as d:
+            db = os.path.join(d, 'urls.db')
+            dbm.ensure_db(db).close()
+            env = runner._make_env(db, 1, progress=False, breakers={'failures': 5}, retry={'passes': 1, 'max_wait': 0}, rules={'mode': 'off'})
+            env['http'].client.close()
+            env['http'] = HttpClient(transport=httpx.MockTransport(handler), breakers=env['breakers'], defer_retries=True)
+            env['robots'] = RobotsCache(env['http'].client, breakers=env['breakers'])
+            site = SiteConfig(id='x', kind='sitemap', cfg={'kind': 'sitemap', 'sitemap': 'https://x.com/sitemap.xml', 'rate_limit_rps': 1000})
+            [(_, counters)] = list(runner._iter_with_retries([site], env, 1))
+            self.assertEqual((counters['inserted'], counters['errors'], counters['retried'], counters['deferred']), (4, 0, 1, 0))
+            self.assertNotIn('retry_at', counters)
+
+    def test_last_pass_retries_in_place(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.path)
+            if request.url.path != '/sitemap.xml':
+                return httpx.Response(404)
+            if requests.count('/sitemap.xml') <= 2:
+                return httpx.Response(503)
+            return httpx.Response(200, text=(
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                '<url><loc>https://x.com/a</loc></url><url><loc>https://x.com/b</loc></url></urlset>'))
+
+        with tempfile.TemporaryDirectory() as d:
+            db = os.path.join(d, 'urls.db')
+            dbm.ensure_db(db).close()
+            env = runner._make_env(db, 1, progress=False, breakers={'failures': 5}, retry={'passes': 1, 'max_wait': 0}, rules={'mode': 'off'})
+            env['http'].client.close()
+            env['http'] = HttpClient(transport=httpx.MockTransport(handler), breakers=env['breakers'], defer_retries=True)
+            env['robots'] = RobotsCache(env['http'].client, breakers=env['breakers'])
+            site = SiteConfig(id='x', kind='sitemap', cfg={'kind': 'sitemap', 'sitemap': 'https://x.com/sitemap.xml', 'rate_limit_rps': 1000})
+            try:
+                [(_, counters)] = list(runner._iter_with_retries([site], env, 1))
+            finally:
+                env['db'].close()
+            # One deferred attempt, then the failure and the success in place on the retry pass
+            self.assertEqual(requests.count('/sitemap.xml'), 3)
+            self.assertEqual((counters['inserted'], counters['errors'], counters['retried']), (2, 0, 1))
+
+    def test_coordinated_run_retries_within_the_lease(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.path)
+            if request.url.path != '/sitemap.xml':
+                return httpx.Response(404)
+            if requests.count('/sitemap.xml') == 1:
+                return httpx.Response(503)
+            return httpx.Response(200, text=(
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                '<url><loc>https://x.com/a</loc></url><url><loc>https://x.com/b</loc></url></urlset>'))
+
+        with tempfile.TemporaryDirectory() as d:
+            db = os.path.join(d, 'urls.db')
+            lconn = dbm.ensure_db(db)
+            env = runner._make_env(db, 1, progress=False, retry={'passes': 1, 'max_wait': 0}, rules={'mode': 'off'})
+            env['http'].client.close()
+            env['http'] = HttpClient(transport=httpx.MockTransport(handler), defer_retries=True)
+            env['robots'] = RobotsCache(env['http'].client)
+            site = SiteConfig(id='x', kind='sitemap', cfg={'kind': 'sitemap', 'sitemap': 'https://x.com/sitemap.xml', 'rate_limit_rps': 1000})
+            try:
+                leases = LeaseManager(lconn, 'r1', 'node-a')
+                [(_, counters)] = list(runner._iter_leased_results([site], env, 2, leases))
+                state = lconn.execute("SELECT state FROM leases WHERE group_key='x.com'").fetchone()
+            finally:
+                lconn.close()
+                env['db'].close()
+            self.assertEqual(requests.count('/sitemap.xml'), 2)
+            self.assertEqual((counters['inserted'], counters['errors'], counters['retried']), (2, 0, 1))
+            self.assertEqual(state, ('done',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from src import runner
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.models import SiteConfig
+from src.core.robots import RobotsCache
+
+INDEX = """<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://x.com/s1.xml</loc></sitemap>
+  <sitemap><loc>https://x.com/s2.xml</loc></sitemap>
+</sitemapindex>"""
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path == '/sitemap.xml':
+        return httpx.Response(200, text=INDEX)
+    if path.startswith('/s'):
+        n = path[2]
+        return httpx.Response(200, text='<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                              f"<url><loc>https://x.com/{n}a</loc></url><url><loc>https://x.com/{n}b</loc></url></urlset>")
+    if path == '/robots.txt':
+        return httpx.Response(404)
+    return httpx.Response(200, text='<html></html>')
+
+
+class TestSiteBudgets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, 'urls.db')
+        dbm.ensure_db(self.db).close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _env(self, budget=None):
+        env = runner._make_env(self.db, 1, progress=False, budget=budget)
+        env['http'].client.close()
+        env['http'] = HttpClient(transport=httpx.MockTransport(_handler))
+        env['robots'] = RobotsCache(env['http'].client)
+        return env
+
+    def test_request_budget_stops_and_keeps_committed_batches(self):
+        env = self._env(budget={'requests': 3})
+        site = SiteConfig(id='x', kind='sitemap', cfg={'kind': 'sitemap', 'sitemap': 'https://x.com/sitemap.xml', 'rate_limit_rps': 1000})
+        _, counters = runner._process_site(site, 0, env)
+        # index, s1.xml, one canonical lookup; the second s1 URL waits for its lookup
+        self.assertEqual(counters['budget'], 'requests')
+        self.assertEqual(counters['requests'], 3)
+        self.assertEqual((counters['inserted'], counters['canonical_pending'], counters['errors']), (1, 1, 0))
+        conn = dbm.ensure_db(self.db)
+        self.assertEqual([r[0] for r in conn.execute("SELECT url FROM url_by_source")], ['https://x.com/1a'])
+        self.assertEqual(dbm.get_pending_canonical(conn, 'x'), [('https://x.com/1b', None, 'sitemap', None)])
+        conn.close()
+        # The site key overrides the run default. The parked URL is resolved first; s1.xml
+        # itself is unchanged and not parsed again.
+        site.cfg['request_budget'] = 100
+        _, counters = runner._process_site(site, 0, self._env(budget={'requests': 3}))
+        self.assertNotIn('budget', counters)
+        self.assertEqual((counters['inserted'], counters['canonical_fetched'], counters['skipped_unchanged']), (3, 3, 1))
+        conn = dbm.ensure_db(self.db)
+        self.assertEqual(sorted(r[0] for r in conn.execute("SELECT url FROM url_by_source")),
+                         ['https://x.com/1a', 'https://x.com/1b', 'https://x.com/2a', 'https://x.com/2b'])
+        self.assertEqual(dbm.get_pending_canonical(conn, 'x'), [])
+        conn.close()
+
+    def test_longest_expected_first(self):
+        conn = dbm.ensure_db(self.db)
+        dbm.record_site_duration(conn, 'a', 10.0)
+        dbm.record_site_duration(conn, 'a', 20.0)
+        dbm.record_site_duration(conn, 'b', 30.0)
+        expected = dbm.get_site_durations(conn)
+        conn.close()
+        self.assertAlmostEqual(expected['a'], 13.0)
+        sites = [SiteConfig(id=i, kind='rss', cfg={}) for i in ('a', 'b', 'new')]
+        self.assertEqual([s.id for s in runner._longest_first(sites, expected)], ['new', 'b', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
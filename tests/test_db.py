@@ -1,5 +1,7 @@
 import os
+import sqlite3
 import tempfile
+import threading
 import unittest
 
 from src.core import db as dbm
@@ -24,6 +26,76 @@ class TestDB(unittest.TestCase):
         rows = list(dbm.query_new_urls(self.conn, start_ts=first-1, end_ts=first+1))
         self.assertEqual(len(rows), 1)
 
+    def test_site_counters(self):
+        run_id = dbm.start_run(self.conn, 'r1')
+        dbm.register_run_source(self.conn, run_id, 's2')
+        dbm.register_run_source(self.conn, run_id, 's1')
+        for url in ('https://x/a', 'https://x/b'):
+            with dbm.transaction(self.conn):
+                dbm.upsert_url(self.conn, url, canonical=None, discovered_via='rss', http_status=None, lastmod=None, etag=None)
+                dbm.touch_url_by_source(self.conn, 's1', url, run_id)
+        dbm.touch_url_by_source(self.conn, 's1', 'https://x/a', run_id)
+        dbm.add_site_errors(self.conn, run_id, 's2', 3)
+        rows = list(dbm.site_counts_for_run(self.conn, run_id))
+        self.assertEqual(rows, [('s2', 0, 0, 3), ('s1', 2, 2, 0)])
+        # Next run: only genuinely new pairs count as new, totals accumulate
+        run2 = dbm.start_run(self.conn, 'r2')
+        dbm.register_run_source(self.conn, run2, 's1')
+        dbm.touch_url_by_source(self.conn, 's1', 'https://x/c', run2)
+        self.assertEqual(list(dbm.site_counts_for_run(self.conn, run2)), [('s1', 1, 3, 0)])
+
+    def test_write_discoveries_matches_per_row_writes(self):
+        run_id = dbm.start_run(self.conn, 'r1')
+        dbm.register_run_source(self.conn, run_id, 's1')
+        dbm.touch_url_by_source(self.conn, 's1', 'https://x/a', run_id)
+        dbm.upsert_url(self.conn, 'https://x/a', canonical=None, discovered_via='rss', http_status=None, lastmod='old', etag=None)
+        self.assertEqual(dbm.known_urls(self.conn, ['https://x/a', 'https://x/b']), {'https://x/a'})
+        rows = [('https://x/a', None, 'sitemap', None), ('https://x/b', None, 'sitemap', '2024'), ('https://x/b', None, 'sitemap', None)]
+        with dbm.transaction(self.conn):
+            self.assertEqual(dbm.write_discoveries(self.conn, 's1', rows, run_id), ['https://x/b'])
+        self.assertEqual(list(dbm.site_counts_for_run(self.conn, run_id)), [('s1', 2, 2, 0)])
+        lastmods = dict(self.conn.execute("SELECT url, lastmod FROM urls"))
+        self.assertEqual(lastmods, {'https://x/a': 'old', 'https://x/b': '2024'})
+        self.assertEqual([r[1] for r in dbm.query_new_urls_for_run(self.conn, run_id)], ['https://x/a', 'https://x/b'])
+
+
+    def test_connection_manager_reuses_connections_by_role(self):
+        db = dbm.ConnectionManager(self.db_path, {'profile': 'fast', 'pragmas': {'cache_size': -1000}})
+        with db.writer() as w:
+            self.assertEqual(w.execute('PRAGMA mmap_size').fetchone()[0], 256 << 20)
+            self.assertEqual(w.execute('PRAGMA cache_size').fetchone()[0], -1000)
+            dbm.upsert_url(w, 'https://x/a', canonical=None, discovered_via='rss', http_status=None, lastmod=None, etag=None)
+
+        def site():
+            with db.writer(), db.reader() as r:
+                self.assertEqual(dbm.known_urls(r, ['https://x/a', 'https://x/b']), {'https://x/a'})
+                with self.assertRaises(sqlite3.OperationalError):
+                    r.execute("DELETE FROM urls")
+
+        threads = [threading.Thread(target=site) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for _ in range(20):
+            site()
+        stats = db.stats()
+        self.assertEqual((stats['writer']['checkouts'], stats['reader']['checkouts']), (25, 24))
+        self.assertLessEqual(max(stats['writer']['opened'], stats['reader']['opened']), 4)
+        db.close()
+        with self.assertRaises(ValueError):
+            dbm.ConnectionManager(self.db_path, 'turbo')
+
+    def test_schema_stamp_skips_reinitialization(self):
+        self.assertEqual(self.conn.execute('PRAGMA user_version').fetchone()[0], dbm._SCHEMA_STAMP)
+        self.conn.execute("DROP INDEX idx_ubs_first_seen")
+        dbm.ensure_db(self.db_path).close()
+        self.assertIsNone(self.conn.execute("SELECT 1 FROM sqlite_master WHERE name='idx_ubs_first_seen'").fetchone())
+        # A database without the stamp (older code, or a schema change) is brought up to date
+        self.conn.execute("PRAGMA user_version=0")
+        dbm.ensure_db(self.db_path).close()
+        self.assertIsNotNone(self.conn.execute("SELECT 1 FROM sqlite_master WHERE name='idx_ubs_first_seen'").fetchone())
+
 
 if __name__ == '__main__':
     unittest.main()
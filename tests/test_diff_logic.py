@@ -27,6 +27,20 @@ class TestDiffLogic(unittest.TestCase):
         rows = list(dbm.query_new_urls(self.conn, start_ts=now-20, end_ts=now-5))
         self.assertTrue(any(r[1] == 'https://a' for r in rows))
 
+    def test_new_for_run_ignores_overlapping_run(self):
+        dbm.upsert_source(self.conn, 's1', 'rss', None, '{}')
+        run_a = dbm.start_run(self.conn, 'a')
+        run_b = dbm.start_run(self.conn, 'b')
+        for url, run in (('https://a', run_a), ('https://b', run_b), ('https://c', run_a)):
+            dbm.upsert_url(self.conn, url, canonical=None, discovered_via='rss', http_status=None, lastmod='2024-01-01', etag=None)
+            dbm.touch_url_by_source(self.conn, 's1', url, run)
+        # Re-touching an existing pair in a later run must not restamp it
+        dbm.touch_url_by_source(self.conn, 's1', 'https://a', run_b)
+        rows = list(dbm.query_new_urls_for_run(self.conn, run_a))
+        self.assertEqual([r[1] for r in rows], ['https://a', 'https://c'])
+        self.assertEqual(rows[0][3], '2024-01-01')
+        self.assertEqual([r[1] for r in dbm.query_new_urls_for_run(self.conn, run_b)], ['https://b'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from src import export
+from src.core import db as dbm
+
+DAY = 86400
+T0 = 1_700_000_000  # 2023-11-14
+
+
+@unittest.skipUnless(export.pa is not None, 'pyarrow not installed')
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = dbm.ensure_db(os.path.join(self.tmp.name, 'urls.db'))
+        self.out = os.path.join(self.tmp.name, 'export')
+        with dbm.transaction(self.conn):
+            dbm.write_discoveries(self.conn, 'a', [(f"https://a/{i}", None, 'rss', '2024') for i in range(5)], now=T0)
+            dbm.write_discoveries(self.conn, 'b', [('https://b/0', None, 'sitemap', None)], now=T0 + DAY)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _read(self, table, fmt='parquet'):
+        import pyarrow.dataset as ds
+        return ds.dataset(os.path.join(self.out, table), format='parquet' if fmt == 'parquet' else 'ipc', partitioning='hive').to_table()
+
+    def test_incremental_parquet_export(self):
+        rep = export.run_export(self.conn, self.out, batch_rows=2, now=T0 + 2 * DAY)
+        self.assertEqual(rep['tables']['url_by_source']['rows'], 6)
+        self.assertEqual(sorted(f['path'] for f in rep['tables']['url_by_source']['files']),
+                         ['url_by_source/date=2023-11-14/part-20231116T221320Z.parquet', 'url_by_source/date=2023-11-15/part-20231116T221320Z.parquet'])
+        t = self._read('url_by_source')
+        self.assertEqual(str(t.schema.field('site_id').type), 'dictionary<values=string, indices=int32, ordered=0>')
+        # Parquet has no seconds unit; timestamps come back as milliseconds
+        self.assertEqual(str(t.schema.field('last_seen').type), 'timestamp[ms, tz=UTC]')
+        self.assertEqual(sorted(t.column('url').to_pylist()), sorted([f"https://a/{i}" for i in range(5)] + ['https://b/0']))
+
+        # Only rows seen again since the watermark are appended
+        with dbm.transaction(self.conn):
+            dbm.write_discoveries(self.conn, 'a', [('https://a/1', None, 'rss', None), ('https://a/9', None, 'rss', None)], now=T0 + 3 * DAY)
+        rep = export.run_export(self.conn, self.out, tables=['url_by_source'], now=T0 + 4 * DAY)
+        self.assertEqual(rep['tables']['url_by_source']['since'], T0 + 2 * DAY - export.DEFAULT_SETTLE_SECONDS)
+        self.assertEqual(rep['tables']['url_by_source']['rows'], 2)
+        self.assertEqual(self._read('url_by_source').num_rows, 8)
+        self.assertEqual(export.run_export(self.conn, self.out, tables=['url_by_source'], now=T0 + 4 * DAY)['tables']['url_by_source']['rows'], 0)
+
+    def test_late_commit_and_full_export(self):
+        now = T0 + 2 * DAY
+        export.run_export(self.conn, self.out, tables=['url_by_source'], now=now)
+        # Stamped 30s before the export but committed after it, e.g. after a lock wait
+        with dbm.transaction(self.conn):
+            dbm.write_discoveries(self.conn, 'a', [('https://a/late', None, 'rss', None)], now=now - 30)
+        rep = export.run_export(self.conn, self.out, tables=['url_by_source'], now=now + 600)
+        self.assertEqual(rep['tables']['url_by_source']['rows'], 1)
+        self.assertEqual(self._read('url_by_source').num_rows, 7)
+
+        # --full replaces the earlier files instead of adding a second copy of every row
+        rep = export.run_export(self.conn, self.out, tables=['url_by_source'], full=True, now=now + 1200)
+        self.assertEqual((rep['tables']['url_by_source']['rows'], rep['tables']['url_by_source']['removed']), (7, 3))
+        self.assertEqual(sorted(self._read('url_by_source').column('url').to_pylist()),
+                         sorted([f"https://a/{i}" for i in range(5)] + ['https://b/0', 'https://a/late']))
+
+    def test_arrow_ipc_keeps_one_growing_dictionary(self):
+        export.run_export(self.conn, self.out, tables=['urls'], fmt='arrow', batch_rows=1, now=T0 + DAY + 600)
+        t = self._read('urls', fmt='arrow')
+        self.assertEqual(t.num_rows, 6)
+        self.assertEqual(sorted(set(t.column('discovered_via').to_pylist())), ['rss', 'sitemap'])
+
+
+if __name__ == '__main__':
+    unittest.main()
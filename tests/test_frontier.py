@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from src.core import db as dbm
+from src.core.frontier import Frontier, PageYield
+
+
+class TestFrontier(unittest.TestCase):
+    def test_priority_order_and_bfs(self):
+        f = Frontier(explore=0.0)
+        f.push('https://x/article', 2, (0.0, 3.0))
+        f.push('https://x/new-a', 1)
+        f.push('https://x/hub', 1, (12.0, 2.0))
+        f.push('https://x/new-b', 1)
+        self.assertEqual([f.pop()[0] for _ in range(len(f))],
+                         ['https://x/hub', 'https://x/new-a', 'https://x/new-b', 'https://x/article'])
+        with self.assertRaises(IndexError):
+            f.pop()
+
+        bfs = Frontier(explore=1.0)
+        for i, stats in enumerate([(0.0, 3.0), None, (12.0, 2.0)]):
+            bfs.push(f"https://x/{i}", 1, stats)
+        self.assertEqual([bfs.pop() for _ in range(3)], [('https://x/0', 1), ('https://x/1', 1), ('https://x/2', 1)])
+
+    def test_exploration_takes_each_url_once(self):
+        f = Frontier(explore=0.5, seed=7)
+        urls = [f"https://x/{i}" for i in range(200)]
+        for i, u in enumerate(urls):
+            f.push(u, 1, (float(i % 5), 1.0))
+        popped = [f.pop()[0] for _ in range(len(f))]
+        self.assertEqual(sorted(popped), sorted(urls))
+        self.assertEqual(len(f), 0)
+
+
+class TestPageYield(unittest.TestCase):
+    def test_record_and_history(self):
+        with tempfile.TemporaryDirectory() as d:
+            conn = dbm.ensure_db(os.path.join(d, 'urls.db'))
+            dbm.upsert_url(conn, 'https://x.com/old', canonical=None, discovered_via='crawl', http_status=None, lastmod=None, etag=None)
+            counters = {}
+            py = PageYield(conn, 'x', counters)
+            self.assertEqual(py.history(['https://x.com/']), {})
+            self.assertEqual(py.record('https://x.com/', ['https://x.com/old', 'https://x.com/new', 'https://x.com/new#top']), 1)
+            py.record('https://x.com/old', ['https://x.com/old'])
+            hist = py.history(['https://x.com/', 'https://x.com/old', 'https://x.com/unseen'])
+            self.assertEqual(hist, {'https://x.com/': (1.0, 1.0), 'https://x.com/old': (0.0, 1.0)})
+            # Older history decays
+            py.record('https://x.com/', [])
+            new_links, fetches = py.history(['https://x.com/'])['https://x.com/']
+            self.assertAlmostEqual(new_links, 0.8)
+            self.assertAlmostEqual(fetches, 1.8)
+            self.assertEqual((counters['new_links'], counters['top_pages']), (1, [(1, 'https://x.com/')]))
+            self.assertEqual(dbm.top_page_yield(conn, 'x', 1)[0][0], 'https://x.com/')
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from urllib.parse import urlsplit
+
+from src.core import db as dbm
+from src.core.hostrules import HostRules, apply_rule, derive_rule
+
+
+class TestHostRules(unittest.TestCase):
+    def test_derive_and_apply(self):
+        cases = [
+            ('http://x.com/a', 'https://x.com/a', '/b', 'https://x.com/b'),
+            ('https://x.com/a', 'https://www.x.com/a', '/b?q=1', 'https://www.x.com/b?q=1'),
+            ('https://x.com/a/', 'https://x.com/a', '/b/', 'https://x.com/b'),
+            ('https://x.com/a', 'https://x.com/a/', '/b', 'https://x.com/b/'),
+            ('https://x.com/amp/2024/p', 'https://x.com/2024/p', '/amp/2025/q', 'https://x.com/2025/q'),
+            ('https://x.com/a', 'https://x.com/a', '/b', 'https://x.com/b'),
+        ]
+        for src, dst, other_path, other_dst in cases:
+            with self.subTest(src=src, dst=dst):
+                rule = derive_rule(src, dst)
+                self.assertIsNotNone(rule)
+                self.assertEqual(apply_rule(rule, src), dst)
+                parts = urlsplit(src)
+                self.assertEqual(apply_rule(rule, f"{parts.scheme}://{parts.netloc}{other_path}"), other_dst)
+        self.assertIsNone(derive_rule('https://x.com/a?x=1', 'https://x.com/a'))
+        self.assertIsNone(derive_rule('https://x.com/a', 'https://x.com/b'))
+        self.assertIsNone(apply_rule(derive_rule('https://x.com/a/', 'https://x.com/a'), 'https://x.com/b'))
+
+    def test_confirm_apply_and_drift(self):
+        rules = HostRules(min_hits=3, spot_check=0.0, seed=1)
+        for i in range(2):
+            rules.observe(f"http://x.com/p{i}", f"https://x.com/p{i}")
+        self.assertEqual(rules.rewrite('http://x.com/q'), (None, False))
+        rules.observe('http://x.com/p2', 'https://x.com/p2')
+        self.assertEqual(rules.rewrite('http://x.com/q'), ('https://x.com/q', False))
+        self.assertEqual(rules.rewrite('http://y.com/q'), (None, False))
+        # A spot check that disagrees sends the host back to fetching
+        rules.observe('http://x.com/p3', 'http://x.com/p3', spot_check=True)
+        self.assertEqual(rules.rewrite('http://x.com/q'), (None, False))
+
+    def test_counts_persist_as_deltas(self):
+        with tempfile.TemporaryDirectory() as d:
+            conn = dbm.ensure_db(os.path.join(d, 'urls.db'))
+            for _ in range(2):
+                rules = HostRules(min_hits=4).load(conn)
+                for i in range(2):
+                    rules.observe(f"https://x.com/p{i}/", f"https://x.com/p{i}")
+                with dbm.transaction(conn):
+                    rules.flush(conn)
+            rules = HostRules(min_hits=4).load(conn)
+            self.assertEqual(rules.report(), [{'host': 'x.com', 'rule': '||remove||', 'hits': 4, 'misses': 0}])
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import httpx
+
+from src.adapters.jscrawl import CLIENT_RENDERED, JsCrawlAdapter
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.robots import RobotsCache
+from src.core.scheduler import RateLimiter
+
+# Server HTML and rendered DOM per page: the SPA shell only gets its links from the render
+SERVER = {
+    'https://spa.x/': '<html><body><div id="app"></div></body></html>',
+    'https://ssr.x/': '<html><body><a href="/b">b</a></body></html>',
+}
+RENDERED = {
+    'https://spa.x/': '<html><body><div id="app"><a href="/a">a</a></div></body></html>',
+    'https://ssr.x/': '<html><body><a href="/b">b</a></body></html>',
+}
+
+
+class FakePage:
+    def __init__(self, rendered):
+        self.rendered = rendered
+        self.url = None
+
+    def set_default_navigation_timeout(self, ms):
+        pass
+
+    def set_default_timeout(self, ms):
+        pass
+
+    def goto(self, url, wait_until=None):
+        self.url = url
+        self.rendered.append(url)
+
+    def content(self):
+        return RENDERED[self.url]
+
+    def close(self):
+        pass
+
+
+def _fake_playwright(rendered):
+    """A `playwright.sync_api` module whose browser serves RENDERED and logs each render."""
+    page = FakePage(rendered)
+    context = types.SimpleNamespace(new_page=lambda: page, close=lambda: None)
+    browser = types.SimpleNamespace(new_context=lambda **kw: context, close=lambda: None)
+    p = types.SimpleNamespace(chromium=types.SimpleNamespace(launch=lambda **kw: browser))
+
+    class _Playwright:
+        def __enter__(self):
+            return p
+
+        def __exit__(self, *exc):
+            return False
+
+    return types.SimpleNamespace(sync_playwright=_Playwright)
+
+
+class TestClientRendered(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.rendered = []
+
+        def origin(request):
+            if request.url.path == '/robots.txt':
+                return httpx.Response(404)
+            url = str(request.url)
+            self.requests.append((url, request.headers.get('If-None-Match')))
+            if request.headers.get('If-None-Match') == '"spa"':
+                return httpx.Response(304)
+            # The SSR page sends no validators, so only its unchanged body skips the render
+            headers = {'ETag': '"spa"'} if url == 'https://spa.x/' else {}
+            return httpx.Response(200, headers=headers, text=SERVER[url])
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = dbm.ensure_db(os.path.join(self.tmp.name, 'state.db'))
+        self.http = HttpClient(transport=httpx.MockTransport(origin))
+        self.robots = RobotsCache(self.http.client)
+        modules = {'playwright': types.ModuleType('playwright'), 'playwright.sync_api': _fake_playwright(self.rendered)}
+        patcher = mock.patch.dict(sys.modules, modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.http.client.close()
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _run(self, base):
+        counters = {'fetched': 0, 'parsed': 0, 'discovered': 0, 'skipped_robots': 0, 'skipped_unchanged': 0, 'errors': 0, 'status': {}}
+        ctx = {'http': self.http, 'robots': self.robots, 'ratelimiter': RateLimiter(), 'db': self.conn, 'counters': counters}
+        host = base.split('/')[2]
+        cfg = {'kind': 'crawl', 'js_render': True, 'base': base, 'scope_host': host, 'max_depth': 0, 'rate_limit_rps': 1000}
+        urls = [d.url for d in JsCrawlAdapter(host, cfg, ctx).discover()]
+        return urls, counters
+
+    def test_spa_shell_is_rendered_every_run(self):
+        for _ in range(2):
+            urls, _ = self._run('https://spa.x/')
+            self.assertEqual(urls, ['https://spa.x/a'])
+            self.assertEqual(dbm.get_resource_hash(self.conn, 'https://spa.x/'), CLIENT_RENDERED)
+        self.assertEqual(self.rendered, ['https://spa.x/', 'https://spa.x/'])
+        # The stored ETag is not sent: a 304 would skip the render
+        self.assertEqual(self.requests, [('https://spa.x/', None), ('https://spa.x/', None)])
+
+    def test_server_rendered_page_is_skipped_when_unchanged(self):
+        urls, _ = self._run('https://ssr.x/')
+        self.assertEqual(urls, ['https://ssr.x/b'])
+        self.assertNotEqual(dbm.get_resource_hash(self.conn, 'https://ssr.x/'), CLIENT_RENDERED)
+        urls, counters = self._run('https://ssr.x/')
+        self.assertEqual(urls, [])
+        self.assertEqual(counters['skipped_unchanged'], 1)
+        self.assertEqual(self.rendered, ['https://ssr.x/'])
+
+
+if __name__ == '__main__':
+    unittest.main()
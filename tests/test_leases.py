@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+
+from src import runner
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.leases import LeaseManager
+from src.core.models import SiteConfig
+from src.core.robots import RobotsCache
+
+
+class TestLeases(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'urls.db')
+        self.conn_a = dbm.ensure_db(self.db_path)
+        self.conn_b = dbm.ensure_db(self.db_path)
+
+    def tearDown(self):
+        self.conn_a.close()
+        self.conn_b.close()
+        self.tmpdir.cleanup()
+
+    def test_claims_are_exclusive_and_completed_once(self):
+        a = LeaseManager(self.conn_a, 'r1', 'node-a')
+        b = LeaseManager(self.conn_b, 'r1', 'node-b')
+        a.seed(['h1', 'h2'])
+        b.seed(['h1', 'h2'])
+        ka, kb = a.claim(), b.claim()
+        self.assertEqual({ka, kb}, {'h1', 'h2'})
+        self.assertIsNone(a.claim())
+        a.complete(ka)
+        b.complete(kb)
+        self.assertIsNone(b.claim())
+        # A new round starts from scratch
+        c = LeaseManager(self.conn_a, 'r2', 'node-a')
+        c.seed(['h1'])
+        self.assertEqual(c.claim(), 'h1')
+
+    def test_expired_lease_is_taken_over(self):
+        a = LeaseManager(self.conn_a, 'r1', 'node-a', ttl=0.05)
+        b = LeaseManager(self.conn_b, 'r1', 'node-b', ttl=0.05)
+        a.seed(['h1'])
+        self.assertEqual(a.claim(), 'h1')
+        self.assertIsNone(b.claim())
+        time.sleep(0.1)
+        self.assertEqual(b.claim(), 'h1')
+        self.assertEqual(a.heartbeat(), ['h1'])
+        # The original owner can no longer complete the group
+        a.complete('h1')
+        state = self.conn_a.execute("SELECT state, owner FROM leases WHERE group_key='h1'").fetchone()
+        self.assertEqual(state, ('claimed', 'node-b'))
+
+    def test_leased_run_stops_a_group_whose_lease_was_lost(self):
+        leases = LeaseManager(self.conn_a, 'r1', 'node-a')
+        fetched = []
+
+        def handler(request):
+            path = request.url.path
+            fetched.append(path)
+            if path == '/sitemap.xml':
+                return httpx.Response(200, text=(
+                    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    + ''.join(f"<sitemap><loc>https://x.com/s{i}.xml</loc></sitemap>" for i in (1, 2, 3)) + '</sitemapindex>'))
+            if path.startswith('/s'):
+                if path == '/s2.xml':
+                    # Node b takes the expired lease over; node a's next heartbeat notices
+                    self.conn_b.execute("UPDATE leases SET owner='node-b' WHERE group_key='x.com'")
+                    self.assertEqual(leases.heartbeat(), ['x.com'])
+                n = path[2]
+                return httpx.Response(200, text=(
+                    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    f"<url><loc>https://x.com/{n}a</loc></url><url><loc>https://x.com/{n}b</loc></url></urlset>"))
+            return httpx.Response(404)
+
+        env = runner._make_env(self.db_path, 1, progress=False, rules={'mode': 'off'})
+        env['http'].client.close()
+        env['http'] = HttpClient(transport=httpx.MockTransport(handler))
+        env['robots'] = RobotsCache(env['http'].client)
+        sites = [SiteConfig(id=sid, kind='sitemap', cfg={'kind': 'sitemap', 'sitemap': f"https://x.com/{name}", 'rate_limit_rps': 1000})
+                 for sid, name in (('first', 'sitemap.xml'), ('second', 'other.xml'))]
+        try:
+            results = list(runner._iter_leased_results(sites, env, 1, leases))
+        finally:
+            env['db'].close()
+        # The batch read after the takeover is not written, and the second site is left to node b
+        [(site, counters)] = results
+        self.assertEqual((site.id, counters['inserted'], counters['stopped']), ('first', 2, 'lease_lost'))
+        self.assertNotIn('/s3.xml', fetched)
+        self.assertNotIn('/other.xml', fetched)
+        self.assertEqual(dbm.known_urls(self.conn_a, [f"https://x.com/{n}{c}" for n in (1, 2) for c in 'ab']),
+                         {'https://x.com/1a', 'https://x.com/1b'})
+        state = self.conn_a.execute("SELECT state, owner FROM leases WHERE group_key='x.com'").fetchone()
+        self.assertEqual(state, ('claimed', 'node-b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
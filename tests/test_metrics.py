@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from src.core.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_observe_merge_and_export(self):
+        m = Metrics()
+        m.observe('http', 'a.example', 0.02)
+        m.observe('http', 'a.example', 0.3)
+        m.add_bytes('http', 'a.example', 100)
+        worker = Metrics()
+        worker.observe('http', 'a.example', 2.0)
+        worker.add_bytes('http', 'a.example', 50)
+        m.merge(worker.snapshot())
+
+        rep = m.report()
+        h = rep['stages']['http']['hosts']['a.example']
+        self.assertEqual(h['count'], 3)
+        self.assertAlmostEqual(h['sum'], 2.32)
+        self.assertEqual(h['p50'], 0.5)
+        self.assertEqual(rep['bytes']['http']['a.example'], 150)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'linkharvest.prom')
+            m.write_prometheus(path)
+            with open(path) as f:
+                text = f.read()
+        self.assertIn('linkharvest_stage_seconds_bucket{stage="http",host="a.example",le="+Inf"} 3', text)
+        self.assertIn('linkharvest_bytes_total{stage="http",host="a.example"} 150', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from src.core.profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_site_profile_trace_and_slowest(self):
+        with tempfile.TemporaryDirectory() as d:
+            prof = Profiler(d, site_sample=1.0, url_sample=1.0, top_n=2)
+            with prof.site('s1'):
+                for i in range(3):
+                    t = prof.url('s1', f'https://x/{i}')
+                    with t.stage('normalize'):
+                        sum(range(1000 * (i + 1)))
+                    t.done()
+            worker = Profiler(d, url_sample=0.0)
+            with worker.site('s2'):
+                pass
+            prof.merge(worker.snapshot())
+            prof.write()
+
+            self.assertTrue(os.path.exists(os.path.join(d, 'profile', 's1.pstats')))
+            with open(os.path.join(d, 'trace.json')) as f:
+                events = json.load(f)['traceEvents']
+            names = [e['name'] for e in events]
+            self.assertEqual(names.count('normalize'), 3)
+            self.assertEqual(names.count('site'), 2)
+            with open(os.path.join(d, 'slowest.json')) as f:
+                slowest = json.load(f)
+            self.assertEqual(len(slowest['urls']), 2)
+            self.assertEqual({s['site_id'] for s in slowest['sites']}, {'s1', 's2'})
+
+    def test_concurrent_sites(self):
+        # Only one profiler may be active at a time (3.12+); the overlapping site runs without one
+        with tempfile.TemporaryDirectory() as d:
+            prof = Profiler(d, site_sample=1.0, url_sample=0.0)
+            inside = threading.Barrier(2, timeout=5)
+            errors = []
+
+            def work(site_id):
+                try:
+                    with prof.site(site_id):
+                        inside.wait()
+                        sum(range(10000))
+                        inside.wait()
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work, args=(f"s{i}",)) for i in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            prof.write()
+            with prof.site('s3'):
+                pass
+
+            self.assertEqual(errors, [])
+            self.assertEqual(prof.skipped, 1)
+            self.assertEqual(len(os.listdir(os.path.join(d, 'profile'))), 2)
+            self.assertTrue(os.path.exists(os.path.join(d, 'profile', 's3.pstats')))
+            with open(os.path.join(d, 'slowest.json')) as f:
+                slowest = json.load(f)
+            self.assertEqual(slowest['profile_skipped_sites'], 1)
+            self.assertEqual(len(slowest['sites']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
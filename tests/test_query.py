@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import httpx
+import orjson
+
+from src import query
+from src.core import db as dbm
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'urls.db')
+        self.conn = dbm.ensure_db(self.path)
+        with dbm.transaction(self.conn):
+            dbm.write_discoveries(self.conn, 'a', [(f"https://a/{i}", None, 'rss', None) for i in range(3)])
+            dbm.write_discoveries(self.conn, 'b', [('https://b/0', None, 'rss', '2024')])
+        with dbm.transaction(self.conn):
+            # Seen again: keeps its cursor position, is not handed out twice
+            dbm.write_discoveries(self.conn, 'a', [('https://a/0', None, 'rss', None), ('https://a/3', None, 'rss', None)])
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_pages_and_site_filter(self):
+        pages = list(query.iter_pages(self.conn, 0, limit=2))
+        self.assertEqual([[r[2] for r in p] for p in pages], [['https://a/0', 'https://a/1'], ['https://a/2', 'https://b/0'], ['https://a/3']])
+        self.assertEqual([r[0] for p in pages for r in p], [1, 2, 3, 4, 5])
+        self.assertEqual([r[2] for r in dbm.query_after(self.conn, 2, sites=['a'])], ['https://a/2', 'https://a/3'])
+        self.assertEqual(dbm.ack_consumer(self.conn, 'c', 4), 4)
+        self.assertEqual(dbm.ack_consumer(self.conn, 'c', 2), 4)
+        self.assertEqual(dbm.list_consumers(self.conn)[0][::3], ('c', 1))
+
+    def test_seq_survives_migration_of_old_database(self):
+        self.conn.execute("DROP TABLE sequences")
+        self.conn.execute("DROP INDEX idx_ubs_seq")
+        self.conn.execute("DROP INDEX idx_ubs_source_seq")
+        self.conn.execute("ALTER TABLE url_by_source DROP COLUMN seq")
+        # Databases from before the schema stamp have user_version 0
+        self.conn.execute("PRAGMA user_version=0")
+        conn = dbm.ensure_db(self.path)
+        self.assertEqual([r[0] for r in dbm.query_after(conn, 0)], [1, 2, 3, 4, 5])
+        with dbm.transaction(conn):
+            dbm.write_discoveries(conn, 'b', [('https://b/1', None, 'rss', None)])
+        self.assertEqual([r[:3] for r in dbm.query_after(conn, 5)], [(6, 'b', 'https://b/1')])
+        conn.close()
+
+    def test_http_consumer_reads_then_acks(self):
+        srv = query.QueryServer(('127.0.0.1', 0), self.path)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{srv.server_address[1]}"
+        try:
+            with httpx.Client(base_url=base) as c:
+                first = [orjson.loads(x) for x in c.get('/consumers/idx/urls', params={'limit': 3}).text.splitlines()]
+                self.assertEqual([r['cursor'] for r in first], [1, 2, 3])
+                self.assertEqual(c.post('/consumers/idx/ack', params={'cursor': 3}).json()['cursor'], 3)
+                rest = [orjson.loads(x) for x in c.get('/consumers/idx/urls').text.splitlines()]
+                self.assertEqual([(r['site_id'], r['url'], r['lastmod']) for r in rest], [('b', 'https://b/0', '2024'), ('a', 'https://a/3', None)])
+                self.assertEqual(c.get('/urls', params={'after': 0, 'site': 'b'}).text.count('\n'), 1)
+                self.assertEqual(c.get('/consumers/bad name/urls').status_code, 400)
+        finally:
+            srv.shutdown()
+            srv.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import unittest
+
+from src import reports
+
+ROWS = [('s1', 'https://a/1', 1_700_000_000, '2024-01-01'), ('s2', 'https://b/2', 1_700_000_100, None)]
+
+
+class TestNewArtifacts(unittest.TestCase):
+    def test_single_pass_matches_separate_writers(self):
+        with tempfile.TemporaryDirectory() as d:
+            def path(name):
+                return os.path.join(d, name)
+
+            self.assertEqual(reports.write_new_artifacts(path('a.ndjson'), path('a.csv'), iter(ROWS)), 2)
+            reports.write_new_ndjson(path('b.ndjson'), ROWS)
+            reports.write_new_csv(path('b.csv'), ROWS)
+            for ext in ('ndjson', 'csv'):
+                with open(path(f'a.{ext}'), 'rb') as fa, open(path(f'b.{ext}'), 'rb') as fb:
+                    self.assertEqual(fa.read(), fb.read())
+            with open(path('a.csv')) as f:
+                self.assertEqual(f.read().splitlines()[1:], ['s1,https://a/1,2023-11-14T22:13:20Z,2024-01-01',
+                                                               's2,https://b/2,2023-11-14T22:15:00Z,'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from src.core import db as dbm
+from src.core import retention
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'urls.db')
+        self.archive_path = os.path.join(self.tmpdir.name, 'archive.db')
+        self.conn = dbm.ensure_db(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _age(self, table, url, seconds):
+        self.conn.execute(f"UPDATE {table} SET first_seen=first_seen-?, last_seen=last_seen-? WHERE url=?", (seconds, seconds, url))
+
+    def test_policies_delete_and_archive(self):
+        dbm.set_resource_etag_lastmod(self.conn, 'https://x/feed', '"e1"', None)
+        dbm.set_resource_etag_lastmod(self.conn, 'https://x/fresh-feed', '"e2"', None)
+        for url in ('https://x/a', 'https://x/b'):
+            dbm.upsert_url(self.conn, url, canonical=None, discovered_via='rss', http_status=None, lastmod=None, etag=None)
+            dbm.touch_url_by_source(self.conn, 's1', url)
+        self._age('urls', 'https://x/feed', 40 * 86400)
+        self._age('urls', 'https://x/a', 40 * 86400)
+        self._age('url_by_source', 'https://x/a', 400 * 86400)
+        cfg = {
+            'archive_db': self.archive_path,
+            'batch_size': 1,
+            'batch_pause_seconds': 0,
+            'policies': [
+                {'table': 'urls', 'discovered_via': 'resource', 'max_age_days': 30},
+                {'table': 'url_by_source', 'max_age_days': 365, 'action': 'archive'},
+            ],
+        }
+        self.assertTrue(retention.is_due(self.conn, cfg))
+        rep = retention.run_retention(self.conn, cfg)
+        self.assertEqual([p['rows'] for p in rep['policies']], [1, 1])
+        self.assertFalse(retention.is_due(self.conn, cfg))
+        # Old article row is kept: the resource policy only matches conditional-GET rows
+        self.assertTrue(dbm.has_url(self.conn, 'https://x/a'))
+        self.assertFalse(dbm.has_url(self.conn, 'https://x/feed'))
+        self.assertTrue(dbm.has_url(self.conn, 'https://x/fresh-feed'))
+        left = [r[0] for r in self.conn.execute("SELECT url FROM url_by_source")]
+        self.assertEqual(left, ['https://x/b'])
+        self.assertEqual(self.conn.execute("SELECT total_seen FROM source_stats WHERE source_id='s1'").fetchone()[0], 1)
+        arch = sqlite3.connect(self.archive_path)
+        self.assertEqual([r[0] for r in arch.execute("SELECT url FROM url_by_source")], ['https://x/a'])
+        arch.close()
+        self.assertEqual(rep['auto_vacuum'], 'incremental')
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            retention.parse_policies({'policies': [{'table': 'url_by_source', 'max_age_days': 1, 'discovered_via': 'crawl'}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,39 @@
+import os
+import tempfile
 import unittest
 
+import httpx
+from lxml import etree
+
 from src.adapters.rss import RSSAdapter
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.robots import RobotsCache
+from src.core.scheduler import RateLimiter
+
+FEED = b"""<rss version="2.0"><channel>
+<item><link>https://example.com/one</link></item>
+</channel></rss>"""
+
+# Well-formed feeds in each dialect, with the link/id/date edge cases feedparser resolves
+FIXTURES = {
+    'rss2': """<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:atom="http://www.w3.org/2005/Atom"><channel>
+      <item><link> https://example.com/a?x=1&amp;y=2 </link><pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate></item>
+      <item><guid isPermaLink="false">tag:example.com,1</guid><dc:date>2024-01-02</dc:date></item>
+      <item><guid>https://example.com/g</guid><link></link></item>
+      <item><atom:link rel="alternate" href="https://example.com/al"/><pubDate>p</pubDate><dc:date>d</dc:date></item>
+    </channel></rss>""",
+    'atom': """<feed xmlns="http://www.w3.org/2005/Atom"><title>x</title>
+      <entry><id>urn:1</id><link rel="self" href="https://example.com/self"/><link href="https://example.com/alt"/>
+        <updated>2024-01-01T00:00:00Z</updated><source><link href="https://src.example/"/><updated>s</updated></source></entry>
+      <entry><id>https://example.com/id-only</id><published>2023-01-01T00:00:00Z</published></entry>
+    </feed>""",
+    'rdf': """<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"
+        xmlns:dc="http://purl.org/dc/elements/1.1/"><channel rdf:about="https://example.com/"><title>t</title></channel>
+      <item rdf:about="https://example.com/r1"><link>https://example.com/r1-link</link><dc:date>2024-03-03</dc:date></item>
+      <item rdf:about="https://example.com/r2"></item>
+    </rdf:RDF>""",
+}
 
 
 class TestRSSAdapter(unittest.TestCase):
@@ -27,6 +60,41 @@ class TestRSSAdapter(unittest.TestCase):
         self.assertEqual(items[0].url, 'https://example.com/one')
         self.assertEqual(items[1].url, 'https://example.com/two')
 
+    def test_fast_path_matches_feedparser(self):
+        for name, xml in FIXTURES.items():
+            with self.subTest(feed=name):
+                fast = RSSAdapter.parse_feed_lxml(xml)
+                self.assertTrue(fast)
+                self.assertEqual(fast, RSSAdapter.parse_feed_feedparser(xml))
+                self.assertEqual(list(RSSAdapter.parse_feed(xml.encode('utf-8'))), fast)
+
+    def test_malformed_feed_falls_back_to_feedparser(self):
+        xml = '<rss><channel><item><link>https://example.com/a &amp b</link></item><item><guid>https://example.com/c</guid>'
+        with self.assertRaises(etree.XMLSyntaxError):
+            RSSAdapter.parse_feed_lxml(xml)
+        self.assertEqual(list(RSSAdapter.parse_feed(xml)), RSSAdapter.parse_feed_feedparser(xml))
+        self.assertEqual([d.url for d in RSSAdapter.parse_feed(xml)], ['https://example.com/a & b', 'https://example.com/c'])
+
+    def test_unchanged_body_skipped_without_validators(self):
+        # Server sends no ETag/Last-Modified, so every fetch is a full 200
+        def origin(request):
+            if request.url.path == '/robots.txt':
+                return httpx.Response(404)
+            return httpx.Response(200, content=FEED)
+
+        with tempfile.TemporaryDirectory() as d:
+            conn = dbm.ensure_db(os.path.join(d, 'state.db'))
+            http = HttpClient(transport=httpx.MockTransport(origin))
+            counters = {'fetched': 0, 'discovered': 0, 'skipped_robots': 0, 'skipped_unchanged': 0, 'errors': 0, 'status': {}}
+            ctx = {'http': http, 'robots': RobotsCache(http.client), 'ratelimiter': RateLimiter(), 'db': conn, 'counters': counters}
+            cfg = {'feed': 'https://example.com/feed', 'rate_limit_rps': 1000}
+            self.assertEqual([d.url for d in RSSAdapter('feed', cfg, ctx).discover()], ['https://example.com/one'])
+            self.assertEqual(list(RSSAdapter('feed', cfg, ctx).discover()), [])
+            self.assertEqual(counters['fetched'], 2)
+            self.assertEqual(counters['skipped_unchanged'], 1)
+            http.client.close()
+            conn.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,26 @@
+import os
+import tempfile
+import unittest
+
+from src.core.seenset import SeenSet
+
+
+class TestSeenSet(unittest.TestCase):
+    def test_add_grow_and_spill(self):
+        urls = [f"https://example.com/page/{i}?p={i % 7}" for i in range(20000)]
+        with tempfile.TemporaryDirectory() as d:
+            with SeenSet(max_bytes=16 << 10, spill_dir=d) as seen:
+                self.assertTrue(all(seen.add(u) for u in urls))
+                self.assertGreater(seen.spills, 1)
+                self.assertEqual(len(seen), len(urls))
+                # Both the table and the spilled runs answer, and re-adding is a no-op
+                self.assertFalse(any(seen.add(u) for u in urls[::97]))
+                self.assertTrue(all(u in seen for u in urls[::13]))
+                self.assertFalse(any(f"https://example.com/other/{i}" in seen for i in range(1000)))
+                self.assertEqual(len(seen), len(urls))
+                # The spill file is unlinked while mapped
+                self.assertEqual(os.listdir(d), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
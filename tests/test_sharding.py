@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import src.adapters as registry
+from src import runner
+from src.adapters import register_adapter
+from src.adapters.base import Adapter
+from src.core import db as dbm
+from src.core.archive import ArchiveWriter
+from src.core.models import DiscoveredBatch, SiteConfig
+
+STUB = 'tests.test_sharding:StubAdapter'
+
+
+class StubAdapter(Adapter):
+    """Yields `count` URLs on its site's host without any request."""
+
+    def discover_batches(self):
+        host = runner._site_host(SiteConfig(id=self.site_id, kind='stub', cfg=self.cfg))
+        urls = [f"https://{host}/{self.site_id}/{i}" for i in range(int(self.cfg['count']))]
+        self.ctx['counters']['discovered'] += len(urls)
+        yield DiscoveredBatch('sitemap', urls)
+
+
+def _sites():
+    return [SiteConfig(id=f"s{i}", kind='stub', cfg={'kind': 'stub', 'base': f"https://h{i % 7}.example/", 'count': 3 + i % 4, 'rate_limit_rps': 1000})
+            for i in range(30)]
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # An empty replay archive: canonical lookups fail at once and keep the naive URL
+        self.archive = {'replay': os.path.join(self.tmp.name, 'empty.lha')}
+        ArchiveWriter(self.archive['replay']).close()
+        for patcher in (mock.patch.dict(registry._registered), mock.patch.dict(registry._loaded)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hosts_stay_together_and_shards_balance(self):
+        sites = [SiteConfig(id=f"s{i}", kind='stub', cfg={'kind': 'stub', 'base': f"https://h{i % 40}.example/", 'count': 1})
+                 for i in range(400)]
+        shards = runner._shard_sites(sites, 4)
+        self.assertEqual(sorted(s.id for sh in shards for s in sh), sorted(s.id for s in sites))
+        owner = {}
+        for n, shard in enumerate(shards):
+            for s in shard:
+                self.assertEqual(owner.setdefault(runner._site_host(s), n), n)
+        # 40 hosts of 10 sites each over 4 shards
+        self.assertEqual(len(shards), 4)
+        self.assertLessEqual(max(map(len, shards)), 2 * min(map(len, shards)))
+
+    def _run(self, db_path, processes):
+        dbm.ensure_db(db_path).close()
+        sites = _sites()
+        if processes == 1:
+            register_adapter('stub', STUB)
+            env = runner._make_env(db_path, 1, progress=False, archive=self.archive, rules={'mode': 'off'})
+            try:
+                return dict((s.id, c) for s, c in runner._iter_with_retries(sites, env, 2))
+            finally:
+                runner._close_env(env)
+                env['db'].close()
+        shards = runner._shard_sites(sites, processes)
+        self.assertEqual(len(shards), processes)
+        out = {}
+        mp = multiprocessing.get_context('spawn')
+        # Workers are fresh interpreters, so the stub kind is registered in each of them
+        with ProcessPoolExecutor(max_workers=processes, mp_context=mp, initializer=register_adapter, initargs=('stub', STUB)) as px:
+            futures = [px.submit(runner._run_shard, shard, db_path, 1, 2, None, self.archive, None, {'mode': 'off'}) for shard in shards]
+            for fut in futures:
+                results, _, _, _ = fut.result()
+                out.update(results)
+        return out
+
+    def test_sharded_run_matches_single_process(self):
+        single = self._run(os.path.join(self.tmp.name, 'single.db'), 1)
+        sharded = self._run(os.path.join(self.tmp.name, 'sharded.db'), 2)
+        self.assertEqual(set(sharded), {s.id for s in _sites()})
+
+        def totals(results):
+            return {k: sum(c[k] for c in results.values()) for k in ('discovered', 'inserted', 'errors')}
+
+        self.assertEqual(totals(sharded), totals(single))
+        self.assertEqual({sid: c['inserted'] for sid, c in sharded.items()}, {sid: c['inserted'] for sid, c in single.items()})
+        self.assertEqual(totals(single)['inserted'], sum(3 + i % 4 for i in range(30)))
+
+
+if __name__ == '__main__':
+    unittest.main()
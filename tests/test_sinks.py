@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import orjson
+
+from src.core.sinks import QueuedSink, Sink, SinkBusy, make_sink
+
+
+class _Flaky(Sink):
+    name = 'flaky'
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.batches = []
+
+    def emit(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise SinkBusy(503, retry_after=0.01)
+        self.batches.append(list(records))
+
+
+class _Stuck(Sink):
+    name = 'stuck'
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def emit(self, records):
+        self.release.wait()
+
+
+def _rec(i):
+    return {'site_id': 's1', 'url': f"https://x/{i}", 'first_seen': 1, 'lastmod': None}
+
+
+class TestSinks(unittest.TestCase):
+    def test_retries_until_delivered_in_order(self):
+        inner = _Flaky(failures=2)
+        sink = QueuedSink(inner, batch=2)
+        sink.emit([_rec(i) for i in range(5)])
+        sink.close(timeout=5)
+        self.assertEqual([r['url'] for b in inner.batches for r in b], [f"https://x/{i}" for i in range(5)])
+        self.assertTrue(all(len(b) <= 2 for b in inner.batches))
+        st = sink.stats()
+        self.assertEqual((st['emitted'], st['delivered'], st['dropped'], st['retries']), (5, 5, 0, 2))
+
+    def test_drop_overflow_counts_instead_of_blocking(self):
+        inner = _Stuck()
+        sink = QueuedSink(inner, max_queue=3, batch=1, overflow='drop')
+        sink.emit([_rec(i) for i in range(10)])
+        st = sink.stats()
+        # One record is held by the stuck delivery thread, three fit in the queue
+        self.assertGreaterEqual(st['dropped'], 6)
+        inner.release.set()
+        sink.close(timeout=5)
+        st = sink.stats()
+        self.assertEqual(st['delivered'] + st['dropped'], 10)
+
+    def test_file_sink_writes_ndjson(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'out', 'new.ndjson')
+            sink = make_sink({'specs': [f"file:{path}"]})
+            sink.emit([_rec(1), _rec(2)])
+            sink.close()
+            with open(path, 'rb') as f:
+                lines = [orjson.loads(line) for line in f]
+            self.assertEqual(lines, [_rec(1), _rec(2)])
+            self.assertEqual(sink.stats()[path]['delivered'], 2)
+        self.assertIsNone(make_sink(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
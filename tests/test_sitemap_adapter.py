@@ -1,6 +1,10 @@
+import os
+import tempfile
 import unittest
 
 from src.adapters.sitemap import SitemapAdapter
+from src.core import db as dbm
+from src.core.models import DiscoveredBatch
 
 
 class TestSitemapAdapter(unittest.TestCase):
@@ -26,6 +30,27 @@ class TestSitemapAdapter(unittest.TestCase):
         self.assertEqual(len(items), 1)
         self.assertEqual(items[0].meta.get('_type'), 'index')
 
+    def test_watermark_filter_yields_only_new_or_moved_entries(self):
+        with tempfile.TemporaryDirectory() as d:
+            conn = dbm.ensure_db(os.path.join(d, 'urls.db'))
+            counters = {'discovered': 0}
+            adapter = SitemapAdapter('sm', {'sitemap': 'https://example.com/sitemap.xml'}, {'db': conn, 'counters': counters})
+            first = adapter.watermark_filter(DiscoveredBatch('sitemap', ['https://example.com/a', 'https://example.com/b'], ['2024-01-01', None]))
+            self.assertEqual(first.urls, ['https://example.com/a', 'https://example.com/b'])
+            # Nothing is stored until the runner commits the batch with its keys
+            again = adapter.watermark_filter(DiscoveredBatch('sitemap', ['https://example.com/a'], ['2024-01-01']))
+            self.assertEqual(again.urls, ['https://example.com/a'])
+            with dbm.transaction(conn):
+                dbm.write_watermarks(conn, 'sm', list(zip(first.keys, first.lastmods)))
+            batch = DiscoveredBatch('sitemap', ['https://example.com/a', 'https://example.com/b', 'https://example.com/c'], ['2024-02-01', None, None])
+            out = adapter.watermark_filter(batch)
+            self.assertEqual(out.urls, ['https://example.com/a', 'https://example.com/c'])
+            self.assertEqual(len(out.keys), 2)
+            self.assertEqual(counters['skipped_watermark'], 1)
+            off = SitemapAdapter('sm', {'watermark': False}, {'db': conn, 'counters': counters})
+            self.assertEqual(len(off.watermark_filter(batch)), 3)
+            conn.close()
+
 
 if __name__ == '__main__':
     unittest.main()
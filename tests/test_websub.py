@@ -0,0 +1,159 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+import httpx
+
+from src import runner
+from src.core import db as dbm
+from src.core.http import HttpClient
+from src.core.models import SiteConfig
+from src.core.robots import RobotsCache
+from src.core.websub import SubscriptionManager, hub_links, sign
+from src.websub import PushIngestor, WebSubServer, rss_sites
+
+FEED = 'https://news.example/feed.xml'
+
+
+def _feed(hub: str, ids) -> bytes:
+    items = ''.join(f"<item><link>https://news.example/a/{i}</link><pubDate>Mon, 0{i % 9 + 1} Jan 2024 00:00:00 GMT</pubDate></item>" for i in ids)
+    return (f'<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel><title>t</title>'
+            f'<atom:link rel="self" href="{FEED}"/><atom:link rel="hub" href="{hub}"/>{items}</channel></rss>').encode('utf-8')
+
+
+class StandInHub(ThreadingHTTPServer):
+    """Accepts subscriptions, verifies them against the callback and publishes on demand."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _HubHandler)
+        self.subs = {}
+        self.verified = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hub"
+
+    def verify(self, form):
+        challenge = 'c-' + form['hub.topic'][0][-8:]
+        q = urlencode({'hub.mode': 'subscribe', 'hub.topic': form['hub.topic'][0], 'hub.challenge': challenge,
+                       'hub.lease_seconds': form['hub.lease_seconds'][0]})
+        resp = httpx.get(f"{form['hub.callback'][0]}?{q}")
+        if resp.status_code == 200 and resp.text == challenge:
+            self.subs[form['hub.topic'][0]] = (form['hub.callback'][0], form.get('hub.secret', [None])[0])
+            self.verified.set()
+
+    def publish(self, topic: str, body: bytes, secret=None) -> int:
+        callback, sub_secret = self.subs[topic]
+        secret = secret or sub_secret
+        headers = {'Content-Type': 'application/rss+xml', 'X-Hub-Signature': sign(secret, body)} if secret else {}
+        return httpx.post(callback, content=body, headers=headers).status_code
+
+
+class _HubHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        return None
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        self.send_response(202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        # Verification is asynchronous, after the 202
+        threading.Thread(target=self.server.verify, args=(form,), daemon=True).start()
+
+
+class TestHubLinks(unittest.TestCase):
+    def test_feed_and_header_links(self):
+        atom = (b'<feed xmlns="http://www.w3.org/2005/Atom"><link href="https://h.example/?a=1&amp;b=2" rel="hub"/>'
+                b'<link rel="self" href="https://x/atom"/><entry><link rel="hub" href="https://wrong/"/></entry></feed>')
+        self.assertEqual(hub_links(atom), ('https://h.example/?a=1&b=2', 'https://x/atom'))
+        self.assertEqual(hub_links(b'<rss><channel><item><link>https://x/1</link></item></channel></rss>'), (None, None))
+        self.assertEqual(hub_links(atom, {'hub': {'url': 'https://hdr/', 'rel': 'hub'}}), ('https://hdr/', 'https://x/atom'))
+
+
+class TestWebSub(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'urls.db')
+        self.hub = StandInHub()
+        threading.Thread(target=self.hub.serve_forever, daemon=True).start()
+        self.polls = 0
+
+    def tearDown(self):
+        self.hub.shutdown()
+        self.hub.server_close()
+        self.tmp.cleanup()
+
+    def _env(self):
+        def handler(request):
+            if request.url.path == '/feed.xml':
+                self.polls += 1
+                return httpx.Response(200, content=_feed(self.hub.url, [1, 2]))
+            if request.url.path.startswith('/a/'):
+                return httpx.Response(200, text='<html><head></head></html>')
+            return httpx.Response(404)
+
+        env = runner._make_env(self.db_path, 1, progress=False, rules={'mode': 'off'})
+        env['http'].client.close()
+        env['http'] = HttpClient(transport=httpx.MockTransport(handler))
+        env['robots'] = RobotsCache(env['http'].client)
+        return env
+
+    def test_subscribe_verify_push_and_safety_net_poll(self):
+        site = SiteConfig(id='news', kind='rss', cfg={'kind': 'rss', 'feed': FEED, 'rate_limit_rps': 1000})
+        env = self._env()
+        # A poll learns the hub
+        _, counters = runner._process_site(site, 0, env)
+        self.assertEqual((counters['inserted'], self.polls), (2, 1))
+
+        db = env['db']
+        ingestor = PushIngestor(env, rss_sites([site]))
+        srv = WebSubServer(('127.0.0.1', 0), db, ingestor)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        client = httpx.Client()
+        conn = db.acquire(dbm.WRITER)
+        try:
+            manager = SubscriptionManager(conn, client, f"http://127.0.0.1:{srv.server_address[1]}/websub", lease_seconds=600)
+            self.assertEqual(manager.sync(), {'requested': [FEED], 'failed': []})
+            self.assertTrue(self.hub.verified.wait(5))
+            [row] = dbm.list_websub(conn)
+            self.assertEqual(row[3], 'active')
+            self.assertAlmostEqual(row[4], time.time() + 600, delta=5)
+            # Nothing is due again until the lease nears its end
+            self.assertEqual(manager.sync(), {'requested': [], 'failed': []})
+
+            # Pushed entries go through the same pipeline; the known ones stop at the watermark
+            self.assertEqual(self.hub.publish(FEED, _feed(self.hub.url, [2, 3, 4])), 202)
+            # A forged push is acknowledged and dropped
+            self.assertEqual(self.hub.publish(FEED, _feed(self.hub.url, [9]), secret='forged'), 202)
+            ingestor.join()
+            self.assertEqual(srv.rejected, 1)
+            self.assertEqual(ingestor.stats, {'pushes': 1, 'inserted': 2, 'errors': 0})
+            urls = {r[2] for r in dbm.query_after(conn, 0, sites=['news'])}
+            self.assertEqual(urls, {f"https://news.example/a/{i}" for i in (1, 2, 3, 4)})
+            self.assertEqual(dbm.list_websub(conn)[0][7], 1)
+
+            # Covered by the subscription: the next run skips the feed...
+            _, counters = runner._process_site(site, 0, env)
+            self.assertEqual((counters['skipped_push'], counters['fetched'], self.polls), (1, 0, 1))
+            # ...until the safety-net interval has passed
+            site.cfg['push_poll_seconds'] = 0
+            _, counters = runner._process_site(site, 0, env)
+            self.assertEqual((counters['skipped_push'], counters['fetched'], self.polls), (0, 1, 2))
+        finally:
+            db.release(conn, dbm.WRITER)
+            srv.shutdown()
+            srv.server_close()
+            ingestor.close()
+            client.close()
+            db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()